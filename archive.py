@@ -0,0 +1,244 @@
+import os
+import re
+import threading
+import time
+import zipfile
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    import zlib  # noqa: F401, only needed for compressed zip files
+    COMPRESSION = zipfile.ZIP_DEFLATED
+except ImportError:
+    COMPRESSION = zipfile.ZIP_STORED
+
+
+# ARCHIVE
+# Keeps the simulation files of a run in zip files per generation (archive_gen<generation>_part<part>.zip in the output
+# directory) instead of thousands of small files in creature, generation and episode folders. Within a zip file every
+# file is stored as <creature name>/<file name>, the file names already give the generation and episode.
+#
+# The files are written by a background thread, the genetic algorithm only queues them. A zip file can only be read once
+# it is closed, the thread closes the part it is writing at the end of the generation and, while it has nothing else to
+# do, every sync_interval seconds, later files go to the next part. Usually a generation has a few parts. If a run
+# crashes the files of the part being written are lost, the part is removed when the run is resumed. Use
+# ArtifactArchive to read files back.
+
+
+def archive_path(directory, generation, part):
+    # RETURNS
+    # - path                    string, zip file holding part of the files of a generation
+    return os.path.join(directory, "archive_gen" + str(generation) + "_part" + str(part) + ".zip")
+
+
+def archive_parts(directory):
+    # RETURNS
+    # - parts                   dict, {generation: list of the parts of the generation in order}
+    parts = {}
+    for file_name in os.listdir(directory):
+        match = re.match(r"archive_gen(\d+)_part(\d+)\.zip$", file_name)
+        if match:
+            parts.setdefault(int(match.group(1)), []).append(int(match.group(2)))
+    return {generation: sorted(generation_parts) for generation, generation_parts in parts.items()}
+
+
+class ArtifactArchiver:
+    def __init__(self, directory, max_pending=1000, sync_interval=30):
+        # ARGUMENTS
+        # - directory               string, directory the zip files are written to
+        # - max_pending             int, queued episodes after which add blocks until the thread has caught up
+        # - sync_interval           float, seconds after which the part being written is closed when the thread has
+        #                           nothing else to do, the most a crash can lose
+
+        self.directory = directory                                  # string, directory of the zip files
+        self.sync_interval = sync_interval                          # float, seconds between closing parts
+        self.archived = 0                                           # int, number of files archived
+        self.error = None                                           # string, first error of the archiving thread
+
+        self._queue = queue.Queue(max_pending)                      # queue.Queue, episodes waiting to be archived
+        self._archive = None                                        # zipfile.ZipFile, zip file being written
+        self._generation = None                                     # int, generation of the files being written
+        self._part = None                                           # int, part of the zip file being written
+        self._names = set()                                         # set, names of the generations archived files
+        self._synced = time.time()                                  # float, time the last part was closed
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def add(self, generation, files, cleanup=None):
+        # Queues the files of a creature-episode. The files are removed once archived, missing files are skipped.
+        # ARGUMENTS
+        # - generation              int, generation of the episode
+        # - files                   list, (path of the file, name of the file in the archive) of every file to keep
+        # - cleanup                 function, called without arguments once the files are archived (E.g. removes the
+        #                           directory the simulation ran in)
+        self._check()
+        self._put((generation, files, cleanup))
+
+    def end_generation(self, generation):
+        # Closes the last part of a generation once the files queued before have been archived
+        self._put((generation, None, None))
+
+    def close(self):
+        # Waits for the queued files to be archived and closes the last part
+        self._put(None)
+        self._thread.join()
+        self._check()
+
+    def _check(self):
+        if self.error is not None:
+            raise Exception("ERROR: Archiving the simulation files failed: " + self.error)
+
+    def _put(self, item):
+        # Waits while the queue is full, as long as the thread is there to empty it
+        while True:
+            if not self._thread.is_alive():
+                self._check()
+                raise Exception("ERROR: The thread archiving the simulation files has stopped.")
+            try:
+                self._queue.put(item, timeout=1)
+                return
+            except queue.Full:
+                pass
+
+    def _fail(self, error):
+        # Keeps the first error, the thread carries on so the queue is emptied and every cleanup is called
+        if self.error is None:
+            self.error = type(error).__name__ + ": " + str(error)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                try:
+                    self._close_archive()
+                except Exception as error:
+                    self._fail(error)
+                return
+
+            generation, files, cleanup = item
+            try:
+                if files is None:
+                    if generation == self._generation:
+                        self._close_archive()
+                        self._generation = None
+                else:
+                    self._write(generation, files)
+
+                if self._queue.empty() and time.time() - self._synced > self.sync_interval:
+                    self._close_archive()
+            except Exception as error:
+                # E.g. a full disk, or a file modified before 1980 which zip files cannot store
+                self._fail(error)
+
+            if cleanup is not None:
+                try:
+                    cleanup()
+                except Exception as error:
+                    self._fail(error)
+
+    def _write(self, generation, files):
+        if generation != self._generation:
+            self._close_archive()
+            self._generation = generation
+            self._part = -1
+            self._names = set()
+
+            # A resumed generation carries on after its parts, the part being written when the run crashed is unreadable
+            for part in archive_parts(self.directory).get(generation, []):
+                path = archive_path(self.directory, generation, part)
+                if zipfile.is_zipfile(path):
+                    with zipfile.ZipFile(path) as archive:
+                        self._names.update(archive.namelist())
+                else:
+                    os.remove(path)
+                self._part = part
+
+        if self._archive is None:
+            self._part += 1
+            self._archive = zipfile.ZipFile(archive_path(self.directory, generation, self._part), "w", COMPRESSION)
+
+        for file_path, name in files:
+            if not os.path.exists(file_path):
+                continue
+            # Episodes simulated again after a resume already have their files in the archive, the first copy is kept
+            if name not in self._names:
+                self._archive.write(file_path, name)
+                self._names.add(name)
+                self.archived += 1
+            os.remove(file_path)
+
+    def _close_archive(self):
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+        self._synced = time.time()
+
+
+class ArtifactArchive:
+    def __init__(self, directory="generated_files"):
+        # Random access to the files archived by ArtifactArchiver.
+        # ARGUMENTS
+        # - directory               string, directory of the zip files (the output directory of the run)
+
+        self.directory = directory                                  # string, directory of the zip files
+        self._archives = []                                         # list, open zipfile.ZipFile of every part read
+        self._index = {}                                            # dict, {generation: {name: zipfile.ZipFile}}
+
+    def generations(self):
+        # RETURNS
+        # - generations             list, generations with archived files, in order
+        return sorted(archive_parts(self.directory))
+
+    def index(self, generation):
+        # RETURNS
+        # - index                   dict, {name: zipfile.ZipFile} of every archived file of the generation, the parts of
+        #                           the generation are opened for reading on first use
+        if generation not in self._index:
+            index = {}
+            for part in archive_parts(self.directory).get(generation, []):
+                path = archive_path(self.directory, generation, part)
+                if not zipfile.is_zipfile(path):
+                    # Being written, or left by a crashed run
+                    continue
+                archive = zipfile.ZipFile(path)
+                self._archives.append(archive)
+                for name in archive.namelist():
+                    index.setdefault(name, archive)
+            self._index[generation] = index
+        return self._index[generation]
+
+    def names(self, generation, creature=None):
+        # RETURNS
+        # - names                   list, names of the archived files of the generation, only those of a creature if
+        #                           given. E.g. "_creature0/_creature0_gen3_ep1_fitness.xml"
+        names = sorted(self.index(generation))
+        if creature is not None:
+            names = [name for name in names if name.startswith(creature + "/")]
+        return names
+
+    def read(self, generation, name):
+        # RETURNS
+        # - contents                bytes, contents of an archived file
+        index = self.index(generation)
+        if name not in index:
+            raise Exception("ERROR: " + name + " is not in the archive of generation " + str(generation) + ".")
+        return index[name].read(name)
+
+    def extract(self, generation, name, destination="."):
+        # Writes an archived file to a directory, E.g. to replay a vxa file in voxelyze.
+        # RETURNS
+        # - path                    string, path of the extracted file
+        path = os.path.join(destination, os.path.basename(name))
+        with open(path, "wb") as extracted_file:
+            extracted_file.write(self.read(generation, name))
+        return path
+
+    def close(self):
+        for archive in self._archives:
+            archive.close()
+        self._archives = []
+        self._index = {}
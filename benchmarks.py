@@ -0,0 +1,241 @@
+import csv
+import json
+import os
+import resource
+import shutil
+import subprocess as sub
+import sys
+import tempfile
+import time
+import timeit
+
+import numpy as np
+
+from neural_network import NeuralNet
+from settings import SETTINGS_FILE, load_settings, set_settings
+from simulation_files import sum_csv_rows
+
+
+# BENCHMARKS FILE
+# Micro benchmarks for the python side of the genetic algorithm, and end-to-end benchmarks of whole generations run
+# with the stand-in simulator fake_voxelyze.py. Run from the directory containing settings.json:
+#
+#     python benchmarks.py                              micro benchmarks
+#     python benchmarks.py generations                  generation benchmarks, compared with the baselines
+#     python benchmarks.py generations --update-baseline    same, then the results become the new baselines
+
+BASELINE_FILE = "benchmark_baselines.json"      # string, baselines of the generation benchmarks
+REGRESSION_THRESHOLD = 0.2                      # float, relative increase over the baseline flagged as a regression
+# Results of a generation benchmark compared with the baselines, larger is worse for all of them
+COMPARED_RESULTS = ("generation_time", "python_time_per_episode", "peak_memory_mb")
+
+
+def benchmark_forward_pass(num_voxels=216, population_size=50, repeats=5):
+    # Compares the per-voxel np.vectorize forward propagation used previously in Creature.calculate_stiffness with
+    # NeuralNet.forward_batch (one creature) and NeuralNet.forward_population (whole population).
+
+    neural_nets = [NeuralNet() for _ in range(population_size)]
+    nn_inputs = np.column_stack((np.random.uniform(-10, 10, num_voxels), np.full(num_voxels, 0.25)))
+    population_inputs = np.stack([nn_inputs for _ in range(population_size)])
+
+    def per_voxel():
+        for neural_net in neural_nets:
+            vectorized_nn = np.vectorize(neural_net.forward_propagation)
+            vectorized_nn(nn_inputs[:, 0], nn_inputs[:, 1])
+
+    def batch():
+        for neural_net in neural_nets:
+            neural_net.forward_batch(nn_inputs)
+
+    def population():
+        NeuralNet.forward_population(neural_nets, population_inputs)
+
+    # Results must be identical before timings mean anything
+    expected = np.stack([np.vectorize(nn.forward_propagation)(nn_inputs[:, 0], nn_inputs[:, 1])[0]
+                         for nn in neural_nets])
+    assert np.array_equal(expected, np.stack([nn.forward_batch(nn_inputs)[:, 0] for nn in neural_nets]))
+    assert np.array_equal(expected, NeuralNet.forward_population(neural_nets, population_inputs)[..., 0])
+
+    timings = {}
+    for name, function in (("per_voxel", per_voxel), ("forward_batch", batch), ("forward_population", population)):
+        timings[name] = min(timeit.repeat(function, number=1, repeat=repeats))
+
+    print("Forward pass, " + str(population_size) + " creatures x " + str(num_voxels) + " voxels:")
+    for name, timing in timings.items():
+        print("    * " + name.ljust(20) + "{:10.3f} ms".format(timing * 1000) +
+              "   speedup x{:.1f}".format(timings["per_voxel"] / timing))
+
+    return timings
+
+
+def benchmark_ke_loader(row_counts=(100, 1000, 10000), num_voxels=216, repeats=3):
+    # Compares the csv.reader loop previously used in Creature.calculate_stiffness to read kinetic energy files with
+    # simulation_files.sum_csv_rows, on synthetic KE files with an increasing number of time steps.
+
+    def csv_loop(file_name):
+        average_forces = np.zeros(num_voxels)
+        with open(file_name) as ke_file:
+            for row in csv.reader(ke_file):
+                average_forces += np.multiply(np.array(row[:-1], dtype=float), 10)
+        return average_forces
+
+    directory = tempfile.mkdtemp()
+    timings = {}
+    try:
+        for num_rows in row_counts:
+            file_name = os.path.join(directory, "ke" + str(num_rows) + ".csv")
+            # Values written with 6 significant digits, as by voxelyze
+            with open(file_name, "w") as ke_file:
+                for row in np.random.uniform(0, 1e-3, (num_rows, num_voxels)):
+                    ke_file.write(",".join("{:g}".format(value) for value in row.tolist()) + ",\n")
+
+            # Results must be identical before timings mean anything
+            assert np.array_equal(csv_loop(file_name), sum_csv_rows(file_name, num_voxels, scale=10)[0])
+
+            timings[num_rows] = {
+                "csv_loop": min(timeit.repeat(lambda: csv_loop(file_name), number=1, repeat=repeats)),
+                "sum_csv_rows": min(timeit.repeat(lambda: sum_csv_rows(file_name, num_voxels, scale=10),
+                                                  number=1, repeat=repeats))}
+    finally:
+        shutil.rmtree(directory)
+
+    print("KE file loading, " + str(num_voxels) + " voxels:")
+    for num_rows in row_counts:
+        timing = timings[num_rows]
+        print("    * " + (str(num_rows) + " rows").ljust(12) +
+              "csv_loop {:10.3f} ms".format(timing["csv_loop"] * 1000) +
+              "   sum_csv_rows {:10.3f} ms".format(timing["sum_csv_rows"] * 1000) +
+              "   speedup x{:.1f}".format(timing["csv_loop"] / timing["sum_csv_rows"]))
+
+    return timings
+
+
+def run_generations(settings_file, overrides):
+    # Runs the genetic algorithm in the current directory with the given settings and writes benchmark_result.json.
+    # Called in a process of its own by benchmark_generations, so the peak memory is the runs alone.
+    # ARGUMENTS
+    # - settings_file           string, path to the settings file
+    # - overrides               dict, nested dictionary of settings replacing those in the settings file
+    from population_async import Population
+
+    set_settings(load_settings(settings_file, overrides))
+    os.mkdir("generated_files")
+    np.random.seed(0)
+
+    tic = time.time()
+    population = Population()
+    population.run_genetic_algorithm()
+    wall_time = time.time() - tic
+
+    with open(os.path.join("generated_files", "telemetry.jsonl")) as telemetry_file:
+        records = [json.loads(line) for line in telemetry_file]
+    generations = [record for record in records if record["type"] == "generation"]
+    episodes = sum(record["episodes"] for record in generations)
+
+    phase_totals = {}
+    phase_counts = {}
+    for record in generations:
+        for phase, summary in record["phases"].items():
+            phase_totals[phase] = phase_totals.get(phase, 0) + summary["total"]
+            phase_counts[phase] = phase_counts.get(phase, 0) + summary["count"]
+
+    # ru_maxrss is in kilobytes on Linux
+    result = {"wall_time": wall_time,
+              "generation_time": float(np.mean([record["wall_time"] for record in generations])),
+              "episodes_per_second": episodes / wall_time,
+              "python_time_per_episode": sum(record["python_time"] for record in generations) / episodes,
+              "phase_means": {phase: phase_totals[phase] / phase_counts[phase] for phase in phase_totals},
+              "peak_memory_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0}
+    with open("benchmark_result.json", "w") as result_file:
+        json.dump(result, result_file)
+
+
+def benchmark_generations(pop_sizes=(10, 50), ep_sizes=(3,), structures=((4, 4, 4), (6, 6, 6), (8, 8, 8)),
+                          generations=2, simulation_time=0.05, steps=100, max_workers=None,
+                          baseline_file=BASELINE_FILE, threshold=REGRESSION_THRESHOLD, update_baseline=False):
+    # Runs whole generations with fake_voxelyze.py for every combination of population size, episodes and creature
+    # structure, and compares throughput, python overhead and peak memory with the baselines.
+    # ARGUMENTS
+    # - pop_sizes               list, population sizes, the top fifth is kept and the next three fifths evolved
+    # - ep_sizes                list, episodes per generation
+    # - structures              list, creature structures (x, y, z)
+    # - generations             int, generations run per benchmark
+    # - simulation_time         float, median seconds a fake simulation takes
+    # - steps                   int, rows written to every CSV file of a fake simulation
+    # - max_workers             int, concurrent simulations, defaults to the number of cpus
+    # - baseline_file           string, JSON file holding the baselines, {benchmark name: results}
+    # - threshold               float, relative increase over the baseline flagged as a regression
+    # - update_baseline         bool, store the results as the new baselines. Benchmarks without a baseline are always
+    #                           stored
+    #
+    # RETURNS
+    # - results                 dict, {benchmark name: results}
+    # - regressions             list, (benchmark name, result, baseline, value) of every regression
+
+    baselines = {}
+    if os.path.exists(baseline_file):
+        with open(baseline_file) as baseline_json:
+            baselines = json.load(baseline_json)
+
+    benchmark_directory = os.path.dirname(os.path.abspath(__file__))
+    settings_file = os.path.abspath(SETTINGS_FILE)
+    environment = dict(os.environ, FAKE_VOXELYZE_TIME=str(simulation_time), FAKE_VOXELYZE_STEPS=str(steps))
+
+    results = {}
+    regressions = []
+    for pop_size in pop_sizes:
+        for ep_size in ep_sizes:
+            for structure in structures:
+                name = ("pop" + str(pop_size) + "_ep" + str(ep_size) + "_" + "x".join(str(size) for size in structure))
+                overrides = {"evosoro_path": os.path.join(benchmark_directory, "fake_voxelyze.py"),
+                             "parameters": {"pop_size": pop_size, "ep_size": ep_size, "gen_size": generations,
+                                            "top": max(pop_size // 5, 1), "evolve": pop_size * 3 // 5},
+                             "evaluation": {"max_workers": max_workers, "backend": "local", "result_cache": 0,
+                                            "scratch_directory": None},
+                             "screening": {"enabled": 0},
+                             "supervision": {"enabled": 0},
+                             "files": {"telemetry": 1},
+                             "structure": {"creature_structure": list(structure)}}
+
+                directory = tempfile.mkdtemp(prefix="benchmark_")
+                try:
+                    with open(os.devnull, "w") as devnull:
+                        sub.check_call([sys.executable, os.path.abspath(__file__), "run_generations", settings_file,
+                                        json.dumps(overrides)], cwd=directory, env=environment, stdout=devnull)
+                    with open(os.path.join(directory, "benchmark_result.json")) as result_file:
+                        results[name] = json.load(result_file)
+                finally:
+                    shutil.rmtree(directory, ignore_errors=True)
+
+                result = results[name]
+                print(name.ljust(22) + "{:8.2f} s/generation".format(result["generation_time"]) +
+                      "{:8.1f} episodes/s".format(result["episodes_per_second"]) +
+                      "{:9.2f} ms python/episode".format(result["python_time_per_episode"] * 1000) +
+                      "{:8.1f} MB".format(result["peak_memory_mb"]))
+
+                for key in COMPARED_RESULTS:
+                    if name in baselines and result[key] > baselines[name][key] * (1 + threshold):
+                        regressions.append((name, key, baselines[name][key], result[key]))
+                        print("    REGRESSION " + key + ": " + "{:.4g}".format(result[key]) + ", baseline " +
+                              "{:.4g}".format(baselines[name][key]) + " (" +
+                              "{:+.0f}".format((result[key] / baselines[name][key] - 1) * 100) + "%)")
+
+    for name, result in results.items():
+        if update_baseline or name not in baselines:
+            baselines[name] = result
+    with open(baseline_file, "w") as baseline_json:
+        json.dump(baselines, baseline_json, indent=4, sort_keys=True)
+
+    print(str(len(regressions)) + " regressions beyond " + "{:.0f}".format(threshold * 100) + "% of the baselines")
+    return results, regressions
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "run_generations":
+        run_generations(sys.argv[2], json.loads(sys.argv[3]))
+    elif len(sys.argv) > 1 and sys.argv[1] == "generations":
+        _, regressions = benchmark_generations(update_baseline="--update-baseline" in sys.argv)
+        sys.exit(1 if regressions else 0)
+    else:
+        benchmark_forward_pass()
+        benchmark_ke_loader()
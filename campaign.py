@@ -0,0 +1,201 @@
+import datetime as dt
+import json
+import os
+import shutil
+import threading
+import traceback
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from population_async import Population
+
+
+# DAMAGE CAMPAIGN
+# Evaluates a set of damage scenarios of the same population. A campaign is described by a JSON file:
+#
+# {
+#     "population_file": "previous_population.pkl",     pickled population whose top creatures are damaged
+#     "output_directory": "damage_campaign",            every scenario gets its own sub directory
+#     "generations": 1,                                 generations evaluated per scenario
+#     "max_parallel_scenarios": null,                   scenarios evaluated at the same time, null for all of them
+#     "scenarios": [
+#         {"name": "damaged_right_half", "damage_type": "remove_sect", "damage_arguments": [[0, 2, 4, 6]]},
+#         ...
+#     ]
+# }
+#
+# Damage arguments are given as for Population.inflict_damage, with JSON lists in place of tuples. Scenarios run on
+# their own threads and share one simulation scheduler, so max_workers simulations run at once across the campaign. A
+# finished scenario writes scenario_done.json to its directory and is skipped when the campaign is run again, an
+# unfinished one is resumed from its journal (or restarted if it has none).
+
+SCENARIO_DONE_FILE = "scenario_done.json"
+CAMPAIGN_KEYS = ("population_file", "output_directory", "generations", "scenarios")
+SCENARIO_KEYS = ("name", "damage_type", "damage_arguments")
+
+
+def load_campaign(file_path):
+    # RETURNS
+    # - campaign                dict, campaign description, see above
+    with open(file_path) as campaign_file:
+        campaign = json.load(campaign_file)
+
+    for key in CAMPAIGN_KEYS:
+        if key not in campaign:
+            raise Exception("ERROR in " + file_path + ": '" + key + "' is missing.")
+    campaign.setdefault("max_parallel_scenarios", None)
+
+    names = set()
+    for scenario in campaign["scenarios"]:
+        for key in SCENARIO_KEYS:
+            if key not in scenario:
+                raise Exception("ERROR in " + file_path + ": '" + key + "' is missing from scenario "
+                                + str(scenario) + ".")
+        if scenario["name"] in names:
+            raise Exception("ERROR in " + file_path + ": scenario name '" + scenario["name"] + "' is used twice.")
+        names.add(scenario["name"])
+
+    return campaign
+
+
+def damage_arguments(arguments):
+    # RETURNS
+    # - arguments               list, damage arguments with the JSON lists inside them turned into tuples
+    return [_tuples(argument) for argument in arguments]
+
+
+def _tuples(value):
+    if isinstance(value, list):
+        return tuple(_tuples(element) for element in value)
+    return value
+
+
+def scenario_directory(campaign, scenario):
+    return os.path.join(campaign["output_directory"], scenario["name"])
+
+
+def is_finished(campaign, scenario):
+    return os.path.exists(os.path.join(scenario_directory(campaign, scenario), SCENARIO_DONE_FILE))
+
+
+def population_to_damage(population_file):
+    # Creates the population every scenario starts from: the top creatures of the evaluated population with their
+    # evolutionary history reset.
+    # RETURNS
+    # - population              class (population), undamaged population
+    undamaged_population = Population.load_population(population_file)
+
+    num_creatures_to_damage = len(undamaged_population.population)
+    undamaged_population_sorted, _ = undamaged_population.sort_population(undamaged_population.full_population)
+    damaged_population_dict = {crt.name: crt for crt in undamaged_population_sorted[0:num_creatures_to_damage]}
+
+    return Population(population=damaged_population_dict, is_damaged=True, reset_evolution=True)
+
+
+def run_scenario(campaign, scenario, base_population, scheduler):
+    # Damages a copy of the base population, evaluates it and saves it to the scenarios directory.
+    # ARGUMENTS
+    # - campaign                dict, campaign description
+    # - scenario                dict, {"name", "damage_type", "damage_arguments"}
+    # - base_population         class (population), undamaged population, it is copied and not changed
+    # - scheduler               SimulationScheduler, simulation worker pool shared by the scenarios
+
+    directory = scenario_directory(campaign, scenario)
+    journal_file_name = os.path.join(directory, "journal.jsonl")
+
+    # An interrupted scenario carries on from its journal
+    population = None
+    if os.path.exists(journal_file_name):
+        try:
+            population, generation, start_episodes, last_generation = \
+                Population.resume_from_journal(journal_file_name)
+        except Exception as error:
+            print(str(dt.datetime.now()) + " Cannot resume damage scenario " + scenario["name"] + " (" + str(error)
+                  + "), restarting it")
+            population = None
+
+    if population is not None:
+        print(str(dt.datetime.now()) + " RESUMING DAMAGE SCENARIO " + scenario["name"] + " AT GENERATION "
+              + str(generation))
+        population.run_genetic_algorithm(last_generation - generation + 1, scheduler=scheduler,
+                                         first_generation=generation, start_episodes=start_episodes)
+    else:
+        print(str(dt.datetime.now()) + " STARTING DAMAGE SCENARIO " + scenario["name"])
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory)
+
+        population = base_population.deepcopy()
+        population.output_directory = directory
+        population.inflict_damage(damage_type=scenario["damage_type"],
+                                  damage_arguments=damage_arguments(scenario["damage_arguments"]))
+        population.run_genetic_algorithm(generation_size=campaign["generations"], scheduler=scheduler)
+
+    population.save_population(name=os.path.join(directory, scenario["name"]))
+
+    # Written last, the scenario is only skipped by later runs of the campaign once everything is saved
+    _, top_creature = population.sort_population()
+    with open(os.path.join(directory, SCENARIO_DONE_FILE), "w") as done_file:
+        json.dump({"scenario": scenario, "top_creature": top_creature.name, "top_fitness": top_creature.fitness_eval,
+                   "finished": str(dt.datetime.now())}, done_file, sort_keys=True, indent=4)
+
+    print(str(dt.datetime.now()) + " FINISHED DAMAGE SCENARIO " + scenario["name"])
+
+
+def run_campaign(campaign):
+    # Runs every unfinished scenario of the campaign, at most max_parallel_scenarios at the same time.
+    # ARGUMENTS
+    # - campaign                dict, campaign description, see load_campaign
+
+    scenarios = [scenario for scenario in campaign["scenarios"] if not is_finished(campaign, scenario)]
+    print(str(dt.datetime.now()) + " DAMAGE CAMPAIGN: " + str(len(scenarios)) + " of "
+          + str(len(campaign["scenarios"])) + " scenarios to evaluate")
+    if not scenarios:
+        return
+
+    if not os.path.exists(campaign["output_directory"]):
+        os.makedirs(campaign["output_directory"])
+
+    base_population = population_to_damage(campaign["population_file"])
+
+    pending = queue.Queue()
+    for scenario in scenarios:
+        pending.put(scenario)
+    failed = []
+
+    def evaluate_scenarios():
+        while True:
+            try:
+                scenario = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                run_scenario(campaign, scenario, base_population, scheduler)
+            except Exception:
+                traceback.print_exc()
+                failed.append(scenario["name"])
+
+    num_threads = len(scenarios)
+    if campaign["max_parallel_scenarios"] is not None:
+        num_threads = min(num_threads, campaign["max_parallel_scenarios"])
+
+    scheduler = base_population.create_scheduler()
+    try:
+        threads = [threading.Thread(target=evaluate_scenarios) for _ in range(num_threads)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        # Joined with a timeout so a KeyboardInterrupt reaches the main thread
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(1)
+    finally:
+        scheduler.close()
+
+    if failed:
+        raise Exception("ERROR: Damage scenarios " + ", ".join(sorted(failed)) + " failed. Run the campaign again to "
+                        "retry them, finished scenarios are skipped.")
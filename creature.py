@@ -1,16 +1,16 @@
-import csv
-import json
+import copy
 import os
 import subprocess as sub
-import re
-import time
 import warnings
 
 import numpy as np
 
+from history import EvolutionHistory
 from phenotype import Phenotype
-from voxel import Voxel
+from voxel import VoxelGrid
 from neural_network import NeuralNet
+from settings import get_settings
+from simulation_files import KE_SCALE, read_fitness_file, sum_csv_rows
 
 
 class Creature:
@@ -21,16 +21,18 @@ class Creature:
         # - index                                                   int, index item for creature naming
 
         # import settings
-        settings_file = open("settings.json")
-        self.settings = json.load(settings_file)
-        settings_file.close()
+        self.settings = get_settings()
 
         # create creature phenotype
         self.phenotype = Phenotype()                                  # class, creature phenotype
 
-        # Create dictionary of voxels                               # dict of classes, dictionary of creatures voxels
-        self.voxels = {str(coords): Voxel(list(coords), mat_number) for coords, mat_number
-                       in dict(np.ndenumerate(self.phenotype.morphology)).items()}
+        # Create stiffness array, every voxel starts with the base stiffness
+        self.stiffness_array = np.full(self.phenotype.morphology.shape,       # np.array of stiffness at each voxel
+                                       self.settings["structure"]["base_stiffness"], dtype=float)
+        self.initial_stiffness = self.stiffness_array.copy()               # Save initial stiffness
+
+        # Create grid of voxels, shares the morphology and stiffness arrays     # class, voxel grid of the creature
+        self.voxels = VoxelGrid(self.phenotype.morphology, self.stiffness_array, self.settings)
 
         # Basic creature information
         self.episode = None                                         # int, saves creatures current episode number
@@ -48,6 +50,8 @@ class Creature:
         self.pressures_file_name = None                             # string, current pressures file name
         self.ke_file_name = None                                    # string, current ke file name
         self.strain_file_name = None                                # string, current strain file name
+        self.simulation_directory = None                            # string, directory holding the last simulations
+        #                                                             files, None for the current working directory
 
         # Fitness variables
         self.previous_fitness = 0.0                                 # float, previous fitness
@@ -55,55 +59,59 @@ class Creature:
         self.fitness_eval = 0.0                                     # float, creatures evaluated fitness
         self.average_forces = None                                  # (z, x*y) list, average forces acting on voxels.
         #                                                             (where x, y, z are values from structure list)
+        self.ke_sum = None                                          # np.array, summed kinetic energy of the last
+        #                                                             simulation, one value per voxel
+        self.failure = None                                         # string, why the last simulation failed, else None
 
         # genome (neural network of creature
         self.neural_net = None                                      # class, neural network of the creature
 
         # evolution
-        self.evolution = {}                                         # dict, save creatures evolutionary history
-
-        # Create stiffness array and update it
-        self.stiffness_array = np.zeros(self.phenotype.morphology.shape)  # np.array of stiffness at each voxel
-        for voxel in self.voxels.values():
-            index = voxel.coordinates
-            self.stiffness_array[index[0]][index[1]][index[2]] = voxel.stiffness
-
-        self.initial_stiffness = self.stiffness_array.copy()               # Save initial stiffness
+        self.evolution = EvolutionHistory(self.settings["parameters"]["ep_size"])   # class, evolutionary history
 
     def set_neural_network(self):
         self.neural_net = NeuralNet()
 
+    def clone(self, name=None, memo=None):
+        # Fast copy of the creature, used instead of deepcopy when creating new creatures from the populations base
+        # creature. Settings, material properties and the voxel topology are immutable and shared, only the per creature
+        # state (stiffness, morphology, neural network, evolution) is copied.
+        # ARGUMENTS
+        # - name                    string, name of the new creature, defaults to this creatures name
+        # - memo                    dict, copy.deepcopy memo. Arrays (and creatures) already copied in it are reused,
+        #                           so arrays shared between creatures stay shared between their clones
+        #
+        # RETURNS
+        # - creature                class, copied creature
+        if memo is None:
+            memo = {}
+
+        creature = copy.copy(self)
+        memo[id(self)] = creature
+
+        # The voxel grid is copied through the memo so it keeps sharing its arrays with the phenotype and stiffness
+        creature.phenotype = self.phenotype.copy(memo)
+        creature.stiffness_array = copy.deepcopy(self.stiffness_array, memo)
+        creature.initial_stiffness = copy.deepcopy(self.initial_stiffness, memo)
+        creature.voxels = copy.deepcopy(self.voxels, memo)
+        creature.average_forces = copy.deepcopy(self.average_forces, memo)
+        creature.ke_sum = copy.deepcopy(self.ke_sum, memo)
+        if self.fitness_xyz is not None:
+            creature.fitness_xyz = list(self.fitness_xyz)
+
+        if self.neural_net is not None:
+            creature.neural_net = self.neural_net.copy()
+
+        creature.evolution = self.evolution.copy()
+
+        if name is not None:
+            creature.name = name
+
+        return creature
+
     def set_neighbours_and_sections(self):
-        # Get region areas
-        x_sections, y_sections, z_sections = self.settings["structure"]["sections"]
-        range_x_section, range_y_sections, range_z_sections \
-            = np.divide(self.settings["structure"]["creature_structure"], self.settings["structure"]["sections"])
-        section_counter = 0
-        section_range_dictionary = {}
-        for z in range(0, z_sections):
-            z_range = [z * range_z_sections, (z + 1) * range_z_sections]
-            for y in range(0, y_sections):
-                y_range = [y * range_z_sections, (y + 1) * range_z_sections]
-                for x in range(0, x_sections):
-                    x_range = [x * range_z_sections, (x + 1) * range_z_sections]
-                    section_range_dictionary[str(section_counter)] = [x_range, y_range, z_range]
-                    section_counter += 1
-
-        # Iterate thorough voxels and add their neighbours and the section they belong to
-        for voxel in self.voxels.values():
-            z, y, x = voxel.coordinates
-            # Get list of possible neighbours and find which voxels are within this range
-            neighbours_list = [[z, y, x - 1], [z, y, x + 1], [z, y - 1, x], [z, y + 1, x], [z - 1, y, x], [z + 1, y, x]]
-            for neighbour in self.voxels.values():
-                if neighbour.coordinates in neighbours_list:
-                    voxel.neighbours.append(neighbour)
-
-            # Find which section the x, y, z coordinates for this voxel
-            for section_num, section_range in section_range_dictionary.items():
-                if (x >= section_range[0][0]) and (x < section_range[0][1]) and (y >= section_range[1][0]) and \
-                        (y < section_range[1][1]) and (z >= section_range[2][0]) and (z < section_range[2][1]) and \
-                        voxel.section is None:
-                    voxel.section = int(section_num)
+        # Neighbours and sections are computed once per structure and shared by every creature, see voxel.grid_topology
+        self.voxels.set_topology()
 
     def update_creature_info(self, generation, episode):
         # Updates basic creature information
@@ -121,6 +129,11 @@ class Creature:
         self.ke_file_name = "ke" + self.fitness_file_name + ".csv"
         self.strain_file_name = "strain" + self.fitness_file_name + ".csv"
 
+    def simulation_file_path(self, file_name):
+        # RETURNS
+        # - file_path               string, path to one of the files written by the creatures last simulation
+        return os.path.join(self.simulation_directory or "", file_name)
+
     def update_vxa(self, generation, episode):
         # update file name before creating vxa
         self.update_creature_info(generation, episode)
@@ -129,67 +142,23 @@ class Creature:
         self.phenotype.update_vxa_file(self, stiffness_array=self.stiffness_array)
 
     def update_evolution(self):
-        # Updates creatures evolutionary history ands saves key information within its self.evolution dictionary.
+        # Updates creatures evolutionary history and saves key information within its self.evolution arrays.
         # Allows historical values to be retried at any point after simulations have completed.
-
-        if ("gen_" + str(self.generation)) not in self.evolution:
-            self.evolution[("gen_" + str(self.generation))] = {}
-
-        if ("ep_" + str(self.episode)) not in self.evolution[("gen_" + str(self.generation))]:
-            self.evolution["gen_" + str(self.generation)][("ep_" + str(self.episode))] = {}
-
-        # Update neural network parameters for current generation
-        self.evolution["gen_" + str(self.generation)].update(
-            {"nn_parameters": {key: str(value) for key, value in self.neural_net.parameters.items()}})
-
-        # Update morphology for current episode
-        self.evolution[("gen_" + str(self.generation))][("ep_" + str(self.episode))]["morphology"] = \
-            str(np.reshape(self.phenotype.morphology, (self.phenotype.structure[2], self.phenotype.structure[0]
-                                                       * self.phenotype.structure[1])).tolist())
-
-        # Update stiffness array for current episode
-        if self.stiffness_array is not None:
-            self.evolution["gen_" + str(self.generation)]["ep_" + str(self.episode)]["stiffness"] = \
-                str(np.reshape(self.stiffness_array, (self.phenotype.structure[2], self.phenotype.structure[0]
-                                                      * self.phenotype.structure[1])).tolist())
-
-        # Update fitness values for current episode
-        self.evolution["gen_" + str(self.generation)]["ep_" + str(self.episode)]\
-            .update({"fitness_xyz": str(self.fitness_xyz)})
-        self.evolution["gen_" + str(self.generation)]["ep_" + str(self.episode)]\
-            .update({"fitness_eval": self.fitness_eval})
-        self.evolution["gen_" + str(self.generation)]["ep_" + str(self.episode)]\
-            .update({"average_forces": str(self.average_forces.tolist())})
+        self.evolution.record(self.generation, self.episode, self.stiffness_array, self.phenotype.morphology,
+                              self.average_forces, self.fitness_eval, self.fitness_xyz, self.neural_net.parameters)
 
     def update_morphology(self, new_stiffness_array=None):
         # Updates creatures stiffness and morphology dependant on stiffness values
         # Additionally, as voxels are removed voxels can become isolated from any adjacent voxels. This causes errors
         # in the simulator. Hence, these isolated voxels must be removed
 
-        # Update creatures voxel stiffness and morphology and update creatures stiffness_array,
-        # if none is given this part is skipped
+        # Update creatures voxel stiffness and morphology, the voxel grid shares its arrays with phenotype.morphology
+        # and stiffness_array. If no stiffness array is given this part is skipped
         if new_stiffness_array is not None:
-            for voxel in self.voxels.values():
-                index = voxel.coordinates
-                voxel.update_with_stiffness(new_stiffness_array[index[0]][index[1]][index[2]])
+            self.voxels.update_with_stiffness(new_stiffness_array)
 
         # remove isolated voxels
-        for voxel in self.voxels.values():
-            # only run if the voxel can change and is not already removed
-            if voxel.can_be_changed and voxel.material_number:
-                # grab list of the material numbers for neighbouring voxels
-                neighbour_states = [neighbour.material_number for neighbour in voxel.neighbours]
-                # if all neighbouring voxels are 0 delete current cube
-                if not any(neighbour_states):
-                    voxel.remove()
-
-        # Update creatures morphology
-        for voxel in self.voxels.values():
-            index = voxel.coordinates
-            # Although not needed (as no change will have occurred) this will save iterations
-            if voxel.can_be_changed:
-                self.phenotype.morphology[index[0]][index[1]][index[2]] = voxel.material_number
-                self.stiffness_array[index[0]][index[1]][index[2]] = voxel.stiffness
+        self.voxels.remove_isolated()
 
     def update_neural_network(self, return_self=False):
         # Update neural network
@@ -199,80 +168,51 @@ class Creature:
         if return_self:
             return self
 
-    def calculate_fitness(self):
+    def calculate_fitness(self, fitness_result=None):
         # Evaluates creatures fitness by reading the saved fitness file and saves fitness evaluation. Punishes creature
         # for displacement in y axis
+        # ARGUMENTS
+        # - fitness_result          FitnessResult, already read fitness file (see simulation_files.read_fitness_files),
+        #                           the creatures fitness file is read if not given
+
+        # The simulator has exited before this is called, raises FitnessFileError if the file is incomplete
+        if fitness_result is None:
+            fitness_result = read_fitness_file(self.simulation_file_path(self.fitness_file_name))
 
         # Update old fitness with current fitness
         self.previous_fitness = self.fitness_eval
 
-        tag_x = "<normDistX>(.*)</normDistX>"
-        tag_y = "<normDistY>(.*)</normDistY>"
-        tag_z = "<normDistZ>(.*)</normDistZ>"
-
-        while True:
-            tic = time.time()
-            with open(self.fitness_file_name, "r") as fitness_file:
-                read_file = fitness_file.read()
-                x_match = re.search(tag_x, read_file)
-                y_match = re.search(tag_y, read_file)
-                z_match = re.search(tag_z, read_file)
-            fitness_file.close()
-
-            if x_match and y_match and z_match:
-                result_x = float(x_match.group(1))
-                result_y = float(y_match.group(1))
-                result_z = float(z_match.group(1))
-                break
-            time.sleep(5)
-            toc = time.time() - tic
-            if toc > 120:
-                raise Exception("Error while importing data from fitness evaluation. Fitness file name: "
-                                + self.fitness_file_name)
-
         # Save fitness values
-        self.fitness_xyz = [result_x, result_y, result_z]
-
-        if self.settings["fitness_evaluation"]["take_absolutes"][0]:
-            result_x = abs(result_x)
-        if self.settings["fitness_evaluation"]["take_absolutes"][1]:
-            result_y = abs(result_y)
-        if self.settings["fitness_evaluation"]["take_absolutes"][2]:
-            result_z = abs(result_z)
-
-        m = self.settings["fitness_evaluation"]["M"]
-        m_x = self.settings["fitness_evaluation"]["Mx"]
-        m_y = self.settings["fitness_evaluation"]["My"]
-        m_z = self.settings["fitness_evaluation"]["Mz"]
-        n = self.settings["fitness_evaluation"]["N"]
-        n_x = self.settings["fitness_evaluation"]["Nx"]
-        n_y = self.settings["fitness_evaluation"]["Ny"]
-        n_z = self.settings["fitness_evaluation"]["Nz"]
+        self.fitness_xyz = fitness_result.norm_dist
 
         # Calculate fitness, punish for locomotion that is not in a straight line
-        self.fitness_eval = m * ((m_x * (result_x**n_x) +
-                                  m_y * (result_y**n_y) +
-                                  m_z * (result_z**n_z))**n)
+        self.fitness_eval = fitness_result.fitness(self.settings["fitness_evaluation"])
 
     def calculate_stiffness(self):
         # Uses artificial neural network to update the creatures morphology and stiffness array.
+        nn_inputs = self.neural_network_inputs()
+        self.apply_neural_network_outputs(self.neural_net.forward_batch(nn_inputs))
+
+    def neural_network_inputs(self, ke_sum=None):
+        # Reads the kinetic energy of the last simulation and builds the input of the creatures neural network, one row
+        # per voxel. Also updates the evolutionary history of the creature.
+        # ARGUMENTS
+        # - ke_sum                  np.array, summed kinetic energy of the simulation (E.g. from the result cache), the
+        #                           creatures KE file is read if not given
+        #
+        # RETURNS
+        # - nn_inputs               (x*y*z, 2) np.array, ke delta and displacement delta of each voxel
 
         # Calculate displacement since last evaluation
         displacement_delta = self.fitness_eval - self.previous_fitness
 
-        # Average forces
-        average_forces = np.zeros(
-            (self.phenotype.structure[2], self.phenotype.structure[0], self.phenotype.structure[1]))
-
-        # Format KE file
-        with open(self.ke_file_name) as kef:
-            ke_data = csv.reader(kef)
-            for row in ke_data:
-                row_data = np.multiply(np.array(row[:-1], dtype=np.float), 10)
-                row_array = np.reshape(row_data, (self.phenotype.structure[2],
-                                                  self.phenotype.structure[0], self.phenotype.structure[1]))
-                average_forces += row_array
-        kef.close()
+        # Average forces, sum of the kinetic energy of every time step (times KE_SCALE) read from the KE file in blocks
+        if ke_sum is None:
+            ke_sum, _ = sum_csv_rows(self.simulation_file_path(self.ke_file_name), np.prod(self.phenotype.structure),
+                                     scale=KE_SCALE)
+        self.ke_sum = ke_sum
+        average_forces = np.reshape(ke_sum, (self.phenotype.structure[2],
+                                             self.phenotype.structure[0], self.phenotype.structure[1]))
 
         # set self.average_forces vector and calculate ultimate avg
         self.average_forces = np.divide(average_forces, np.prod(self.phenotype.structure))
@@ -284,9 +224,14 @@ class Creature:
         # Update evolutionary history of creature before calculation and updating stiffness
         self.update_evolution()
 
-        # Use NN to update the stiffness array of the creature
-        vectorized_nn = np.vectorize(self.neural_net.forward_propagation)
-        stiffness_delta, cache = vectorized_nn(ke_delta, displacement_delta)
+        return np.column_stack((ke_delta.ravel(), np.full(ke_delta.size, displacement_delta)))
+
+    def apply_neural_network_outputs(self, nn_outputs):
+        # Uses the output of the creatures neural network to update its stiffness and morphology.
+        # ARGUMENTS
+        # - nn_outputs              (x*y*z, 1) np.array, neural network output for each row of neural_network_inputs
+
+        stiffness_delta = np.reshape(nn_outputs[:, 0], self.average_forces.shape)
         stiffness_delta = np.multiply(stiffness_delta, self.settings["parameters"]["stiff_delta_mult"])
 
         # Update stiffness of voxels
@@ -296,13 +241,20 @@ class Creature:
         self.update_morphology(new_stiffness_array)
 
     def find_voxel_by_coordinates(self, coordinates):
-        for voxel in self.voxels.values():
-            if coordinates == voxel.coordinates:
-                return voxel
+        if self.voxels.contains(coordinates):
+            return self.voxels[coordinates]
 
         raise Exception("ERROR: Voxel not found, please ensure given coordinates are formatted correctly.")
 
     def find_voxels_in_radius(self, centre_voxel_coordinates, radius):
+        # RETURNS
+        # - voxels_in_radius        set of voxel views within radius - 1 steps of the centre voxel
+        mask = self.find_voxels_mask_in_radius(centre_voxel_coordinates, radius)
+        return {self.voxels[coordinates] for coordinates in np.argwhere(mask)}
+
+    def find_voxels_mask_in_radius(self, centre_voxel_coordinates, radius):
+        # RETURNS
+        # - mask                    np.array of bool (z, y, x), voxels within radius - 1 steps of the centre voxel
         if radius == 1:
             warnings.warn("The remove_spherical_region parameter was set to 1. This will only remove the centre voxel"
                           " and none of its neighbours.")
@@ -312,16 +264,13 @@ class Creature:
         # Find centre voxel
         centre_voxel = self.find_voxel_by_coordinates(centre_voxel_coordinates)
 
-        # Create list of voxels that are in the desired area
-        voxels_in_radius = {centre_voxel}
-        while radius > 1:
-            affected_voxels = list(voxels_in_radius)
-            for i in range(len(affected_voxels)):
-                voxel = affected_voxels[i]
-                voxels_in_radius.update(voxel.neighbours)
-            radius = radius - 1
+        # Stepping from neighbour to neighbour within the (box shaped) grid covers the voxels within a manhattan
+        # distance of radius - 1
+        z, y, x = np.indices(self.voxels.shape)
+        centre_z, centre_y, centre_x = centre_voxel.coordinates
+        distance = abs(z - centre_z) + abs(y - centre_y) + abs(x - centre_x)
 
-        return voxels_in_radius
+        return distance <= radius - 1
 
     def reset(self):
         # reset morphology and stiffness to initial conditions
@@ -331,6 +280,19 @@ class Creature:
         self.fitness_eval = 0.0
         self.previous_fitness = 0.0
 
+        # Failed simulations are only skipped for the rest of the generation
+        self.failure = None
+
+    def mark_failed(self, reason):
+        # Records that the creatures simulation failed (E.g. voxelyze crashed, timed out or was stopped early by the
+        # supervisor). The creature gets the penalty fitness and is not simulated again until it is reset at the start
+        # of the next generation.
+        # ARGUMENTS
+        # - reason                  string, why the simulation failed
+        self.failure = reason
+        self.previous_fitness = self.fitness_eval
+        self.fitness_eval = float(self.settings["evaluation"]["penalty_fitness"])
+
     def evaluate(self):
         # launch simulation
         sub.Popen(self.settings["evosoro_path"] + " -f  " + self.current_file_name + ".vxa", shell=True)
@@ -342,9 +304,7 @@ class Creature:
             sections = [sections]
         assert isinstance(sections, list)
 
-        for voxel in self.voxels.values():
-            if voxel.section in sections:
-                voxel.remove()
+        self.voxels.remove(self.voxels.section_mask(sections))
 
         # Update creature name
         self.name = self.name + "_removed_sections_" + "_".join(str(elem) for elem in sections)
@@ -367,45 +327,39 @@ class Creature:
 
         # Multiplies stiffness of affected region by input
         if multiply_stiffness:
-            for voxel in self.voxels.values():
-                if voxel.section in sections:
-                    voxel.update_with_stiffness(voxel.stiffness*multiply_stiffness)
+            new_stiffness = self.voxels.stiffness*multiply_stiffness
+            self.voxels.update_with_stiffness(new_stiffness, self.voxels.section_mask(sections))
 
             # Update creature name
             self.name = self.name + "_stiffness_multiplied_sections_" + "_".join(str(elem) for elem in sections)
 
         # Divides stiffness of affected region by input
         if divide_stiffness:
-            for voxel in self.voxels.values():
-                if voxel.section in sections:
-                    voxel.update_with_stiffness(voxel.stiffness/divide_stiffness)
+            new_stiffness = self.voxels.stiffness/divide_stiffness
+            self.voxels.update_with_stiffness(new_stiffness, self.voxels.section_mask(sections))
 
             # Update creature name
             self.name = self.name + "_stiffness_divided_sections_" + "_".join(str(elem) for elem in sections)
 
         # Changes stiffness to given input
         if set_new_stiffness:
-            for voxel in self.voxels.values():
-                if voxel.section in sections:
-                    voxel.update_with_stiffness(set_new_stiffness)
+            self.voxels.update_with_stiffness(set_new_stiffness, self.voxels.section_mask(sections))
 
             # Update creature name
             self.name = self.name + "_stiffness_changed_sections_" + "_".join(str(elem) for elem in sections)
 
         # Add to stiffness of affected region by input
         if increase_stiffness:
-            for voxel in self.voxels.values():
-                if voxel.section in sections:
-                    voxel.update_with_stiffness(voxel.stiffness + increase_stiffness)
+            new_stiffness = self.voxels.stiffness + increase_stiffness
+            self.voxels.update_with_stiffness(new_stiffness, self.voxels.section_mask(sections))
 
             # Update creature name
             self.name = self.name + "_stiffness_increased_sections_" + "_".join(str(elem) for elem in sections)
 
         # reduce stiffness of affected region by input
         if reduce_stiffness:
-            for voxel in self.voxels.values():
-                if voxel.section in sections:
-                    voxel.update_with_stiffness(voxel.stiffness - reduce_stiffness)
+            new_stiffness = self.voxels.stiffness - reduce_stiffness
+            self.voxels.update_with_stiffness(new_stiffness, self.voxels.section_mask(sections))
 
             # Update creature name
             self.name = self.name + "_stiffness_reduced_sections_" + "_".join(str(elem) for elem in sections)
@@ -415,12 +369,11 @@ class Creature:
 
     def remove_voxels_spherical_region(self, centre_voxel_coordinates, radius):
 
-        # Get list of voxels in radius
-        voxels_in_radius = self.find_voxels_in_radius(centre_voxel_coordinates, radius)
+        # Get voxels in radius
+        voxels_in_radius = self.find_voxels_mask_in_radius(centre_voxel_coordinates, radius)
 
         # Set material number for voxels in radius to zero
-        for voxel in voxels_in_radius:
-            voxel.remove()
+        self.voxels.remove(voxels_in_radius)
 
         # Update creature name
         self.name = self.name + "_sphere_removed_radius_" + str(radius)
@@ -437,50 +390,40 @@ class Creature:
             raise Exception("ERROR: You must provide some for of stiffness change"
                             " for spherical_region_stiffness_change")
 
-        # Get list of voxels in radius
-        voxels_in_radius = self.find_voxels_in_radius(centre_voxel_coordinates, radius)
+        # Get voxels in radius
+        voxels_in_radius = self.find_voxels_mask_in_radius(centre_voxel_coordinates, radius)
 
         # Multiplies stiffness of affected region by input
         if multiply_stiffness:
-            for voxel in voxels_in_radius:
-                if voxel.can_be_changed:
-                    voxel.update_with_stiffness(voxel.stiffness*multiply_stiffness)
+            self.voxels.update_with_stiffness(self.voxels.stiffness*multiply_stiffness, voxels_in_radius)
 
             # Update creature name
             self.name = self.name + "_sphere_multiplied_radius_" + str(radius)
 
         # Divides stiffness of affected region by input
         if divide_stiffness:
-            for voxel in voxels_in_radius:
-                if voxel.can_be_changed:
-                    voxel.update_with_stiffness(voxel.stiffness/divide_stiffness)
+            self.voxels.update_with_stiffness(self.voxels.stiffness/divide_stiffness, voxels_in_radius)
 
             # Update creature name
             self.name = self.name + "_sphere_divided_radius_" + str(radius)
 
         # Changes stiffness to given input
         if set_new_stiffness:
-            for voxel in voxels_in_radius:
-                if voxel.can_be_changed:
-                    voxel.update_with_stiffness(set_new_stiffness)
+            self.voxels.update_with_stiffness(set_new_stiffness, voxels_in_radius)
 
             # Update creature name
             self.name = self.name + "_sphere_changed_radius_" + str(radius)
 
         # Add to stiffness of affected region by input
         if increase_stiffness:
-            for voxel in voxels_in_radius:
-                if voxel.can_be_changed:
-                    voxel.update_with_stiffness(voxel.stiffness + increase_stiffness)
+            self.voxels.update_with_stiffness(self.voxels.stiffness + increase_stiffness, voxels_in_radius)
 
             # Update creature name
             self.name = self.name + "_sphere_increased_radius_" + str(radius)
 
         # reduce stiffness of affected region by input
         if reduce_stiffness:
-            for voxel in voxels_in_radius:
-                if voxel.can_be_changed:
-                    voxel.update_with_stiffness(voxel.stiffness - reduce_stiffness)
+            self.voxels.update_with_stiffness(self.voxels.stiffness - reduce_stiffness, voxels_in_radius)
 
             # Update creature name
             self.name = self.name + "_sphere_divided_radius_" + str(radius)
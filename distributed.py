@@ -0,0 +1,415 @@
+import hmac
+import json
+import os
+import socket
+import struct
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import numpy as np
+
+from scheduler import SimulationJob, SimulationScheduler
+from simulation_files import SimulationResult, read_simulation_result
+
+
+# DISTRIBUTED EVALUATION
+# Spreads simulations over several machines. The population process runs a DistributedScheduler, a broker with the same
+# submit/wait interface as SimulationScheduler, which listens for worker agents (worker.py) on a TCP port or a Unix
+# socket. Every worker runs voxelyze on its own machine with a local SimulationScheduler and only sends back what the
+# population needs: the fitness values and the summed kinetic energy (see simulation_files.SimulationResult). The
+# simulation files stay on the worker and are removed.
+#
+# Messages are JSON objects, each sent as a 4 byte big-endian length followed by the UTF-8 encoded JSON:
+# - hello                   worker -> broker, {"name": worker name, "capacity": simulations run at once,
+#                                              "token": shared token, see broker_token in settings.json}
+# - job                     broker -> worker, {"id", "name", "vxa_text", "expected_files"}
+# - result                  worker -> broker, {"id", "returncode", "error", "fitness_values", "ke_sum"}
+# - heartbeat               worker -> broker, sent every HEARTBEAT_INTERVAL seconds
+#
+# A worker that disconnects or stops sending heartbeats is dropped and the jobs it was running are queued again.
+#
+# Anyone who can connect to the broker can take jobs, so it listens on 127.0.0.1 unless broker_address is changed. When
+# it listens on a network interface set the same broker_token on the broker and the workers, connections whose hello
+# does not carry it are closed. A worker only runs jobs whose name and expected files are plain file names, so a broker
+# cannot make it write outside the jobs scratch directory.
+
+HEARTBEAT_INTERVAL = 5              # float, seconds between the heartbeats of a worker
+MAX_MESSAGE_SIZE = 64 * 1024 * 1024 # int, bytes, longer messages are refused before they are read
+_LENGTH = struct.Struct(">I")
+
+
+def parse_address(address):
+    # ARGUMENTS
+    # - address                 string, "host:port" for TCP or "unix:/path/to/socket" for a Unix socket
+    #
+    # RETURNS
+    # - family                  int, socket address family
+    # - address                 tuple or string, address as used by socket.bind and socket.connect
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:"):]
+
+    host, _, port = address.rpartition(":")
+    if not host or not port.isdigit():
+        raise Exception("ERROR: Broker address " + address + " is neither host:port nor unix:/path.")
+    return socket.AF_INET, (host, int(port))
+
+
+def send_message(connection, message):
+    data = json.dumps(message).encode("utf-8")
+    connection.sendall(_LENGTH.pack(len(data)) + data)
+
+
+def receive_message(connection):
+    # RETURNS
+    # - message                 dict, next message, raises EOFError if the connection was closed
+    length, = _LENGTH.unpack(_receive_exactly(connection, _LENGTH.size))
+    if length > MAX_MESSAGE_SIZE:
+        raise ValueError("Message of " + str(length) + " bytes is longer than " + str(MAX_MESSAGE_SIZE) + " bytes")
+    return json.loads(_receive_exactly(connection, length).decode("utf-8"))
+
+
+def is_file_name(name):
+    # RETURNS
+    # - is_file_name            bool, True if name is a file name without any directory part
+    return isinstance(name, (str, type(u""))) and name not in ("", ".", "..") and name == os.path.basename(name) \
+        and "\\" not in name
+
+
+def same_token(token, expected_token):
+    # RETURNS
+    # - same                    bool, True if the token sent by a worker is the expected one, compared in constant time
+    if not isinstance(token, (str, type(u""))):
+        return False
+    return hmac.compare_digest(token.encode("utf-8"), expected_token.encode("utf-8"))
+
+
+def _disconnect(connection):
+    # Shuts the connection down before closing it, this wakes up a thread blocked reading from it
+    try:
+        connection.shutdown(socket.SHUT_RDWR)
+    except (socket.error, OSError):
+        pass
+    connection.close()
+
+
+def _receive_exactly(connection, size):
+    chunks = []
+    while size:
+        chunk = connection.recv(min(size, 1 << 20))
+        if not chunk:
+            raise EOFError("Connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+class _WorkerConnection:
+    def __init__(self, connection, name, capacity):
+        # A worker agent connected to the broker.
+        self.connection = connection                                # socket, connection to the worker
+        self.name = name                                            # string, worker name (host and process id)
+        self.capacity = capacity                                    # int, simulations the worker runs at once
+        self.jobs = {}                                              # dict, {job id: SimulationJob} being simulated
+        self.send_lock = threading.Lock()                           # lock, one message is sent at a time
+
+
+class DistributedScheduler(SimulationScheduler):
+    def __init__(self, address, heartbeat_timeout=30, max_attempts=3, token=None):
+        # Broker sending simulations to remote worker agents. Jobs are queued until a worker has a free simulation,
+        # finished jobs carry a SimulationResult in job.result instead of leaving files in a working directory.
+        # ARGUMENTS
+        # - address                 string, "host:port" or "unix:/path" to listen on for workers
+        # - heartbeat_timeout       float, seconds without a message after which a worker is considered lost
+        # - max_attempts            int, times a job is sent to a worker before it is failed (E.g. it keeps crashing
+        #                           the workers it is sent to)
+        # - token                   string, shared token workers must send in their hello, None to accept any worker
+
+        SimulationScheduler.__init__(self, "voxelyze", max_workers=1)
+
+        self.address = address                                      # string, address workers connect to
+        self.heartbeat_timeout = heartbeat_timeout                  # float, limit between messages of a worker
+        self.max_attempts = max_attempts                            # int, attempts per job
+        self.token = token                                          # string, shared token of the workers
+
+        self._workers = []                                          # list, connected _WorkerConnection
+        self._attempts = {}                                         # dict, {SimulationJob: times sent to a worker}
+        self._next_id = 0                                           # int, id of the next job sent
+        self._closed = False
+
+        family, bind_address = parse_address(address)
+        if family == socket.AF_UNIX and os.path.exists(bind_address):
+            os.remove(bind_address)
+        if family == socket.AF_INET and token is None and not bind_address[0].startswith("127.") \
+                and bind_address[0] != "localhost":
+            print("WARNING: The broker listens on " + address + " without a broker_token, anyone who can reach it can "
+                  "connect as a worker.")
+        self._listener = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(bind_address)
+        self._listener.listen(64)
+
+        accepter = threading.Thread(target=self._accept_workers)
+        accepter.daemon = True
+        accepter.start()
+
+    def num_workers(self):
+        with self._lock:
+            return len(self._workers)
+
+    def num_running(self):
+        with self._lock:
+            return sum(len(worker.jobs) for worker in self._workers)
+
+    def close(self):
+        # Drops queued jobs and disconnects the workers, their simulations are abandoned
+        with self._lock:
+            self._closed = True
+            self._pending.clear()
+            workers = list(self._workers)
+            self._workers = []
+
+        for worker in workers:
+            _disconnect(worker.connection)
+        _disconnect(self._listener)
+
+        family, bind_address = parse_address(self.address)
+        if family == socket.AF_UNIX and os.path.exists(bind_address):
+            os.remove(bind_address)
+
+    def _accept_workers(self):
+        while True:
+            try:
+                connection, _ = self._listener.accept()
+            except (socket.error, OSError):
+                # Listener closed
+                return
+
+            handler = threading.Thread(target=self._serve_worker, args=(connection,))
+            handler.daemon = True
+            handler.start()
+
+    def _serve_worker(self, connection):
+        # Reads the messages of a worker until it disconnects, then queues its unfinished jobs again
+        connection.settimeout(self.heartbeat_timeout)
+        try:
+            hello = receive_message(connection)
+            worker = _WorkerConnection(connection, hello["name"], hello["capacity"])
+        except (socket.error, EOFError, ValueError, KeyError):
+            connection.close()
+            return
+
+        if self.token is not None and not same_token(hello.get("token"), self.token):
+            print("Worker " + str(worker.name) + " rejected, it did not send the broker_token")
+            _disconnect(connection)
+            return
+
+        with self._lock:
+            if self._closed:
+                connection.close()
+                return
+            self._workers.append(worker)
+            self._launch_pending()
+        print("Worker " + worker.name + " connected, runs " + str(worker.capacity) + " simulations at once")
+
+        try:
+            while True:
+                message = receive_message(connection)
+                if message["type"] == "result":
+                    self._finish(worker, message)
+        except (socket.error, EOFError, ValueError, KeyError):
+            pass
+
+        self._drop_worker(worker)
+
+    def _finish(self, worker, message):
+        with self._lock:
+            job = worker.jobs.pop(message["id"], None)
+            self._attempts.pop(job, None)
+            self._launch_pending()
+        if job is None:
+            # Result of a job which was already given up on
+            return
+
+        job.end_time = time.time()
+        job.returncode = message["returncode"]
+        job.error = message["error"]
+        if job.error is None and job.returncode == 0:
+            job.result = SimulationResult(message["fitness_values"], np.array(message["ke_sum"]))
+        job.vxa_text = None
+        job.completed_queue.put(job)
+
+    def _drop_worker(self, worker):
+        failed = []
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+            for job in worker.jobs.values():
+                if self._attempts[job] >= self.max_attempts:
+                    del self._attempts[job]
+                    job.error = ("Simulation lost with " + str(self.max_attempts) + " workers, the last one was "
+                                 + worker.name)
+                    job.end_time = time.time()
+                    job.vxa_text = None
+                    failed.append(job)
+                elif not self._closed:
+                    # Requeued at the front, these jobs were submitted before anything still queued
+                    self._pending.appendleft(job)
+            worker.jobs = {}
+            self._launch_pending()
+
+        _disconnect(worker.connection)
+        if not self._closed:
+            print("Worker " + worker.name + " disconnected")
+
+        for job in failed:
+            job.completed_queue.put(job)
+
+    def _launch_pending(self):
+        # Must be called while holding self._lock. Sends queued jobs to the workers with free simulations.
+        while self._pending:
+            workers = [worker for worker in self._workers if len(worker.jobs) < worker.capacity]
+            if not workers:
+                return
+            worker = max(workers, key=lambda candidate: candidate.capacity - len(candidate.jobs))
+            self._send(worker, self._pending.popleft())
+
+    def _send(self, worker, job):
+        # Must be called while holding self._lock. A job sent again gets a new id, so a late result from the worker
+        # it was taken from is ignored.
+        job_id = self._next_id
+        self._next_id += 1
+
+        job.start_time = time.time()
+        worker.jobs[job_id] = job
+        self._attempts[job] = self._attempts.get(job, 0) + 1
+        try:
+            with worker.send_lock:
+                send_message(worker.connection, {"type": "job", "id": job_id, "name": job.name,
+                                                 "vxa_text": job.vxa_text, "expected_files": job.expected_files})
+        except (socket.error, OSError):
+            # The workers reader notices the broken connection and queues its jobs again
+            _disconnect(worker.connection)
+
+
+class WorkerAgent:
+    def __init__(self, address, simulator_path, max_workers=None, timeout=None, output_timeout=10,
+                 scratch_directory=None, name=None, supervisor=None, token=None):
+        # Runs simulations sent by a DistributedScheduler on this machine. Reconnects when the broker goes away, so one
+        # agent serves consecutive runs.
+        # ARGUMENTS
+        # - address                 string, "host:port" or "unix:/path" of the broker
+        # - simulator_path          string, path to the voxelyze executable on this machine
+        # - max_workers             int, simulations run at once, defaults to the number of cpus
+        # - timeout                 float, seconds a simulation may run before it is killed, None for no limit
+        # - output_timeout          float, seconds to wait for the output files after the simulator exited
+        # - scratch_directory       string, where simulations run, defaults to the systems temporary directory
+        # - name                    string, name shown by the broker, defaults to host name and process id
+        # - supervisor              SimulationSupervisor, stops hopeless simulations early, None to run them to the end
+        # - token                   string, shared token sent to the broker, None if the broker has none
+
+        self.address = address                                      # string, broker address
+        self.simulator_path = simulator_path                        # string, path to voxelyze
+        self.max_workers = max_workers                              # int, concurrent simulations
+        self.timeout = timeout                                      # float, simulation wall-clock limit
+        self.output_timeout = output_timeout                        # float, limit to wait for output files
+        self.scratch_directory = scratch_directory                  # string, parent of the scratch directories
+        self.name = name or socket.gethostname() + ":" + str(os.getpid())   # string, worker name
+        self.supervisor = supervisor                                # SimulationSupervisor, watches running jobs
+        self.token = token                                          # string, shared token of the broker
+
+    def run(self, retry_interval=5):
+        # Serves brokers until the process is stopped
+        while True:
+            try:
+                self.serve()
+            except (socket.error, OSError, EOFError, ValueError):
+                pass
+            time.sleep(retry_interval)
+
+    def serve(self):
+        # Connects to the broker and runs its jobs until the connection is closed
+        family, address = parse_address(self.address)
+        connection = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            # Lets the operating system notice a broker whose machine went away without closing the connection
+            connection.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        connection.connect(address)
+
+        scheduler = SimulationScheduler(self.simulator_path, self.max_workers, timeout=self.timeout,
+                                        output_timeout=self.output_timeout, scratch_directory=self.scratch_directory,
+                                        supervisor=self.supervisor)
+        send_lock = threading.Lock()
+        completed = queue.Queue()
+        stopped = threading.Event()
+
+        def send(message):
+            with send_lock:
+                send_message(connection, message)
+
+        def send_results():
+            while True:
+                job = completed.get()
+                if job is None:
+                    return
+                try:
+                    send(self.job_result(job))
+                except (socket.error, OSError):
+                    pass
+                finally:
+                    job.remove_scratch_directory()
+
+        def send_heartbeats():
+            while not stopped.wait(HEARTBEAT_INTERVAL):
+                try:
+                    send({"type": "heartbeat"})
+                except (socket.error, OSError):
+                    return
+
+        threads = [threading.Thread(target=send_results), threading.Thread(target=send_heartbeats)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        try:
+            send({"type": "hello", "name": self.name, "capacity": scheduler.max_workers, "token": self.token})
+            while True:
+                message = receive_message(connection)
+                if message["type"] == "job":
+                    if not is_file_name(message["name"]) or not all(is_file_name(file_name)
+                                                                    for file_name in message["expected_files"]):
+                        # The job name and expected files are joined to the scratch directory
+                        send({"type": "result", "id": message["id"], "returncode": None, "fitness_values": None,
+                              "ke_sum": None, "error": "Job name " + repr(message["name"]) + " or its expected files "
+                              "are not plain file names"})
+                        continue
+                    job = SimulationJob(message["name"], payload=message, expected_files=message["expected_files"],
+                                        vxa_text=message["vxa_text"])
+                    scheduler.submit(job, completed)
+        finally:
+            stopped.set()
+            scheduler.close()
+            completed.put(None)
+            connection.close()
+
+    @staticmethod
+    def job_result(job):
+        # RETURNS
+        # - message                 dict, result message of a finished job
+        message = {"type": "result", "id": job.payload["id"], "returncode": job.returncode, "error": job.error,
+                   "fitness_values": None, "ke_sum": None}
+        if job.succeeded():
+            try:
+                result = read_simulation_result(job.working_directory, job.payload["vxa_text"])
+                message["fitness_values"] = result.fitness_values
+                message["ke_sum"] = result.ke_sum.tolist()
+            except Exception as error:
+                message["error"] = str(error)
+
+        return message
+
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+import hashlib
+import math
+import os
+import random
+import re
+import sys
+import time
+
+
+# Stand-in for the voxelyze executable, used by the benchmarks (see benchmarks.py) and to run the genetic algorithm on a
+# machine without voxelyze: set "evosoro_path" to this file. Called like voxelyze:
+#
+#     fake_voxelyze.py -f <file>.vxa
+#
+# It sleeps for a randomly drawn simulation time while writing kinetic energy, pressure and strain CSV files of random
+# values (one row per recorded time step, one value per voxel, six significant digits and a trailing comma, like
+# voxelyze), then writes the fitness file. The values are drawn from a random state seeded with the vxa file, so the
+# same creature gives the same results. Configured with environment variables:
+# - FAKE_VOXELYZE_TIME          float, median simulation time in seconds (default 0.1)
+# - FAKE_VOXELYZE_DISTRIBUTION  string, distribution of the simulation time: "lognormal" (default), "uniform",
+#                               "exponential" or "constant"
+# - FAKE_VOXELYZE_SPREAD        float, sigma of the lognormal distribution, or half width of the uniform distribution
+#                               relative to the median (default 0.3)
+# - FAKE_VOXELYZE_STEPS         int, number of rows written to every CSV file (default 100)
+# - FAKE_VOXELYZE_SEED          string, mixed into the seed taken from the vxa file (default "0")
+
+WRITE_CHUNKS = 10                   # int, the CSV files are written in this many parts spread over the simulation time
+CSV_SCALES = (1e-4, 1e3, 1e-2)      # tuple, largest kinetic energy, pressure and strain value written
+
+# Same as in simulation_files, numpy is not imported so starting the script takes little time next to the simulation
+_FITNESS_FILE_NAME = re.compile(r"<FitnessFileName>([^<]*)</FitnessFileName>")
+_VOXELS = re.compile(r"<([XYZ])_Voxels>\s*(\d+)\s*</[XYZ]_Voxels>")
+
+
+def simulation_time(random_state, median, distribution, spread):
+    # RETURNS
+    # - seconds                 float, simulation time drawn from the distribution
+    if distribution == "lognormal":
+        return random_state.lognormvariate(math.log(median), spread)
+    if distribution == "uniform":
+        return median * random_state.uniform(1 - spread, 1 + spread)
+    if distribution == "exponential":
+        return random_state.expovariate(math.log(2) / median)
+    if distribution == "constant":
+        return median
+    raise Exception("ERROR: Unknown FAKE_VOXELYZE_DISTRIBUTION '" + distribution + "', use 'lognormal', 'uniform', "
+                    "'exponential' or 'constant'.")
+
+
+def write_rows(csv_file, random_state, num_rows, num_values, scale):
+    csv_file.write("".join(",".join("{:g}".format(random_state.uniform(0, scale)) for _ in range(num_values)) + ",\n"
+                           for _ in range(num_rows)))
+
+
+def fitness_text(random_state):
+    # RETURNS
+    # - text                    string, fitness file as written by voxelyze
+    distance = [random_state.gauss(0, 1) for _ in range(3)]
+    return ('<?xml version="1.0" encoding="ISO-8859-1"?>\n'
+            '<Voxelyze_Sim_Result Version="1.0">\n'
+            '<Fitness>\n'
+            '\t<FinalCOM_Dist>' + "{:g}".format(math.sqrt(sum(value**2 for value in distance))) + '</FinalCOM_Dist>\n'
+            '\t<normDistX>' + "{:g}".format(distance[0]) + '</normDistX>\n'
+            '\t<normDistY>' + "{:g}".format(distance[1]) + '</normDistY>\n'
+            '\t<normDistZ>' + "{:g}".format(distance[2]) + '</normDistZ>\n'
+            '</Fitness>\n'
+            '</Voxelyze_Sim_Result>\n')
+
+
+def simulate(vxa_file_path):
+    with open(vxa_file_path) as vxa_file:
+        vxa_text = vxa_file.read()
+    fitness_file_name = _FITNESS_FILE_NAME.search(vxa_text).group(1).strip()
+    voxels = dict(_VOXELS.findall(vxa_text))
+    num_voxels = int(voxels["X"]) * int(voxels["Y"]) * int(voxels["Z"])
+
+    # The fitness file name is the only part of the vxa file that changes between episodes of the same creature
+    digest = hashlib.sha256(vxa_text.replace(fitness_file_name, "").encode("utf-8")).hexdigest()
+    random_state = random.Random(digest + os.environ.get("FAKE_VOXELYZE_SEED", "0"))
+
+    seconds = simulation_time(random_state, float(os.environ.get("FAKE_VOXELYZE_TIME", 0.1)),
+                              os.environ.get("FAKE_VOXELYZE_DISTRIBUTION", "lognormal"),
+                              float(os.environ.get("FAKE_VOXELYZE_SPREAD", 0.3)))
+    steps = int(os.environ.get("FAKE_VOXELYZE_STEPS", 100))
+
+    # Writing the rows is part of the simulation time, unless there are too many to write in time
+    start_time = time.time()
+    csv_files = [open(prefix + fitness_file_name + ".csv", "w") for prefix in ("ke", "pressures", "strain")]
+    try:
+        for chunk in range(WRITE_CHUNKS):
+            time.sleep(max(start_time + seconds * (chunk + 1) / WRITE_CHUNKS - time.time(), 0))
+            num_rows = steps * (chunk + 1) // WRITE_CHUNKS - steps * chunk // WRITE_CHUNKS
+            for csv_file, scale in zip(csv_files, CSV_SCALES):
+                write_rows(csv_file, random_state, num_rows, num_voxels, scale)
+                csv_file.flush()
+    finally:
+        for csv_file in csv_files:
+            csv_file.close()
+
+    with open(fitness_file_name, "w") as fitness_file:
+        fitness_file.write(fitness_text(random_state))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "-f":
+        print("Usage: fake_voxelyze.py -f <file>.vxa")
+        sys.exit(1)
+    simulate(sys.argv[2])
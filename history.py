@@ -0,0 +1,159 @@
+import numpy as np
+
+
+# HISTORY
+# Evolutionary history of a creature stored as typed arrays, one row per generation the creature was evaluated in and
+# one column per episode. Arrays are allocated on the first record and grow (doubling) along the generation axis, each
+# episode is written in place.
+
+HISTORY_ARRAYS = ("generations", "recorded", "fitness_eval", "fitness_xyz", "stiffness", "morphology",
+                  "average_forces")
+
+
+class EvolutionHistory:
+    def __init__(self, num_episodes):
+        # ARGUMENTS
+        # - num_episodes            int, number of episodes per generation
+
+        self.num_episodes = num_episodes        # int, episodes per generation
+        self.size = 0                           # int, number of generations recorded
+
+        # Allocated on the first record, first axis is the generation
+        self.generations = None                 # np.array (g,), generation number of each row
+        self.recorded = None                    # np.array (g, episodes), was the episode recorded
+        self.fitness_eval = None                # np.array (g, episodes), fitness evaluation, nan if not recorded
+        self.fitness_xyz = None                 # np.array (g, episodes, 3), fitness values, nan if not recorded
+        self.stiffness = None                   # np.array (g, episodes, z, y, x), stiffness during the episode
+        self.morphology = None                  # np.array (g, episodes, z, y, x), material numbers, int8
+        self.average_forces = None              # np.array (g, episodes, ...), average kinetic energy of the voxels
+        self.nn_parameters = {}                 # dict, {parameter name: np.array (g, ...)} at the generation start
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, generation):
+        return self.size > 0 and generation in self.generations[:self.size]
+
+    def record(self, generation, episode, stiffness, morphology, average_forces, fitness_eval, fitness_xyz,
+               nn_parameters):
+        # Records an episode of the creature, overwriting it if it was already recorded.
+        # ARGUMENTS
+        # - generation              int, generation number
+        # - episode                 int, episode number
+        # - stiffness               np.array, creatures stiffness array
+        # - morphology              np.array, creatures material numbers
+        # - average_forces          np.array, average kinetic energy of the voxels over the episode
+        # - fitness_eval            float, fitness evaluation
+        # - fitness_xyz             (1, 3) list, fitness values
+        # - nn_parameters           dict, neural network weights and biases
+
+        if episode >= self.num_episodes:
+            raise Exception("ERROR: Cannot record episode " + str(episode) + " in an evolutionary history of "
+                            + str(self.num_episodes) + " episodes.")
+
+        if self.generations is None:
+            self._allocate(stiffness, average_forces, nn_parameters)
+
+        # Episodes of a generation are recorded one after the other, a new generation gets the next row
+        if self.size == 0 or self.generations[self.size - 1] != generation:
+            if self.size == len(self.generations):
+                self._grow()
+            self.generations[self.size] = generation
+            self.size += 1
+        row = self.size - 1
+
+        self.recorded[row, episode] = True
+        self.fitness_eval[row, episode] = fitness_eval
+        self.fitness_xyz[row, episode] = fitness_xyz
+        self.stiffness[row, episode] = stiffness
+        self.morphology[row, episode] = morphology
+        self.average_forces[row, episode] = average_forces
+        for key, value in nn_parameters.items():
+            self.nn_parameters[key][row] = value
+
+    def _allocate(self, stiffness, average_forces, nn_parameters, capacity=4):
+        shape = (capacity, self.num_episodes)
+        self.generations = np.zeros(capacity, dtype=np.int32)
+        self.recorded = np.zeros(shape, dtype=bool)
+        self.fitness_eval = np.full(shape, np.nan)
+        self.fitness_xyz = np.full(shape + (3,), np.nan)
+        self.stiffness = np.zeros(shape + np.shape(stiffness))
+        self.morphology = np.zeros(shape + np.shape(stiffness), dtype=np.int8)
+        self.average_forces = np.zeros(shape + np.shape(average_forces))
+        self.nn_parameters = {key: np.zeros((capacity,) + np.shape(value)) for key, value in nn_parameters.items()}
+
+    def _arrays(self):
+        arrays = {name: getattr(self, name) for name in HISTORY_ARRAYS}
+        arrays.update({"nn_" + key: value for key, value in self.nn_parameters.items()})
+        return arrays
+
+    def _grow(self):
+        # Doubles the number of generation rows, new fitness rows are nan
+        for name, array in self._arrays().items():
+            fill = np.nan if name in ("fitness_eval", "fitness_xyz") else 0
+            grown = np.full((2 * len(array),) + array.shape[1:], fill, dtype=array.dtype)
+            grown[:len(array)] = array
+            self._set_array(name, grown)
+
+    def _set_array(self, name, array):
+        if name.startswith("nn_"):
+            self.nn_parameters[name[3:]] = array
+        else:
+            setattr(self, name, array)
+
+    def clear(self):
+        self.__init__(self.num_episodes)
+
+    def copy(self):
+        # RETURNS
+        # - history                 EvolutionHistory, copy holding only the recorded generations
+        history = EvolutionHistory(self.num_episodes)
+        history.size = self.size
+        if self.generations is not None:
+            for name, array in self._arrays().items():
+                history._set_array(name, array[:self.size].copy())
+        return history
+
+    def generation_fitness(self, episode=-1):
+        # RETURNS
+        # - fitness                 dict, {"gen_" + generation number: fitness evaluation at the given episode}
+        if self.size == 0:
+            return {}
+        return {"gen_" + str(generation): fitness for generation, fitness in
+                zip(self.generations[:self.size].tolist(), self.fitness_eval[:self.size, episode].tolist())}
+
+    def save(self, file_path):
+        # Saves the recorded generations to a compressed .npz file
+        arrays = {name: array[:self.size] for name, array in self._arrays().items()} if self.size else {}
+        np.savez_compressed(file_path, num_episodes=self.num_episodes, **arrays)
+
+    @staticmethod
+    def load(file_path):
+        # RETURNS
+        # - history                 EvolutionHistory, history saved with save
+        with np.load(file_path) as data:
+            history = EvolutionHistory(int(data["num_episodes"]))
+            for name in data.files:
+                if name != "num_episodes":
+                    history._set_array(name, data[name])
+        if history.generations is not None:
+            history.size = len(history.generations)
+        return history
+
+    def to_dict(self):
+        # RETURNS
+        # - evolution               dict, history in the format of the evolution.json files written by earlier versions
+        evolution = {}
+        for row in range(self.size):
+            generation = {"nn_parameters": {key: str(value[row]) for key, value in self.nn_parameters.items()}}
+            for episode in np.flatnonzero(self.recorded[row]).tolist():
+                layers = self.stiffness.shape[2]
+                generation["ep_" + str(episode)] = {
+                    "morphology": str(self.morphology[row, episode].reshape((layers, -1)).astype(int).tolist()),
+                    "stiffness": str(self.stiffness[row, episode].reshape((layers, -1)).tolist()),
+                    "fitness_xyz": str(self.fitness_xyz[row, episode].tolist()),
+                    "fitness_eval": float(self.fitness_eval[row, episode]),
+                    "average_forces": str(self.average_forces[row, episode].tolist())}
+            evolution["gen_" + str(self.generations[row])] = generation
+
+        return evolution
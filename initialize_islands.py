@@ -0,0 +1,12 @@
+import sys
+
+from islands import run_islands
+
+if __name__ == "__main__":
+    try:
+        # Evolves num_islands populations at the same time, see the islands settings. Every island is evaluated in its
+        # own directory within generated_files. Running this again resumes interrupted islands.
+        run_islands("generated_files")
+
+    except KeyboardInterrupt:
+        sys.exit()
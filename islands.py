@@ -0,0 +1,251 @@
+import datetime as dt
+import json
+import operator
+import os
+import shutil
+import threading
+import traceback
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from population_async import Population, create_scheduler
+from settings import get_settings
+
+
+# ISLANDS
+# Island model of the genetic algorithm: num_islands populations (islands) evolve at the same time, every island on its
+# own thread with its own Population. The islands share one simulation scheduler, so max_workers simulations run at once
+# across all of them, and there is no barrier between islands: an island whose simulations are slow does not hold up the
+# others.
+#
+# Every migration_interval generations an island sends copies of its best migrants creatures to its neighbours and takes
+# in the best migrants waiting for it. Migrants take the place of the creatures created for the islands next generation,
+# if there are not enough of those the worst evolved creatures are replaced, the top creatures always stay. Migration is
+# asynchronous, an island never waits for its neighbours, migrants arriving later are taken in at its next migration.
+#
+# Topologies (islands setting "topology"):
+# - ring                    island i sends its migrants to island i + 1
+# - fully_connected         every island sends its migrants to every other island
+#
+# Every island writes to its own directory, <output directory>/island_<i> (journal, telemetry, simulation files), and
+# saves its population there as island_<i>.pkl when it is finished. Running the islands again skips finished islands and
+# resumes unfinished ones from their journal, migrants that were on their way when the run stopped are lost.
+
+TOPOLOGIES = ("ring", "fully_connected")
+ISLAND_DONE_FILE = "island_done.json"
+
+
+def island_directory(output_directory, island):
+    return os.path.join(output_directory, "island_" + str(island))
+
+
+def is_finished(output_directory, island):
+    return os.path.exists(os.path.join(island_directory(output_directory, island), ISLAND_DONE_FILE))
+
+
+def generation_parameters(history, generation):
+    # RETURNS
+    # - parameters              dict, neural network weights and biases a creature was evaluated with in a generation
+    row = [i for i in range(len(history)) if history.generations[i] == generation][-1]
+    return {key: value[row].copy() for key, value in history.nn_parameters.items()}
+
+
+class Migrant:
+    def __init__(self, source, name, fitness, neural_net):
+        # Copy of a creature sent to another island.
+        # ARGUMENTS
+        # - source                  int, island the creature comes from
+        # - name                    string, name of the creature on its island
+        # - fitness                 float, fitness the creature reached on its island
+        # - neural_net              class (NeuralNet), copy of the creatures neural network
+
+        self.source = source                                        # int, island the creature comes from
+        self.name = name                                            # string, name on the source island
+        self.fitness = fitness                                      # float, fitness on the source island
+        self.neural_net = neural_net                                # class (NeuralNet), neural network of the creature
+
+
+class Archipelago:
+    def __init__(self, num_islands, topology="ring", migration_interval=5, migrants=2):
+        # ARGUMENTS
+        # - num_islands             int, number of islands
+        # - topology                string, "ring" or "fully_connected", which islands migrants are sent to
+        # - migration_interval      int, islands migrate after every migration_interval generations
+        # - migrants                int, creatures an island sends to each neighbour, and takes in, per migration
+
+        if num_islands < 1:
+            raise Exception("ERROR in settings.json: There must be at least one island. num_islands was set to "
+                            + str(num_islands))
+        if topology not in TOPOLOGIES:
+            raise Exception("ERROR in settings.json: Unknown island topology '" + topology + "', use 'ring' or "
+                            "'fully_connected'.")
+        if migration_interval < 1:
+            raise Exception("ERROR in settings.json: The migration interval must be at least one generation. "
+                            "migration_interval was set to " + str(migration_interval))
+
+        self.num_islands = num_islands                              # int, number of islands
+        self.topology = topology                                    # string, how islands are connected
+        self.migration_interval = migration_interval                # int, generations between migrations
+        self.migrants = migrants                                    # int, creatures sent to each neighbour
+        self.inboxes = [queue.Queue() for _ in range(num_islands)]  # list, queue.Queue of Migrant for every island
+
+    def neighbours(self, island):
+        # RETURNS
+        # - neighbours              list, islands the island sends its migrants to
+        if self.topology == "ring":
+            return [(island + 1) % self.num_islands] if self.num_islands > 1 else []
+        return [other for other in range(self.num_islands) if other != island]
+
+    def migrate(self, island, population, generation):
+        # Sends the islands best creatures of the generation to its neighbours and takes in the best migrants waiting
+        # for it. Called by Population.run_genetic_algorithm once the population of the next generation is created.
+        # ARGUMENTS
+        # - island                  int, island of the population
+        # - population              class (population), population of the island
+        # - generation              int, generation the population was evaluated in
+        if self.migrants < 1 or (generation + 1) % self.migration_interval:
+            return
+
+        # The creatures evolved for the next generation have new neural networks, migrants get the neural network they
+        # were evaluated with
+        emigrants = sorted((creature for creature in population.full_population.values()
+                            if generation in creature.evolution and creature.failure is None),
+                           key=operator.attrgetter("fitness_eval"), reverse=True)[:self.migrants]
+        for creature in emigrants:
+            for neighbour in self.neighbours(island):
+                neural_net = creature.neural_net.copy()
+                neural_net.parameters = generation_parameters(creature.evolution, generation)
+                self.inboxes[neighbour].put(Migrant(island, creature.name, creature.fitness_eval, neural_net))
+
+        arrivals = []
+        while True:
+            try:
+                arrivals.append(self.inboxes[island].get_nowait())
+            except queue.Empty:
+                break
+        arrivals = sorted(arrivals, key=operator.attrgetter("fitness"), reverse=True)[:self.migrants]
+
+        # Creatures created for the next generation make room first, then the worst evolved ones
+        created = [creature for creature in population.population.values() if generation not in creature.evolution]
+        kept = sorted((creature for creature in population.population.values() if generation in creature.evolution),
+                      key=operator.attrgetter("fitness_eval"))
+        replaceable = created + kept[:max(len(kept) - population.settings["parameters"]["top"], 0)]
+
+        for migrant, replaced in zip(arrivals, replaceable):
+            if generation not in replaced.evolution:
+                # A creature that was never evaluated simply gets the migrants neural network
+                replaced.neural_net = migrant.neural_net
+                continue
+            del population.population[replaced.name]
+            creature = population.base_creature.clone("_creature" + str(len(population.full_population)))
+            creature.neural_net = migrant.neural_net
+            population.population[creature.name] = creature
+            population.full_population[creature.name] = creature
+
+        taken = arrivals[:len(replaceable)]
+        print(str(dt.datetime.now()) + " Island " + str(island) + ": sent " + str(len(emigrants)) + " creatures to "
+              "islands " + str(self.neighbours(island)) + ", took in " + str(len(taken)) + " migrants"
+              + "".join(", " + migrant.name + " of island " + str(migrant.source) + " (fitness "
+                        + "{:.4f}".format(migrant.fitness) + ")" for migrant in taken))
+
+
+def run_island(archipelago, island, output_directory, scheduler, generations):
+    # Evolves the population of an island, or resumes it from its journal, and saves it to the islands directory.
+    # ARGUMENTS
+    # - archipelago             Archipelago, migration between the islands
+    # - island                  int, island number
+    # - output_directory        string, directory holding the island directories
+    # - scheduler               SimulationScheduler, simulation worker pool shared by the islands
+    # - generations             int, generations evaluated per island
+
+    directory = island_directory(output_directory, island)
+    journal_file_name = os.path.join(directory, "journal.jsonl")
+
+    def between_generations(population, generation):
+        archipelago.migrate(island, population, generation)
+
+    # An interrupted island carries on from its journal
+    population = None
+    if os.path.exists(journal_file_name):
+        try:
+            population, generation, start_episodes, last_generation = \
+                Population.resume_from_journal(journal_file_name)
+        except Exception as error:
+            print(str(dt.datetime.now()) + " Cannot resume island " + str(island) + " (" + str(error)
+                  + "), restarting it")
+            population = None
+
+    if population is not None:
+        print(str(dt.datetime.now()) + " RESUMING ISLAND " + str(island) + " AT GENERATION " + str(generation))
+        population.run_genetic_algorithm(last_generation - generation + 1, scheduler=scheduler,
+                                         first_generation=generation, start_episodes=start_episodes,
+                                         between_generations=between_generations)
+    else:
+        print(str(dt.datetime.now()) + " STARTING ISLAND " + str(island))
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.makedirs(directory)
+
+        population = Population()
+        population.output_directory = directory
+        population.run_genetic_algorithm(generation_size=generations, scheduler=scheduler,
+                                         between_generations=between_generations)
+
+    population.save_population(name=os.path.join(directory, "island_" + str(island)))
+
+    # Written last, the island is only skipped by later runs once everything is saved
+    _, top_creature = population.sort_population()
+    with open(os.path.join(directory, ISLAND_DONE_FILE), "w") as done_file:
+        json.dump({"island": island, "top_creature": top_creature.name, "top_fitness": top_creature.fitness_eval,
+                   "finished": str(dt.datetime.now())}, done_file, sort_keys=True, indent=4)
+
+    print(str(dt.datetime.now()) + " FINISHED ISLAND " + str(island))
+
+
+def run_islands(output_directory="generated_files"):
+    # Evolves every unfinished island at the same time, configured by the islands section of the settings.
+    # ARGUMENTS
+    # - output_directory        string, directory the island directories are created in
+
+    settings = get_settings()
+    archipelago = Archipelago(settings["islands"]["num_islands"], settings["islands"]["topology"],
+                              settings["islands"]["migration_interval"], settings["islands"]["migrants"])
+
+    islands = [island for island in range(archipelago.num_islands) if not is_finished(output_directory, island)]
+    print(str(dt.datetime.now()) + " ISLANDS: " + str(len(islands)) + " of " + str(archipelago.num_islands)
+          + " islands to evolve")
+    if not islands:
+        return
+
+    if not os.path.exists(output_directory):
+        os.makedirs(output_directory)
+
+    failed = []
+
+    def evolve_island(island):
+        try:
+            run_island(archipelago, island, output_directory, scheduler, settings["parameters"]["gen_size"])
+        except Exception:
+            traceback.print_exc()
+            failed.append(island)
+
+    scheduler = create_scheduler(settings)
+    try:
+        threads = [threading.Thread(target=evolve_island, args=(island,)) for island in islands]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        # Joined with a timeout so a KeyboardInterrupt reaches the main thread
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(1)
+    finally:
+        scheduler.close()
+
+    if failed:
+        raise Exception("ERROR: Islands " + ", ".join(str(island) for island in sorted(failed)) + " failed. Run the "
+                        "islands again to retry them, finished islands are skipped.")
@@ -0,0 +1,110 @@
+import json
+import os
+
+import numpy as np
+
+
+# JOURNAL
+# Append-only record of a genetic algorithm run, one JSON object per line. Written while the population is evaluated so
+# an interrupted run can be resumed from the last completed creature-episode (see Population.resume_from_journal).
+#
+# Record types:
+# - run                     start of run_genetic_algorithm: first and last generation and the pickled population the
+#                           run started from
+# - generation              start of a generation: creatures under evaluation and their neural network parameters
+# - episode                 a finished creature-episode: fitness, failure, average forces and the voxels whose stiffness
+#                           or material number changed after the simulation
+
+
+class Journal:
+    def __init__(self, file_path, batch_size=50):
+        # Opens a journal for appending, records are flushed and fsynced every batch_size records.
+        # ARGUMENTS
+        # - file_path               string, path to the journal file
+        # - batch_size              int, number of records written between fsyncs
+
+        self.file_path = file_path                                  # string, path to the journal file
+        self.batch_size = batch_size                                # int, records between fsyncs
+        self.unsynced = 0                                           # int, records written since the last fsync
+
+        # A crash can leave half a record at the end of the file, remove it before appending
+        if os.path.exists(file_path):
+            with open(file_path, "rb+") as journal_file:
+                contents = journal_file.read()
+                if contents and not contents.endswith(b"\n"):
+                    journal_file.truncate(contents.rfind(b"\n") + 1)
+
+        self.file = open(file_path, "a")                            # file, journal opened for appending
+
+    def write(self, record):
+        self.file.write(json.dumps(record) + "\n")
+        self.unsynced += 1
+        if self.unsynced >= self.batch_size:
+            self.sync()
+
+    def sync(self):
+        # Makes sure every record written so far is on disk
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+
+    def close(self):
+        if not self.file.closed:
+            self.sync()
+            self.file.close()
+
+    def write_run(self, first_generation, last_generation, population_file):
+        self.write({"type": "run", "first_generation": first_generation, "last_generation": last_generation,
+                    "population_file": population_file})
+        self.sync()
+
+    def write_generation(self, generation, population):
+        # ARGUMENTS
+        # - generation              int, generation number
+        # - population              dict, creatures under evaluation
+        nn_parameters = {name: {key: value.tolist() for key, value in creature.neural_net.parameters.items()}
+                         for name, creature in population.items()}
+        self.write({"type": "generation", "generation": generation, "creatures": list(population.keys()),
+                    "nn_parameters": nn_parameters})
+        self.sync()
+
+    def write_episode(self, creature, stiffness_before, morphology_before):
+        # ARGUMENTS
+        # - creature                class (creature), creature after its simulation has been processed
+        # - stiffness_before        np.array, creatures stiffness array before the simulation was processed
+        # - morphology_before       np.array, creatures morphology before the simulation was processed
+        record = {"type": "episode", "creature": creature.name, "generation": creature.generation,
+                  "episode": creature.episode, "fitness_eval": creature.fitness_eval,
+                  "previous_fitness": creature.previous_fitness, "fitness_xyz": creature.fitness_xyz,
+                  "failure": creature.failure,
+                  "stiffness": array_delta(stiffness_before, creature.stiffness_array),
+                  "morphology": array_delta(morphology_before, creature.phenotype.morphology)}
+        if creature.failure is None:
+            record["average_forces"] = creature.average_forces.tolist()
+        self.write(record)
+
+
+def array_delta(before, after):
+    # RETURNS
+    # - delta                   dict, flat indices and new values of the elements that changed
+    changed = np.flatnonzero(before != after)
+    return {"index": changed.tolist(), "value": after.ravel()[changed].tolist()}
+
+
+def apply_delta(array, delta):
+    # Sets the changed elements recorded by array_delta, in place
+    np.put(array, delta["index"], delta["value"])
+
+
+def read_journal(file_path):
+    # RETURNS
+    # - records                 list, journal records in the order they were written. A half written last record
+    #                           (the run crashed while writing it) is ignored
+    records = []
+    with open(file_path) as journal_file:
+        for line in journal_file:
+            if not line.endswith("\n"):
+                break
+            records.append(json.loads(line))
+
+    return records
@@ -1,14 +1,15 @@
+import copy
+
 import numpy as np
-import json
+
+from settings import get_settings
 
 
 class NeuralNet:
     # Neural Network class, used to create and update creatures neural network
     def __init__(self):
         # Load parameters
-        settings_file = open("settings.json")
-        self.settings = json.load(settings_file)["nn_parameters"]
-        settings_file.close()
+        self.settings = get_settings()["nn_parameters"]
 
         # Define NN parameters
         self.parameters = None          # NN parameters, weights and biases
@@ -24,6 +25,13 @@ class NeuralNet:
         # Create NN
         self.parameters = self.initialize_parameters()
 
+    def copy(self):
+        # RETURNS
+        # - neural_net              class, neural network with a copy of this networks weights and biases
+        neural_net = copy.copy(self)
+        neural_net.parameters = {key: value.copy() for key, value in self.parameters.items()}
+        return neural_net
+
     @staticmethod
     def sigmoid(x_inputs):
         # calculates sigmoid
@@ -129,6 +137,61 @@ class NeuralNet:
 
         return Y[0][0], cache
 
+    def forward_batch(self, x_inputs):
+        # Computes the forward propagation for many samples at once. Results are bit-for-bit identical to calling
+        # forward_propagation on each row of x_inputs.
+
+        # ARGUMENTS:
+        # x_inputs - input data of shape (n_samples, n_x)
+
+        # RETURNS:
+        # Y - Output array of shape (n_samples, n_y)
+
+        return self.forward_population([self], np.asarray(x_inputs)[np.newaxis])[0]
+
+    @staticmethod
+    def forward_population(neural_nets, x_inputs):
+        # Computes the forward propagation of several neural networks (E.g. every creature of a population) in one set
+        # of stacked matrix multiplications. Every network must use the same layer sizes and activation function.
+
+        # ARGUMENTS:
+        # neural_nets - list of NeuralNet, length n_nets
+        # x_inputs - input data of shape (n_nets, n_samples, n_x), x_inputs[i] is fed to neural_nets[i]
+
+        # RETURNS:
+        # Y - Output array of shape (n_nets, n_samples, n_y)
+
+        # Assert correct inputs
+        activation_function = neural_nets[0].activation_function.lower()
+        assert all(nn.activation_function.lower() == activation_function for nn in neural_nets)
+        assert x_inputs.ndim == 3 and x_inputs.shape[0] == len(neural_nets)
+
+        # retrieve parameters, stacked along a leading network axis and broadcast over samples
+        w1 = np.stack([nn.parameters["w1"] for nn in neural_nets])[:, np.newaxis]      # (n_nets, 1, n_h, n_x)
+        b1 = np.stack([nn.parameters["b1"] for nn in neural_nets])[:, np.newaxis]      # (n_nets, 1, n_h, 1)
+        w2 = np.stack([nn.parameters["w2"] for nn in neural_nets])[:, np.newaxis]      # (n_nets, 1, n_y, n_h)
+        b2 = np.stack([nn.parameters["b2"] for nn in neural_nets])[:, np.newaxis]      # (n_nets, 1, n_y, 1)
+
+        # Every sample is a (n_x, 1) column, so each product is the same matrix-vector product np.dot computes in
+        # forward_propagation. A single einsum would sum in a different order and not give identical results.
+        x_columns = x_inputs[..., np.newaxis]                                           # (n_nets, n_samples, n_x, 1)
+
+        # Forward propagation
+        Z1 = np.matmul(w1, x_columns) + b1
+
+        if activation_function == "sigmoid":
+            A1 = NeuralNet.sigmoid(Z1)
+            Z2 = np.matmul(w2, A1) + b2
+            Y = NeuralNet.sigmoid(Z2)
+        elif activation_function == "tanh":
+            A1 = np.tanh(Z1)
+            Z2 = np.matmul(w2, A1) + b2
+            Y = np.tanh(Z2)
+        else:
+            raise Exception("ERROR: Unknown activation function.")
+
+        return Y[..., 0]
+
     def update_neural_net(self):
         # Updates NN with random gaussian noise
         # ARGUMENTS:
@@ -1,19 +1,36 @@
-import json
+import copy
 
 import numpy as np
 
+from settings import get_settings
+
+# Static parts of the VXA file, see Phenotype.vxa_template
+_VXA_TEMPLATE_CACHE = {}
+
+
+def base_morphology(structure, material=3, actuator_material=4):
+    # Initial morphology of a creature of any structure, laid out as the 6x6x6 creature of Phenotype: passive top and
+    # bottom layers, the layers between have a band of actuators across the middle third of x.
+    # ARGUMENTS
+    # - structure               (1, 3) list, number of voxels (x, y, z)
+    #
+    # RETURNS
+    # - morphology              np.array (z, y, x), material number of each voxel
+    x_voxels, y_voxels, z_voxels = structure
+    morphology = np.full((z_voxels, y_voxels, x_voxels), material, dtype=int)
+    morphology[1:-1, :, x_voxels // 3:x_voxels - x_voxels // 3] = actuator_material
+    return morphology
+
 
 class Phenotype:
     def __init__(self):
         # Import material defaults form settings file
-        settings_file = open("settings.json")
-        self.settings = json.load(settings_file)
-        settings_file.close()
+        self.settings = get_settings()
 
         # Creature Structure
         self.structure = self.settings["structure"]["creature_structure"]
 
-        # Initial morphology
+        # Initial morphology, other creature structures get the same layout generated by base_morphology
         self.base_morphology = np.array([
             [3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3],
             [3,3,4,4,3,3,3,3,4,4,3,3,3,3,4,4,3,3,3,3,4,4,3,3,3,3,4,4,3,3,3,3,4,4,3,3],
@@ -22,6 +39,8 @@ class Phenotype:
             [3,3,4,4,3,3,3,3,4,4,3,3,3,3,4,4,3,3,3,3,4,4,3,3,3,3,4,4,3,3,3,3,4,4,3,3],
             [3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3,3]
         ])
+        if list(self.structure) != [6, 6, 6]:
+            self.base_morphology = base_morphology(self.structure).reshape((self.structure[2], -1))
 
         # As just initialized, base morphology is the creatures morphology
         self.morphology = self.base_morphology.reshape((self.settings["structure"]["creature_structure"][2],
@@ -55,6 +74,25 @@ class Phenotype:
         self.stiffness_array = None
         self.gen_algorithm = None
 
+    def copy(self, memo=None):
+        # Copies the phenotype. Material properties are immutable (see settings.py) and shared, arrays are copied.
+        # ARGUMENTS
+        # - memo                    dict, copy.deepcopy memo, arrays already copied in it are reused
+        #
+        # RETURNS
+        # - phenotype               class, copied phenotype
+        if memo is None:
+            memo = {}
+
+        phenotype = copy.copy(self)
+        phenotype.base_morphology = copy.deepcopy(self.base_morphology, memo)
+        phenotype.morphology = copy.deepcopy(self.morphology, memo)
+        phenotype.stiffness_array = copy.deepcopy(self.stiffness_array, memo)
+        if self.gen_algorithm is not None:
+            phenotype.gen_algorithm = list(self.gen_algorithm)
+
+        return phenotype
+
     def update_vxa_file(self, creature, number_of_materials=None, integration=None, damping=None, collision=None,
                         features=None, stopConditions=None, drawSmooth=None, write_fitness=None, QhullTmpFile=None,
                         CurvaturesTmpFile=None, numFixed=None, numForced=None, gravity=None, thermal=None, version=None,
@@ -143,6 +181,64 @@ class Phenotype:
 
         # Set Genetic Algorithm variable
         self.gen_algorithm = [self.write_fitness, creature.fitness_file_name, self.QhullTmpFile, self.CurvaturesTmpFile]
+        [WriteFitnessFile, FitnessFileName, QhullTmpFile, CurvaturesTmpFile] = self.gen_algorithm
+
+        # Everything but the GA section, morphology and stiffness is rendered once per set of material properties
+        head_text, structure_text, phase_offset_text = self.vxa_template()
+
+        ga_text = '''
+        <WriteFitnessFile>''' + str(WriteFitnessFile) + '''</WriteFitnessFile>
+        <FitnessFileName>''' + str(FitnessFileName) + '''</FitnessFileName>
+        <QhullTmpFile>''' + str(QhullTmpFile) + '''</QhullTmpFile>
+        <CurvaturesTmpFile>''' + str(CurvaturesTmpFile) + '''</CurvaturesTmpFile>'''
+
+        # One layer per z, material numbers are single digits so a layer is written as its character codes
+        morph_layers = self.morphology.reshape((self.structure[2], self.structure[1] * self.structure[0]))
+        if morph_layers.min() >= 0 and morph_layers.max() <= 9:
+            morph_rows = [row.tobytes().decode("ascii") for row in morph_layers.astype(np.uint8) + ord("0")]
+        else:
+            morph_rows = ["".join([str(int(elem)) for elem in row]) for row in morph_layers]
+
+        morph_text = "\n".join(['''        <Layer><![CDATA[''' + row + ''']]></Layer>''' for row in morph_rows])
+
+        if stiffness_array is not None:
+            # str of a python float matches str of the numpy float it came from
+            stiff_rows = [",".join(map(str, row)) for row in self.stiffness_array.tolist()]
+
+            pre_text = '''        <Stiffness>
+        <MinElasticMod>10000.0</MinElasticMod>
+        <MaxElasticMod>1000000</MaxElasticMod>'''
+
+            stiff_text = "\n".join(['''        <Layer><![CDATA[''' + row + ''']]></Layer>''' for row in stiff_rows])
+            post_text = '''        </Stiffness>'''
+            stiffness_text = pre_text + "\n" + stiff_text + "\n" + post_text
+
+        else:
+            stiffness_text = ""
+
+        end_text = '''
+        </Structure>
+        </VXC>
+        </VXA>'''
+
+        self.vxa_file = (head_text + ga_text + structure_text + morph_text + phase_offset_text + stiffness_text +
+                         end_text)
+
+    def vxa_template(self):
+        # Renders the parts of the VXA file which only depend on the material properties. They are cached, keyed on the
+        # properties, so they are only rendered again when a property is changed through update_vxa_file.
+        #
+        # RETURNS
+        # - head_text               string, VXA file up to and including <GA>
+        # - structure_text          string, from </GA> up to the morphology layers
+        # - phase_offset_text       string, from the end of the morphology layers up to the stiffness layers
+
+        key = tuple(tuple(value) if isinstance(value, list) else value for value in (
+            self.integration, self.damping, self.collision, self.features, self.stopConditions, self.drawSmooth,
+            self.numFixed, self.numForced, self.gravity, self.thermal, self.version, self.lattice, self.voxel,
+            self.compression_type, self.phase_offset, self.structure))
+        if key in _VXA_TEMPLATE_CACHE:
+            return _VXA_TEMPLATE_CACHE[key]
 
         # set variables
         [integrator, dtFrac] = self.integration
@@ -150,7 +246,6 @@ class Phenotype:
         [selfColEnabled, colSystem, collisionHorizon] = self.collision
         [fluidDampEnabled, poissonKickBackEnabled, enforceLatticeEnabled] = self.features
         [stopConditionType, stopConditionValue, InitCmTime] = self.stopConditions
-        [WriteFitnessFile, FitnessFileName, QhullTmpFile, CurvaturesTmpFile] = self.gen_algorithm
         [gravEnabled, gravAcc, floorEnabled, sloped_floor, bump_size, bump_sep] = self.gravity
         [tempEnabled, tempAmp, tempBase, varyTempEnabled, tempPeriod] = self.thermal
         [lattice_dim, x_dim_adj, y_dim_adj, z_dim_adj, x_line_offset,
@@ -160,7 +255,7 @@ class Phenotype:
          poissons_ration, CTE, uStatic, uDynamic, isConductive] = self.mechanical_properties
         [x_voxels, y_voxels, z_voxels] = self.structure
 
-        init_text = '''<?xml version="1.0" encoding="ISO-8859-1"?>
+        head_text = '''<?xml version="1.0" encoding="ISO-8859-1"?>
         <VXA Version="1.0">
         <Simulator>
         <Integration>
@@ -195,11 +290,9 @@ class Phenotype:
         <StopConditionValue>''' + str(stopConditionValue) + '''</StopConditionValue>
         <InitCmTime>''' + str(InitCmTime) + '''</InitCmTime>
         </StopCondition>
-        <GA>
-        <WriteFitnessFile>''' + str(WriteFitnessFile) + '''</WriteFitnessFile>
-        <FitnessFileName>''' + str(FitnessFileName) + '''</FitnessFileName>
-        <QhullTmpFile>''' + str(QhullTmpFile) + '''</QhullTmpFile>
-        <CurvaturesTmpFile>''' + str(CurvaturesTmpFile) + '''</CurvaturesTmpFile>
+        <GA>'''
+
+        end_ga_text = '''
         </GA>
         </Simulator>
         <Environment>
@@ -365,13 +458,6 @@ class Phenotype:
         </Mechanical>
         </Material>'''
 
-        morph_array = []
-        for row in self.morphology.reshape((self.structure[2], self.structure[1] * self.structure[0])):
-            temp_text = "".join([str(int(elem)) for elem in row])
-            morph_array.append(temp_text)
-
-        morph_text = "\n".join(['''        <Layer><![CDATA[''' + row + ''']]></Layer>''' for row in morph_array])
-
         structure_text = '''
         </Palette>
         <Structure Compression="''' + str(self.compression_type) + '''">
@@ -379,9 +465,9 @@ class Phenotype:
         <Y_Voxels>''' + str(y_voxels) + '''</Y_Voxels>
         <Z_Voxels>''' + str(z_voxels) + '''</Z_Voxels>
         <Data>\n'''
+        structure_text = end_ga_text + voxel_text + structure_text
         end_structure = '''
         </Data>\n'''
-        structure_text = structure_text + morph_text + end_structure
 
         offset_base = [np.ones((1, self.structure[1]), dtype="float") * float(j) * self.phase_offset
                        for j in range(self.structure[0])]
@@ -392,28 +478,8 @@ class Phenotype:
         pre_text = "        <PhaseOffset>"
         post_text = "        </PhaseOffset>\n"
 
-        phase_offset_text = pre_text + "\n" + offset_text + "\n" + post_text
+        phase_offset_text = end_structure + pre_text + "\n" + offset_text + "\n" + post_text
 
-        if stiffness_array is not None:
-            stiff_array = []
-            for row in self.stiffness_array:
-                temp_text = ",".join([str(elem) for elem in row])
-                stiff_array.append(temp_text)
-
-            pre_text = '''        <Stiffness>
-        <MinElasticMod>10000.0</MinElasticMod>
-        <MaxElasticMod>1000000</MaxElasticMod>'''
-
-            offset_text = "\n".join(['''        <Layer><![CDATA[''' + row + ''']]></Layer>''' for row in stiff_array])
-            post_text = '''        </Stiffness>'''
-            stiffness_text = pre_text + "\n" + offset_text + "\n" + post_text
-
-        else:
-            stiffness_text = ""
-
-        end_text = '''
-        </Structure>
-        </VXC>
-        </VXA>'''
+        _VXA_TEMPLATE_CACHE[key] = (head_text, structure_text, phase_offset_text)
 
-        self.vxa_file = init_text + voxel_text + structure_text + phase_offset_text + stiffness_text + end_text
+        return head_text, structure_text, phase_offset_text
@@ -1,12 +1,13 @@
 import matplotlib.pyplot as plt
 import os
-import json
 from collections import OrderedDict
 from operator import getitem
 
+from history import EvolutionHistory
+
 UNDAMAGED_PERFORMANCE_FILE = 'performance_undamaged_evolution.json'
 DAMAGED_PERFORMANCE_FILE = 'performance_damaged_evolution_remove_sect.json'
-CREATURE_FILE = "evolution.json"
+CREATURE_FILE = "evolution.npz"
 LAST_EPISODE_NUMBER = "14"
 cwd = os.getcwd()
 DATA_FOLDER_PATH = os.path.join(cwd, "generated_files")
@@ -19,11 +20,10 @@ def import_top_performers():
     # Data extraction
     for subdir, dirs, files in os.walk(DATA_FOLDER_PATH):
         if CREATURE_FILE in files:
-            creatures_file = open(os.path.join(subdir, CREATURE_FILE))
-            creature_data = json.load(creatures_file)
-            creatures_file.close()
+            creatures_file = os.path.join(subdir, CREATURE_FILE)
+            creature_data = EvolutionHistory.load(creatures_file).generation_fitness(int(LAST_EPISODE_NUMBER))
 
-            creature_name = creatures_file.name.replace(CREATURE_FILE, "").replace(DATA_FOLDER_PATH, "") \
+            creature_name = creatures_file.replace(CREATURE_FILE, "").replace(DATA_FOLDER_PATH, "") \
                 .replace("\\", "").replace("/", "")
             creature_performance_list = []
             creature_max_performance = 0
@@ -42,7 +42,7 @@ def import_top_performers():
                     generation = gen
 
                 # get creature performance
-                creature_performance = creature_data[gen]["ep_" + LAST_EPISODE_NUMBER]["fitness_eval"]
+                creature_performance = creature_data[gen]
 
                 if creature_name not in creatures:
                     creatures.update({creature_name: {"max": creature_max_performance,
@@ -77,9 +77,8 @@ def import_creature_performance(creature_name):
     creature_performances = {}
     for subdir, dirs, files in os.walk(os.path.join(DATA_FOLDER_PATH, creature_name)):
         if CREATURE_FILE in files:
-            creatures_file = open(os.path.join(subdir, CREATURE_FILE))
-            creature_data = json.load(creatures_file)
-            creatures_file.close()
+            creature_data = EvolutionHistory.load(os.path.join(subdir, CREATURE_FILE))\
+                .generation_fitness(int(LAST_EPISODE_NUMBER))
 
             for gen in creature_data:
 
@@ -95,7 +94,7 @@ def import_creature_performance(creature_name):
                     generation = gen
 
                 # get creature performance
-                creature_performance = creature_data[gen]["ep_" + LAST_EPISODE_NUMBER]["fitness_eval"]
+                creature_performance = creature_data[gen]
 
                 # If no section for generation, create one
                 if generation not in creature_performances:
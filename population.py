@@ -4,20 +4,18 @@ import datetime as dt
 import sys
 import pickle
 import operator
-import time
 import shutil
-from copy import deepcopy
 import warnings
 
 from creature import Creature
+from scheduler import SimulationScheduler, SimulationJob
+from settings import get_settings
 
 
 class Population:
     def __init__(self, population=None, is_damaged=False, reset_evolution=False, load_population=False):
         # Import settings
-        settings_file = open("settings.json")
-        self.settings = json.load(settings_file)
-        settings_file.close()
+        self.settings = get_settings()
 
         if not load_population:
 
@@ -74,7 +72,7 @@ class Population:
         # If reset_evolution, reset evolutionary history
         if reset_evolution:
             for creature in self.population.values():
-                creature.evolution = {}
+                creature.evolution.clear()
 
     def create_new_population(self, population_range):
         # ARGUMENTS:
@@ -89,8 +87,7 @@ class Population:
         # Create population
         for i in range(a, b):
             # Create creature
-            creature = deepcopy(self.base_creature)
-            creature.name = "_creature" + str(i)
+            creature = self.base_creature.clone("_creature" + str(i))
 
             # Get ANN for creature
             creature.set_neural_network()
@@ -160,6 +157,11 @@ class Population:
         # Working directories variables
         cwd = os.getcwd()
 
+        # Simulations run one at a time
+        scheduler = SimulationScheduler(self.settings["evosoro_path"], max_workers=1,
+                                        timeout=self.settings["evaluation"]["simulation_timeout"],
+                                        output_timeout=self.settings["evaluation"]["output_timeout"])
+
         # Start simulations, after each simulation robot undergoes morphological change
         for episode in range(self.settings["parameters"]["ep_size"]):
             for creature in self.population.values():
@@ -179,9 +181,6 @@ class Population:
                 new_file.write(creature.phenotype.vxa_file)
                 new_file.close()
 
-                # evaluate each creature
-                creature.evaluate()
-
                 # Common file names
                 gfd = os.path.join(cwd, "generated_files")                  # Generated files directory
                 ffp = os.path.join(cwd, creature.fitness_file_name)         # fitness file path
@@ -189,26 +188,16 @@ class Population:
                 kefp = os.path.join(cwd, creature.ke_file_name)             # ke file path
                 sfp = os.path.join(cwd, creature.strain_file_name)          # strain file path
 
-                # wait for file to appear, if two minutes passes and there is no file raise exception
-                t = time.time()
-                while not os.path.exists(pfp) or not os.path.exists(ffp):
-                    time.sleep(1)
-                    toc = time.time() - t
-                    if toc > 300:
-                        raise Exception("ERROR: No pressure file or fitness file for " + creature.name +
-                                        "found after 300 seconds. This error is commonly due to problems in the created"
-                                        " vxa file.")
+                # evaluate each creature, returns once voxelyze has exited
+                job, = scheduler.run([SimulationJob(creature.current_file_name, vxa_file_path, cwd,
+                                                    expected_files=[ffp, pfp])])
+                if not job.succeeded():
+                    raise Exception("ERROR: Simulation of " + creature.name + " failed. " + job.error +
+                                    ". This error is commonly due to problems in the created vxa file.")
 
                 # Update creature fitness
                 creature.calculate_fitness()
 
-                # occasionally an error occurs and results return 0, if so, re-run for up to 60s
-                t = time.time()
-                toc = 0
-                while creature.fitness_eval == 0 and toc < 120:
-                    creature.calculate_fitness()
-                    toc = time.time() - t
-
                 # Update creature stiffness, uses ANN
                 creature.calculate_stiffness()
 
@@ -346,11 +335,13 @@ class Population:
             json.dump(dict_sort_creatures, population_file, sort_keys=True, indent=4)
         population_file.close()
 
-        # Save evolutionary history of creatures
+        # Save evolutionary history of creatures, the json export (format of earlier versions) is only written on request
         for creature in population.values():
-            with open("generated_files/" + creature.name + "/evolution.json", "w") as creature_file:
-                json.dump(creature.evolution, creature_file, sort_keys=True, indent=4)
-            creature_file.close()
+            creature.evolution.save("generated_files/" + creature.name + "/evolution.npz")
+            if self.settings["files"]["evolution_json"]:
+                with open("generated_files/" + creature.name + "/evolution.json", "w") as creature_file:
+                    json.dump(creature.evolution.to_dict(), creature_file, sort_keys=True, indent=4)
+                creature_file.close()
 
     def inflict_damage(self, damage_type, damage_arguments, population_to_damage=None, damage_base_creature=False):
 
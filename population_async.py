@@ -6,19 +6,38 @@ import pickle
 import time
 import shutil
 import operator
-import multiprocessing
-from copy import deepcopy
+import copy
+import math
 import warnings
 
+import numpy as np
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
 from creature import Creature
+from distributed import DistributedScheduler
+from history import EvolutionHistory
+from archive import ArtifactArchiver
+from journal import Journal, apply_delta, read_journal
+from neural_network import NeuralNet
+from result_cache import ResultCache, cache_key
+from scheduler import SimulationScheduler, SimulationJob
+from screening import FitnessScreen, creature_features, history_sample, prediction_error
+from settings import STRING, get_settings
+from simulation_files import (CSV_COMPRESSIONS, KE_SCALE, FitnessFileError, FitnessResult, compress_file,
+                              read_fitness_files, reduce_csv_file)
+from supervision import create_supervisor
+from telemetry import Telemetry
+from surrogate import SURROGATE_NAME, SurrogateScheduler
 
 
 class Population:
     def __init__(self, population=None, is_damaged=False, reset_evolution=False, load_population=False):
         # Import settings
-        settings_file = open("settings.json")
-        self.settings = json.load(settings_file)
-        settings_file.close()
+        self.settings = get_settings()
 
         if not load_population:
             # When called for first time, creates a new population of creatures.
@@ -45,6 +64,10 @@ class Population:
             # Set parameter to remember last evaluation
             self.last_generation = 0
             self.average_episode_duration = 0
+            self.episodes_timed = 0
+
+            # Fitness prediction model used to screen new creatures, see screening.py
+            self.screen = None
 
         else:
             loaded_population = self.load_population()                      # Load population
@@ -72,19 +95,70 @@ class Population:
 
             self.last_generation = loaded_population.last_generation
             self.average_episode_duration = 0
+            self.episodes_timed = 0
+
+            self.screen = loaded_population.screen
+
+        # Directory the simulation files, journal and evolutionary history are written to
+        self.output_directory = "generated_files"
+
+        # Journal, result cache, telemetry and file archiver of the running genetic algorithm, see
+        # run_genetic_algorithm
+        self.journal = None
+        self.result_cache = None
+        self.telemetry = None
+        self.archiver = None
 
         # If reset_evolution, reset evolutionary history
         if reset_evolution:
             for creature in self.population.values():
-                creature.evolution = {}
+                creature.evolution.clear()
+
+    def __getstate__(self):
+        # The journal and telemetry are open files, the result cache holds a lock and the archiver a thread, they are
+        # not pickled
+        state = self.__dict__.copy()
+        state["journal"] = None
+        state["result_cache"] = None
+        state["telemetry"] = None
+        state["archiver"] = None
+        return state
+
+    def __setstate__(self, state):
+        # Populations pickled before the output directory, result cache, screening model, telemetry and archiver were
+        # added get their defaults. Populations of the original version, whose creatures keep their evolutionary history
+        # in dicts and their voxels in Voxel objects, are not converted, load_population rejects them.
+        state.setdefault("output_directory", "generated_files")
+        state.setdefault("result_cache", None)
+        state.setdefault("screen", None)
+        state.setdefault("telemetry", None)
+        state.setdefault("archiver", None)
+        state.setdefault("episodes_timed", 0)
+        self.__dict__.update(state)
 
     def deepcopy(self):
-        copy_slf = deepcopy(self)
+        # Copies the population, creatures are copied with Creature.clone. One memo is used for every creature so
+        # creatures and arrays shared within this population (E.g. population and full_population) are shared in the
+        # same way within the copy.
+        memo = {}
+        copy_slf = copy.copy(self)
+        copy_slf.base_creature = self.base_creature.clone(memo=memo)
+        copy_slf.full_population = {name: creature.clone(memo=memo)
+                                    for name, creature in self.full_population.items()}
+        if self.population is self.full_population:
+            copy_slf.population = copy_slf.full_population
+        else:
+            copy_slf.population = {name: memo[id(creature)] if id(creature) in memo else creature.clone(memo=memo)
+                                   for name, creature in self.population.items()}
+        copy_slf.damage_arguments = copy.deepcopy(self.damage_arguments)
+        copy_slf.screen = copy.deepcopy(self.screen)
+
         return copy_slf
 
-    def create_new_population(self, population_range):
+    def create_new_population(self, population_range, neural_nets=None):
         # ARGUMENTS:
         # - Range: 1x2 list, (a, b) where a is lower & b upper bound of range of creatures (for naming index)
+        # - neural_nets: list, neural network of each new creature (E.g. chosen by screening), random if not given
 
         # RETURNS:
         # population: dictionary of created creature.
@@ -95,34 +169,81 @@ class Population:
         # Create population
         for i in range(a, b):
             # Create creature
-            creature = deepcopy(self.base_creature)
-            creature.name = "_creature" + str(i)
+            creature = self.base_creature.clone("_creature" + str(i))
 
             # Get ANN for creature
-            creature.set_neural_network()
+            if neural_nets is None:
+                creature.set_neural_network()
+            else:
+                creature.neural_net = neural_nets[i - a]
 
             # Append creature to creature dictionary
             self.population[creature.name] = creature
             # Add created creatures to full population
             self.full_population[creature.name] = creature
 
-        # If the creature to be added to a damaged population class, damage said creatures before adding them
-        if self.is_damaged:
-            self.population = self.inflict_damage(self.damage_type, self.damage_arguments)
+        # Creatures of a damaged population are cloned from its damaged base creature, so they get the same damage
 
-    def run_genetic_algorithm(self, generation_size=None):
+    def run_genetic_algorithm(self, generation_size=None, scheduler=None, first_generation=None,
+                              start_episodes=None, between_generations=None):
         tic = time.time()
         # Runs genetic algorithm by evaluating each creature and then changing their morphology accordingly
+        # ARGUMENTS
+        # - generation_size         int, number of generations to run, defaults to gen_size in settings.json
+        # - scheduler               SimulationScheduler, simulation worker pool (a new one is created if not given)
+        # - first_generation        int, number of the first generation, by default the generation after the last one
+        # - start_episodes          dict, {creature name: episode}, resumes the first generation from these episodes
+        #                           instead of starting it (see resume_from_journal)
+        # - between_generations     function, called with the population and the generation number once the
+        #                           population of the next generation is created, before it is journaled (E.g. to
+        #                           exchange creatures with other islands, see islands.py)
 
         # Retrieve parameters
         if generation_size is None:
             generation_size = self.settings["parameters"]["gen_size"]
 
-        if self.last_generation == 0:
+        close_scheduler = scheduler is None
+        if scheduler is None:
+            scheduler = self.create_scheduler()
+
+        if first_generation is not None:
+            rng = (first_generation, first_generation + generation_size)
+        elif self.last_generation == 0:
             rng = (0, generation_size)
         else:
             rng = (self.last_generation + 1, self.last_generation + 1 + generation_size)
 
+        # Predict the fitness of new creatures and only simulate the most promising ones. Created before the
+        # population is saved for the journal, so a resumed run rebuilds it from the journal
+        if self.settings["screening"]["enabled"] and self.screen is None:
+            self.screen = FitnessScreen(self.settings["structure"]["max_stiffness"],
+                                        regularization=self.settings["screening"]["regularization"],
+                                        num_random_features=self.settings["screening"]["random_features"],
+                                        min_samples=self.settings["screening"]["min_samples"])
+
+        # Record every finished creature-episode, a resumed run carries on with the journal it was resumed from
+        if self.settings["files"]["journal"]:
+            population_file = os.path.join(self.output_directory, "journal_population_gen" + str(rng[0]))
+            if start_episodes is None:
+                self.save_population(population_file)
+            self.journal = Journal(os.path.join(self.output_directory, "journal.jsonl"),
+                                   self.settings["files"]["journal_batch_size"])
+            if start_episodes is None:
+                self.journal.write_run(rng[0], rng[1] - 1, population_file + ".pkl")
+
+        # Reuse the results of simulations that were already run (deterministic simulators only)
+        if self.settings["evaluation"]["result_cache"]:
+            self.result_cache = ResultCache(self.settings["evaluation"]["result_cache_directory"],
+                                            int(self.settings["evaluation"]["result_cache_size"] * 1024 * 1024))
+
+        # Time every creature-episode, see telemetry.py
+        if self.settings["files"]["telemetry"]:
+            self.telemetry = Telemetry(os.path.join(self.output_directory, "telemetry.jsonl"))
+
+        # Keep the simulation files in one zip file per generation, written in the background, see archive.py
+        if self.settings["files"]["archive"]:
+            self.archiver = ArtifactArchiver(self.output_directory)
+
         # Initialize genetic algorithm
         gen_times = []
         for generation_num in range(rng[0], rng[1]):
@@ -133,23 +254,61 @@ class Population:
             print(str(dt.datetime.now()) + " Population under evaluation:")
             print([creature.name for creature in self.population.values()])
 
+            # Only the first generation of a resumed run is part way through
+            resumed_episodes = start_episodes if generation_num == rng[0] else None
+            if self.journal is not None and resumed_episodes is None:
+                self.journal.write_generation(generation_num, self.population)
+
             # Evaluate population
-            self.evaluate_population(generation_num)
+            self.evaluate_population(generation_num, scheduler, resumed_episodes)
+            if self.screen is not None:
+                screening_error = self.train_screen(generation_num)
 
             if not generation_num == rng[1] - 1:
                 # Create new population and retrieve top performing creature
                 top_creature = self.new_population()
+                if between_generations is not None:
+                    between_generations(self, generation_num)
             else:
                 _, top_creature = self.sort_population()
 
             # Print generation top performers details
             print(str(dt.datetime.now()) + " Finished evaluating population, top performing creature:"
                   + top_creature.name + ". Fitness: " + str(top_creature.fitness_eval))
+            if self.result_cache is not None:
+                hits, misses = self.result_cache.reset_counts()
+                print(str(dt.datetime.now()) + " Result cache: " + str(hits) + " hits, " + str(misses) + " misses")
+            if getattr(scheduler, "supervisor", None) is not None:
+                print(str(dt.datetime.now()) + " Supervision: " + str(scheduler.supervisor.reset_counts())
+                      + " simulations stopped early")
+            if self.screen is not None:
+                self.report_screening(generation_num, screening_error)
 
             self.last_generation = generation_num
-            gen_times.append(time.time() - tic)
-
-        average_generation_time = sum(gen_times)/generation_size
+            gen_times.append(time.time() - gen_tic)
+            if self.telemetry is not None:
+                self.report_telemetry(self.telemetry.end_generation(generation_num, gen_times[-1]))
+            if self.archiver is not None:
+                self.archiver.end_generation(generation_num)
+
+        # The archiver reads the files it was given from the schedulers scratch directories
+        if self.archiver is not None:
+            self.archiver.close()
+            self.archiver = None
+
+        # Removes the schedulers scratch directories
+        if close_scheduler:
+            scheduler.close()
+
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        if self.telemetry is not None:
+            self.telemetry.close()
+            self.telemetry = None
+        self.result_cache = None
+
+        average_generation_time = sum(gen_times)/len(gen_times)
 
         if self.is_damaged:
             print(str(dt.datetime.now()) + " FINISHED SIMULATIONS FOR DAMAGED POPULATION")
@@ -175,9 +334,39 @@ class Population:
         print(str(dt.datetime.now()) + "     * Average time per episode:        " +
               str(dt.timedelta(seconds=self.average_episode_duration)))
 
-    def evaluate_population(self, generation_number):
+    def create_scheduler(self):
+        # RETURNS
+        # - scheduler               SimulationScheduler, worker pool configured by the populations settings, see
+        #                           create_scheduler
+        return create_scheduler(self.settings)
+
+    def evaluate_population(self, generation_number, scheduler=None, start_episodes=None):
         # ARGUMENTS
         # - generation_num:        int, Current generation
+        # - scheduler:             SimulationScheduler, simulation worker pool
+        # - start_episodes:        dict, {creature name: first episode to simulate}, defaults to episode 0
+
+        close_scheduler = scheduler is None
+        if scheduler is None:
+            scheduler = self.create_scheduler()
+
+        if start_episodes is None:
+            start_episodes = {}
+
+        if self.settings["evaluation"]["pipelined"]:
+            self.evaluate_population_pipelined(generation_number, scheduler, start_episodes)
+        else:
+            self.evaluate_population_by_episode(generation_number, scheduler, start_episodes)
+
+        if close_scheduler:
+            scheduler.close()
+
+    def evaluate_population_by_episode(self, generation_number, scheduler, start_episodes):
+        # Every creature is simulated for an episode before any creature starts the next episode.
+        # ARGUMENTS
+        # - generation_num:        int, Current generation
+        # - scheduler:             SimulationScheduler, simulation worker pool
+        # - start_episodes:        dict, {creature name: first episode to simulate}, missing creatures start at 0
 
         # Working directories variables
         cwd = os.getcwd()
@@ -185,114 +374,372 @@ class Population:
         # Start simulations, after each simulation robot undergoes morphological change
         for episode in range(self.settings["parameters"]["ep_size"]):
             tic = time.time()
-            processes = []
-            # launch subprocesses in asynchronously
-            for creature in self.population.values():
 
-                # reset creature for the first episode
-                if episode == 0:
-                    creature.reset()
+            # queue simulations, the scheduler limits how many run at the same time. Creatures whose simulation
+            # failed are not simulated again until the next generation
+            jobs = [self.prepare_simulation(creature, generation_number, episode)
+                    for creature in self.population.values()
+                    if episode >= start_episodes.get(creature.name, 0) and (episode == 0 or creature.failure is None)]
 
-                # Create VXA file for creature
-                creature.update_vxa(generation_number, episode)
+            # Wait for every simulator to exit, then calculate fitness
+            completed = queue.Queue()
+            for job in jobs:
+                self.submit_simulation(scheduler, job, completed)
+            self.process_simulations([scheduler.wait(completed) for _ in jobs], cwd)
 
-                # Get vxa file path
-                vxa_file_path = os.path.join(cwd, creature.current_file_name + ".vxa")
+            self.record_episode_duration(time.time() - tic)
+
+    def evaluate_population_pipelined(self, generation_number, scheduler, start_episodes):
+        # Each creature moves through its episodes on its own: as soon as a creatures simulation finishes its fitness
+        # and stiffness are updated and its next episode is queued. The only barrier is the end of the generation.
+        # ARGUMENTS
+        # - generation_num:        int, Current generation
+        # - scheduler:             SimulationScheduler, simulation worker pool
+        # - start_episodes:        dict, {creature name: first episode to simulate}, missing creatures start at 0
 
-                # Get file path variables and save vxa
-                new_file = open(vxa_file_path, "w")
-                new_file.write(creature.phenotype.vxa_file)
-                new_file.close()
+        # Working directories variables
+        cwd = os.getcwd()
+        episode_size = self.settings["parameters"]["ep_size"]
 
-                # Start multiprocessing
-                process = multiprocessing.Process(target=creature.evaluate)
-                process.start()
-                processes.append(process)
+        tic = time.time()
+        completed = queue.Queue()
+        in_flight = 0
+
+        # Queue first episode of every creature
+        for creature in self.population.values():
+            episode = start_episodes.get(creature.name, 0)
+            if episode < episode_size and (episode == 0 or creature.failure is None):
+                self.submit_simulation(scheduler, self.prepare_simulation(creature, generation_number, episode),
+                                       completed)
+                in_flight += 1
+
+        while in_flight:
+            job = scheduler.wait(completed)
+            in_flight -= 1
+
+            creature = self.process_simulation(job, cwd)
+
+            # Queue the creatures next episode
+            if creature.failure is None and creature.episode + 1 < episode_size:
+                self.submit_simulation(scheduler, self.prepare_simulation(creature, generation_number,
+                                                                          creature.episode + 1), completed)
+                in_flight += 1
+
+        # Episodes of different creatures overlap, the generations evaluation time is shared between its episodes
+        episodes = episode_size - min([start_episodes.get(name, 0) for name in self.population] + [episode_size])
+        for _ in range(episodes):
+            self.record_episode_duration((time.time() - tic)/episodes)
+
+    def record_episode_duration(self, duration):
+        # Adds an episode to the running mean of the episode durations
+        self.episodes_timed += 1
+        self.average_episode_duration += (duration - self.average_episode_duration)/self.episodes_timed
 
-            for process in processes:
-                process.join()
+    @staticmethod
+    def prepare_simulation(creature, generation_number, episode):
+        # Creates the creatures vxa file for the given episode. The file is written to the scratch directory the
+        # simulation runs in when it is launched.
+        # RETURNS
+        # - job                     SimulationJob, simulation of the creature ready to be submitted to the scheduler
 
-            # When simulations have finished, calculate fitness
-            for creature in self.population.values():
-                # Get vxa file path
-                vxa_file_path = os.path.join(cwd, creature.current_file_name + ".vxa")
-
-                # Common file names
-                gfd = os.path.join(cwd, "generated_files")                  # Generated files directory
-                ffp = os.path.join(cwd, creature.fitness_file_name)         # fitness file path
-                pfp = os.path.join(cwd, creature.pressures_file_name)       # pressure file path
-                kefp = os.path.join(cwd, creature.ke_file_name)             # ke file path
-                sfp = os.path.join(cwd, creature.strain_file_name)          # strain file path
-
-                # wait for file to appear, if two minutes passes and there is no file raise exception
-                t = time.time()
-                while not os.path.exists(pfp) or not os.path.exists(ffp):
-                    time.sleep(1)
-                    toc = time.time() - t
-                    if toc > 300:
-                        raise Exception("ERROR: No pressure file or fitness file for " + creature.name +
-                                        "found after 300 seconds. This error is commonly due to problems in the created"
-                                        " vxa file.")
+        # reset creature for the first episode
+        if episode == 0:
+            creature.reset()
 
+        # Create VXA file for creature
+        build_tic = time.time()
+        creature.update_vxa(generation_number, episode)
+        build_time = time.time() - build_tic
+
+        # The fitness and pressure files must exist for the simulation to count as successful
+        expected_files = [creature.fitness_file_name, creature.pressures_file_name]
+
+        job = SimulationJob(creature.current_file_name, payload=creature, expected_files=expected_files,
+                            vxa_text=creature.phenotype.vxa_file)
+        job.timings["vxa_build"] = build_time
+        return job
+
+    def submit_simulation(self, scheduler, job, completed):
+        # Queues a simulation on the scheduler. If its result is in the result cache the simulator is not run, the job
+        # is put on the completed queue straight away carrying the cached result.
+        # ARGUMENTS
+        # - scheduler               SimulationScheduler, simulation worker pool
+        # - job                     SimulationJob, job created by prepare_simulation
+        # - completed               queue.Queue, queue the finished job is put on
+        if self.result_cache is not None:
+            # The key is taken before launching, the scheduler drops the vxa text once it is written
+            job.cache_key = cache_key(self.simulator_name(), job.vxa_text, job.payload.fitness_file_name)
+            job.result = self.result_cache.get(job.cache_key)
+            if job.result is not None:
+                job.cache_hit = True
+                job.returncode = 0
+                completed.put(job)
+                return
+
+        scheduler.submit(job, completed)
+
+    def simulator_name(self):
+        # RETURNS
+        # - simulator               string, what simulates the creatures, results of different simulators are never
+        #                           mixed up in the result cache
+        if self.settings["evaluation"]["backend"] == "surrogate":
+            return (SURROGATE_NAME + " steps_per_period="
+                    + str(self.settings["evaluation"]["surrogate_steps_per_period"]))
+        return os.path.abspath(self.settings["evosoro_path"])
+
+    def process_simulation(self, job, cwd):
+        # Once a simulation has finished, updates the creatures fitness and stiffness and keeps or removes the
+        # generated files. If the simulation failed the creature is marked as failed instead.
+        # RETURNS
+        # - creature                class (creature), creature that was simulated
+        return self.process_simulations([job], cwd)[0]
+
+    def process_simulations(self, jobs, cwd):
+        # Same as process_simulation for several finished simulations. The neural networks of all successfully
+        # simulated creatures are evaluated together in one stacked forward pass.
+        # RETURNS
+        # - creatures               list of class (creature), creatures that were simulated
+
+        # The creatures files are in the directory their simulation ran in
+        for job in jobs:
+            job.payload.simulation_directory = job.working_directory
+
+        # Read the fitness files of every successful simulation at once. Results from the result cache or a remote
+        # worker come with the job instead of as files.
+        simulated = [job for job in jobs if job.succeeded() and job.result is None]
+        parse_tic = time.time()
+        fitness_results = read_fitness_files([job.payload.simulation_file_path(job.payload.fitness_file_name)
+                                              for job in simulated])
+        parse_time = (time.time() - parse_tic)/max(len(simulated), 1)
+        fitness_values = {}
+        for job, fitness_result in zip(simulated, fitness_results):
+            job.timings["fitness_parse"] = parse_time
+            if isinstance(fitness_result, FitnessFileError):
+                job.error = str(fitness_result)
+            else:
                 # Update creature fitness
-                creature.calculate_fitness()
-
-                # occasionally an error occurs and results return 0, if so, re-run for up to 60s
-                t = time.time()
-                toc = 0
-                while creature.fitness_eval == 0 and toc < 120:
-                    creature.calculate_fitness()
-                    toc = time.time() - t
-
-                # Update creature stiffness, uses ANN
-                creature.calculate_stiffness()
-
-                # Create new folders and move files
-                ccf = os.path.join(gfd, creature.name)  # current creature folder
-                if not os.path.exists(ccf):
-                    os.mkdir(ccf)
-
-                if self.settings["files"]["folders_per_generation"]:
-                    cgf = os.path.join(ccf, "gen_" + str(generation_number))  # current generation folder
-                    if not os.path.exists(cgf):
-                        os.mkdir(cgf)
+                job.payload.calculate_fitness(fitness_result)
+                fitness_values[job.payload.name] = fitness_result.values
+
+        ke_sums = {}
+        for job in jobs:
+            if job.succeeded() and job.result is not None:
+                job.payload.calculate_fitness(FitnessResult(None, job.result.fitness_values))
+                fitness_values[job.payload.name] = job.result.fitness_values
+                ke_sums[job.payload.name] = job.result.ke_sum
+
+        # Summarize and compress the CSV files of the simulations that were run, the KE file is read once and the
+        # neural network inputs are built from its sum
+        if self.settings["files"]["reduce_csv_files"] or self.csv_compression() is not None:
+            for job in jobs:
+                if job.result is None:
+                    reduce_tic = time.time()
+                    ke_sum = self.reduce_simulation_files(job.payload, job.succeeded())
+                    if ke_sum is not None:
+                        ke_sums[job.payload.name] = ke_sum
+                    job.timings["csv_reduction"] = time.time() - reduce_tic
+
+        evaluated = []
+        for job in jobs:
+            creature = job.payload
+
+            if job.succeeded():
+                evaluated.append(creature)
+            else:
+                creature.mark_failed(job.error)
+                warnings.warn("Simulation of " + creature.current_file_name + " failed: " + job.error + ". " +
+                              creature.name + " will not be simulated again during generation " +
+                              str(creature.generation) + ".")
+
+        # State before the update, the journal records what changed
+        if self.journal is not None:
+            before = {creature.name: (creature.stiffness_array.copy(), creature.phenotype.morphology.copy())
+                      for creature in evaluated}
+
+        # Update creature stiffness, uses ANN
+        if evaluated:
+            evaluated_jobs = [job for job in jobs if job.succeeded()]
+            nn_inputs = []
+            for job in evaluated_jobs:
+                ingest_tic = time.time()
+                nn_inputs.append(job.payload.neural_network_inputs(ke_sums.get(job.payload.name)))
+                job.timings["ke_ingest"] = time.time() - ingest_tic
+
+            forward_tic = time.time()
+            nn_outputs = NeuralNet.forward_population([creature.neural_net for creature in evaluated],
+                                                      np.stack(nn_inputs))
+            forward_time = (time.time() - forward_tic)/len(evaluated)
+
+            for job, creature_nn_outputs in zip(evaluated_jobs, nn_outputs):
+                update_tic = time.time()
+                job.payload.apply_neural_network_outputs(creature_nn_outputs)
+                job.timings["morphology_update"] = time.time() - update_tic
+                job.timings["nn_forward"] = forward_time
+
+        # Cache the results of the simulations that were run
+        if self.result_cache is not None:
+            for job in jobs:
+                if job.payload.name in fitness_values and job.payload.failure is None and not job.cache_hit:
+                    self.result_cache.put(job.cache_key, fitness_values[job.payload.name], job.payload.ke_sum)
+
+        for job in jobs:
+            if job.result is None:
+                move_tic = time.time()
+                if self.archiver is not None:
+                    self.archive_simulation_files(job)
                 else:
-                    cgf = ccf
-
-                if self.settings["files"]["folders_per_episode"]:
-                    cef = os.path.join(cgf, "ep_" + str(episode))  # current episode folder
-                    if not os.path.exists(cef):
-                        os.mkdir(cef)
+                    self.store_simulation_files(job.payload, job.vxa_file_path, cwd)
+                    job.remove_scratch_directory()
+                job.timings["file_moves"] = time.time() - move_tic
+
+            if self.journal is not None:
+                creature = job.payload
+                if creature.name in before:
+                    self.journal.write_episode(creature, *before[creature.name])
                 else:
-                    cef = cgf
+                    self.journal.write_episode(creature, creature.stiffness_array, creature.phenotype.morphology)
 
-                # Keep or delete pressure, kinetic energy and strain files
-                if self.settings["files"]["keep_csv_files"]:
-                    shutil.move(pfp, cef)
-                    shutil.move(kefp, cef)
-                    shutil.move(sfp, cef)
-                else:
-                    os.remove(pfp)
-                    os.remove(kefp)
-                    os.remove(sfp)
+            if self.telemetry is not None:
+                self.telemetry.record_episode(job)
 
-                # keep or remove fitness evaluation files
-                if self.settings["files"]["keep_fitness_files"]:
-                    shutil.move(ffp, cef)
-                else:
-                    os.remove(ffp)
+        return [job.payload for job in jobs]
 
-                # Keep or remove vxa files
-                if self.settings["files"]["keep_vxa_files"]:
-                    shutil.move(vxa_file_path, cef)
+    def csv_compression(self):
+        # RETURNS
+        # - compression             string, how the kept CSV files are compressed ("gzip" or "lzma"), None if they are
+        #                           kept as written or not kept
+        compression = self.settings["files"]["csv_compression"]
+        if not self.settings["files"]["keep_csv_files"] or compression == "none":
+            return None
+        if compression not in CSV_COMPRESSIONS:
+            raise Exception("ERROR in settings.json: Unknown CSV compression '" + compression + "', use 'none', 'gzip' "
+                            "or 'lzma'.")
+        return compression
+
+    def reduce_simulation_files(self, creature, succeeded):
+        # Summarizes the pressure, kinetic energy and strain files of the creatures last simulation in one npz file
+        # (see simulation_files.CsvReduction) and writes compressed copies of them, depending on the "files" settings.
+        # Every file is read once. The files of a failed simulation may be incomplete, they are only compressed.
+        # ARGUMENTS
+        # - creature                class (creature), simulated creature
+        # - succeeded               bool, whether the simulation succeeded
+        #
+        # RETURNS
+        # - ke_sum                  np.array, summed kinetic energy of every voxel scaled by KE_SCALE, None if the KE
+        #                           file was not summarized
+        reduce_files = self.settings["files"]["reduce_csv_files"] and succeeded
+        compression = self.csv_compression()
+        num_voxels = int(np.prod(creature.phenotype.structure))
+
+        arrays = {}
+        ke_sum = None
+        for prefix, file_name in (("pressures", creature.pressures_file_name), ("ke", creature.ke_file_name),
+                                  ("strain", creature.strain_file_name)):
+            file_path = creature.simulation_file_path(file_name)
+            if not os.path.exists(file_path):
+                continue
+
+            if reduce_files:
+                scale = KE_SCALE if prefix == "ke" else 1.0
+                try:
+                    reduction, _ = reduce_csv_file(file_path, num_voxels, self.settings["files"]["csv_series_stride"],
+                                                   scale=scale, compression=compression)
+                except Exception as error:
+                    # A malformed KE file is reported when the neural network inputs are built from it
+                    warnings.warn("Could not summarize " + file_path + ": " + str(error))
                 else:
-                    os.remove(vxa_file_path)
+                    arrays.update(reduction.arrays(prefix))
+                    if prefix == "ke":
+                        ke_sum = reduction.total
+                    continue
+
+            if compression is not None:
+                compress_file(file_path, compression)
+
+        if arrays:
+            np.savez_compressed(creature.simulation_file_path(creature.current_file_name + "_csv.npz"),
+                                stride=np.array(self.settings["files"]["csv_series_stride"]), **arrays)
+        return ke_sum
+
+    def simulation_files(self, creature, vxa_file_path):
+        # RETURNS
+        # - files                   list, (path, keep) of every file of the creatures last simulation, keep depends on
+        #                           the "files" settings. Compressed CSV files are kept instead of the files written by
+        #                           the simulator
+        ffp = creature.simulation_file_path(creature.fitness_file_name)             # fitness file path
+        pfp = creature.simulation_file_path(creature.pressures_file_name)           # pressure file path
+        kefp = creature.simulation_file_path(creature.ke_file_name)                 # ke file path
+        sfp = creature.simulation_file_path(creature.strain_file_name)              # strain file path
+        csfp = creature.simulation_file_path(creature.current_file_name + "_csv.npz")  # csv summary file path
+
+        compression = self.csv_compression()
+        files = [(file_path, self.settings["files"]["keep_csv_files"] and compression is None)
+                 for file_path in (pfp, kefp, sfp)]
+        if compression is not None:
+            files += [(file_path + CSV_COMPRESSIONS[compression], True) for file_path in (pfp, kefp, sfp)]
+
+        return files + [(csfp, self.settings["files"]["reduce_csv_files"]),
+                        (ffp, self.settings["files"]["keep_fitness_files"]),
+                        (vxa_file_path, self.settings["files"]["keep_vxa_files"])]
+
+    def archive_simulation_files(self, job):
+        # Hands the files of a finished simulation to the archiver, which also removes the directory the simulation ran
+        # in once it has archived them. Only the files kept by the "files" settings are archived.
+        creature = job.payload
+        files = self.simulation_files(creature, job.vxa_file_path)
+        kept = [(file_path, creature.name + "/" + os.path.basename(file_path)) for file_path, keep in files
+                if keep and file_path is not None]
+
+        if job.in_scratch:
+            cleanup = job.remove_scratch_directory
+        else:
+            removed = [file_path for file_path, keep in files if not keep and file_path is not None]
+
+            def cleanup():
+                for file_path in removed:
+                    if os.path.exists(file_path):
+                        os.remove(file_path)
 
-            toc = time.time() - tic
-            if self.average_episode_duration == 0:
-                self.average_episode_duration = toc
+        self.archiver.add(creature.generation, kept, cleanup)
+
+    def store_simulation_files(self, creature, vxa_file_path, cwd):
+        # Moves the files of the creatures last simulation from its scratch directory to the output directory or
+        # removes them, depending on the "files" settings. Files missing because the simulation failed are skipped.
+
+        # Common file names
+        gfd = os.path.join(cwd, self.output_directory)                              # Generated files directory
+
+        # Create new folders and move files
+        ccf = os.path.join(gfd, creature.name)  # current creature folder
+        if not os.path.exists(ccf):
+            os.mkdir(ccf)
+
+        if self.settings["files"]["folders_per_generation"]:
+            cgf = os.path.join(ccf, "gen_" + str(creature.generation))  # current generation folder
+            if not os.path.exists(cgf):
+                os.mkdir(cgf)
+        else:
+            cgf = ccf
+
+        if self.settings["files"]["folders_per_episode"]:
+            cef = os.path.join(cgf, "ep_" + str(creature.episode))  # current episode folder
+            if not os.path.exists(cef):
+                os.mkdir(cef)
+        else:
+            cef = cgf
+
+        # Keep or delete pressure, kinetic energy and strain files
+        for file_path, keep in self.simulation_files(creature, vxa_file_path):
+            if file_path is None or not os.path.exists(file_path):
+                continue
+            if keep:
+                # A resumed run simulates the episodes after the last journal sync again, their files are replaced
+                destination = os.path.join(cef, os.path.basename(file_path))
+                if os.path.exists(destination):
+                    os.remove(destination)
+                shutil.move(file_path, destination)
             else:
-                self.average_episode_duration = (self.average_episode_duration + toc)/2
+                os.remove(file_path)
 
     def save_population(self, name="previous_population"):
         sys.setrecursionlimit(10000)
@@ -303,12 +750,93 @@ class Population:
         w_file.close()
 
     @staticmethod
-    def load_population():
-        with open("previous_population.pkl", "rb") as file:
+    def load_population(file_name="previous_population.pkl"):
+        with open(file_name, "rb") as file:
             loaded_pop = pickle.load(file)
         file.close()
+        if not isinstance(loaded_pop.base_creature.evolution, EvolutionHistory):
+            raise Exception("ERROR: " + file_name + " was saved by the original version of the repository, whose "
+                            "creatures are not supported. Evolve a new population.")
         return loaded_pop
 
+    @staticmethod
+    def resume_from_journal(file_path=os.path.join("generated_files", "journal.jsonl")):
+        # Rebuilds the population of an interrupted run from the population it started with and its journal.
+        # RETURNS
+        # - population              class (population), population as it was after the last journaled episode
+        # - generation              int, generation to resume
+        # - start_episodes          dict, {creature name: next episode to simulate} for the resumed generation, None if
+        #                           the run stopped before its first generation started
+        # - last_generation         int, last generation of the interrupted run
+
+        records = read_journal(file_path)
+        run_indexes = [i for i, record in enumerate(records) if record["type"] == "run"]
+        if not run_indexes:
+            raise Exception("ERROR: The journal " + file_path + " does not contain a run to resume.")
+        run = records[run_indexes[-1]]
+
+        population = Population.load_population(run["population_file"])
+        generation, start_episodes = population.replay_journal(records[run_indexes[-1] + 1:])
+        if generation is None:
+            generation, start_episodes = run["first_generation"], None
+
+        return population, generation, start_episodes, run["last_generation"]
+
+    def replay_journal(self, records):
+        # Applies journal records to the population, the same changes evaluating the population made.
+        # ARGUMENTS
+        # - records                 list, journal records written after this population was saved
+        #
+        # RETURNS
+        # - generation              int, last generation in the records, None if there is none
+        # - start_episodes          dict, {creature name: next episode to simulate} for that generation
+
+        generation = None
+        start_episodes = {}
+        for record in records:
+            if record["type"] == "generation":
+                # The screening model learns from the finished generation, as it did during the run
+                if self.screen is not None and generation is not None:
+                    self.train_screen(generation)
+
+                generation = record["generation"]
+                self.last_generation = max(generation - 1, 0)
+
+                # Creatures created for the generation are new copies of the base creature
+                self.population = {}
+                for name in record["creatures"]:
+                    if name not in self.full_population:
+                        creature = self.base_creature.clone(name)
+                        creature.set_neural_network()
+                        self.full_population[name] = creature
+                    creature = self.full_population[name]
+                    creature.neural_net.parameters = {key: np.array(value)
+                                                      for key, value in record["nn_parameters"][name].items()}
+                    self.population[name] = creature
+                start_episodes = {name: 0 for name in record["creatures"]}
+
+            elif record["type"] == "episode":
+                creature = self.population[record["creature"]]
+                if record["episode"] == 0:
+                    creature.reset()
+                creature.update_creature_info(record["generation"], record["episode"])
+
+                creature.fitness_eval = record["fitness_eval"]
+                creature.previous_fitness = record["previous_fitness"]
+                creature.fitness_xyz = record["fitness_xyz"]
+                creature.failure = record["failure"]
+
+                # Evolutionary history is updated before the neural network changes the creature
+                if creature.failure is None:
+                    creature.average_forces = np.array(record["average_forces"])
+                    creature.update_evolution()
+
+                apply_delta(creature.stiffness_array, record["stiffness"])
+                apply_delta(creature.phenotype.morphology, record["morphology"])
+                start_episodes[creature.name] = record["episode"] + 1
+
+        return generation, start_episodes
+
     def new_population(self):
         # Function sorts previously evaluated population and selects top performers, evolves the neural network of a
         # a selected few and creates new creatures. These are joined into one dictionary for further evaluation
@@ -338,20 +866,120 @@ class Population:
         # Reset population
         self.population = {}
         # Create new creatures (must be ran before adding top preforming creatures
-        self.create_new_population((num_creatures, num_creatures + new_pop_size))
+        screened = self.screen is not None and self.screen.is_trained()
+        if screened:
+            self.create_screened_population((num_creatures, num_creatures + new_pop_size))
+        else:
+            self.create_new_population((num_creatures, num_creatures + new_pop_size))
 
         # Add top preforming creatures to new population
         self.population.update({creature.name: creature for creature in sorted_pop[0:top]})
 
         # From sorted pop grab the next =evolved (num) creatures
-        self.population.update({creature.name: creature.update_neural_network(return_self=True)
-                                for creature in sorted_pop[top:evolve + top]})
+        if screened:
+            self.screen_mutations(sorted_pop[top:evolve + top])
+            self.population.update({creature.name: creature for creature in sorted_pop[top:evolve + top]})
+        else:
+            self.population.update({creature.name: creature.update_neural_network(return_self=True)
+                                    for creature in sorted_pop[top:evolve + top]})
 
         # Top creature
         top_creature = sorted_pop[0]
 
         return top_creature
 
+    def screening_features(self, creature, neural_net):
+        # RETURNS
+        # - features                np.array, screening features of the creature with the given neural network, taken
+        #                           from the stiffness and morphology it starts its next generation with
+        if len(creature.evolution):
+            row = len(creature.evolution) - 1
+            stiffness, morphology = creature.evolution.stiffness[row, 0], creature.evolution.morphology[row, 0]
+        else:
+            stiffness, morphology = creature.initial_stiffness, creature.phenotype.morphology
+        return creature_features(neural_net.parameters, stiffness, morphology,
+                                 self.settings["structure"]["max_stiffness"])
+
+    def create_screened_population(self, population_range):
+        # Same as create_new_population, but oversample times as many random neural networks are created and the new
+        # creatures get those the screening model predicts to do best.
+        a, b = population_range
+        # At least one candidate per new creature, also when oversample is below 1
+        num_candidates = max(int(math.ceil(self.settings["screening"]["oversample"] * (b - a))), b - a)
+        neural_nets = [NeuralNet() for _ in range(num_candidates)]
+        selected = self.screen.select(np.array([self.screening_features(self.base_creature, neural_net)
+                                                for neural_net in neural_nets]), b - a)
+        self.create_new_population(population_range, [neural_nets[i] for i in selected])
+
+    def screen_mutations(self, creatures):
+        # Mutates the neural network of every creature oversample times and keeps the mutation the screening model
+        # predicts to do best.
+        num_mutations = max(int(math.ceil(self.settings["screening"]["oversample"])), 1)
+        for creature in creatures:
+            mutations = []
+            for _ in range(num_mutations):
+                neural_net = creature.neural_net.copy()
+                neural_net.update_neural_net()
+                mutations.append(neural_net)
+            best = self.screen.select(np.array([self.screening_features(creature, neural_net)
+                                                for neural_net in mutations]), 1)[0]
+            creature.neural_net = mutations[best]
+
+    def train_screen(self, generation):
+        # Trains the screening model on the creatures evaluated in the generation. They are predicted first, with the
+        # model trained on the earlier generations only.
+        # RETURNS
+        # - error                   dict, {"samples", "rmse", "rank_correlation"}, rmse and rank_correlation are None
+        #                           while the model is not trained yet
+        samples = [history_sample(creature.evolution, generation, self.settings["structure"]["max_stiffness"])
+                   for creature in self.population.values()]
+        samples = [sample for sample in samples if sample is not None]
+        error = {"samples": len(samples), "rmse": None, "rank_correlation": None}
+        if not samples:
+            return error
+
+        features = np.array([features for features, _ in samples])
+        targets = np.array([target for _, target in samples])
+        if self.screen.is_trained():
+            rmse, rank_correlation = prediction_error(self.screen.predict(features), targets)
+            error["rmse"] = rmse
+            error["rank_correlation"] = None if math.isnan(rank_correlation) else rank_correlation
+        self.screen.train(features, targets)
+
+        return error
+
+    def report_screening(self, generation, error):
+        # Prints how well the screening model predicted the generation and how many candidates screening the next
+        # generation rejected, and appends them to screening.jsonl in the output directory. The same number of
+        # creatures is simulated with or without screening, candidate_simulations_avoided counts the simulations the
+        # rejected candidates would have needed had they all been simulated.
+        candidates, rejected = self.screen.reset_counts()
+        report = dict(error, generation=generation, candidates=candidates, rejected_candidates=rejected,
+                      candidate_simulations_avoided=rejected * self.settings["parameters"]["ep_size"])
+
+        if error["rmse"] is None:
+            accuracy = "model not trained yet (" + str(self.screen.count) + " samples)"
+        else:
+            accuracy = ("prediction RMSE " + "{:.4f}".format(error["rmse"]) + ", rank correlation " +
+                        ("n/a" if error["rank_correlation"] is None else "{:.3f}".format(error["rank_correlation"])) +
+                        " on " + str(error["samples"]) + " creatures")
+        print(str(dt.datetime.now()) + " Screening: " + accuracy + ", " + str(rejected) + " of " + str(candidates) +
+              " candidates rejected")
+
+        with open(os.path.join(self.output_directory, "screening.jsonl"), "a") as screening_file:
+            screening_file.write(json.dumps(report, sort_keys=True) + "\n")
+
+    def report_telemetry(self, record):
+        # Prints where the time of a generation went, see telemetry.py
+        # ARGUMENTS
+        # - record                  dict, generation record written by Telemetry.end_generation
+        phases = ", ".join(phase + " " + "{:.3f}".format(summary["p50"]) + "/" + "{:.3f}".format(summary["p90"])
+                           for phase, summary in record["phases"].items())
+        print(str(dt.datetime.now()) + " Telemetry: generation took " + "{:.1f}".format(record["wall_time"]) +
+              " s, simulator " + "{:.1f}".format(record["simulator_time"]) + " s, python " +
+              "{:.1f}".format(record["python_time"]) + " s summed over " + str(record["episodes"]) +
+              " creature-episodes. Median/90th percentile seconds per episode: " + phases)
+
     def sort_population(self, population=None):
         # If pop not specified used self.population
         if population is None:
@@ -384,75 +1012,66 @@ class Population:
 
         dict_sort_creatures = [{creature.name: creature.fitness_eval} for creature in sorted_pop]
 
-        with open("generated_files/" + "performance_" + file_name + ".json", "w") as population_file:
+        with open(os.path.join(self.output_directory, "performance_" + file_name + ".json"), "w") as population_file:
             json.dump(dict_sort_creatures, population_file, sort_keys=True, indent=4)
         population_file.close()
 
-        # Save evolutionary history of creatures
+        # Save evolutionary history of creatures, the json export (format of earlier versions) is only written on request
         for creature in population.values():
-            with open("generated_files/" + creature.name + "/evolution.json", "w") as creature_file:
-                json.dump(creature.evolution, creature_file, sort_keys=True, indent=4)
-            creature_file.close()
+            creature.evolution.save(os.path.join(self.output_directory, creature.name, "evolution.npz"))
+            if self.settings["files"]["evolution_json"]:
+                with open(os.path.join(self.output_directory, creature.name, "evolution.json"), "w") as creature_file:
+                    json.dump(creature.evolution.to_dict(), creature_file, sort_keys=True, indent=4)
+                creature_file.close()
 
     def inflict_damage(self, damage_type, damage_arguments, population_to_damage=None):
 
         if population_to_damage is None:
             population_to_damage = self
 
-        assert isinstance(damage_type, str)
+        assert isinstance(damage_type, STRING)
         assert isinstance(damage_arguments, list)
 
+        # Damage is inflicted on the base creature, creatures created later are cloned from it and are damaged as well
+        base_creature = population_to_damage.base_creature
+
         # SECTION DAMAGES
         if damage_type == "remove_sect":
             assert len(damage_arguments) == 1
             if not isinstance(damage_arguments[0], int):
                 assert isinstance(damage_arguments[0], tuple)
 
-            # Apply damage to base creature of population
-            base_creature = population_to_damage.base_creature
             base_creature.remove_voxels_sections(damage_arguments[0])
-            base_creature.initial_stiffness = base_creature.stiffness_array
-            base_creature.phenotype.base_morphology = base_creature.phenotype.morphology
-
-            # Set the base morph and stiff for each creature to the base_creature morphology
-            for creature in population_to_damage.population.values():
-                creature.initial_stiffness = base_creature.initial_stiffness
-                creature.phenotype.base_morphology = base_creature.phenotype.base_morphology
 
         elif damage_type == "stiff_sect_mult":
             assert len(damage_arguments) == 2
             assert isinstance(damage_arguments[0], tuple)
             assert isinstance(damage_arguments[1], float) or isinstance(damage_arguments[1], int)
-            for creature in population_to_damage.values():
-                creature.stiffness_change_sections(damage_arguments[0], multiply_stiffness=damage_arguments[1])
+            base_creature.stiffness_change_sections(damage_arguments[0], multiply_stiffness=damage_arguments[1])
 
         elif damage_type == "stiff_sect_div":
             assert len(damage_arguments) == 2
             assert isinstance(damage_arguments[0], tuple)
             assert isinstance(damage_arguments[1], float) or isinstance(damage_arguments[1], int)
-            for creature in population_to_damage.values():
-                creature.stiffness_change_sections(damage_arguments[0], divide_stiffness=damage_arguments[1])
+            base_creature.stiffness_change_sections(damage_arguments[0], divide_stiffness=damage_arguments[1])
 
         elif damage_type == "stiff_sect_set":
             assert len(damage_arguments) == 2
             assert isinstance(damage_arguments[0], tuple)
             assert isinstance(damage_arguments[1], float) or isinstance(damage_arguments[1], int)
-            for creature in population_to_damage.values():
-                creature.stiffness_change_sections(damage_arguments[0], set_new_stiffness=damage_arguments[1])
+            base_creature.stiffness_change_sections(damage_arguments[0], set_new_stiffness=damage_arguments[1])
 
         elif damage_type == "stiff_sect_add":
             assert len(damage_arguments) == 2
             assert isinstance(damage_arguments[0], tuple)
             assert isinstance(damage_arguments[1], float) or isinstance(damage_arguments[1], int)
-            for creature in population_to_damage.values():
-                creature.stiffness_change_sections(damage_arguments[0], increase_stiffness=damage_arguments[1])
+            base_creature.stiffness_change_sections(damage_arguments[0], increase_stiffness=damage_arguments[1])
 
         elif damage_type == "stiff_sect_red":
             assert len(damage_arguments) == 2
             assert isinstance(damage_arguments[0], tuple)
             assert isinstance(damage_arguments[1], float) or isinstance(damage_arguments[1], int)
-            for creature in population_to_damage.values():
-                creature.stiffness_change_sections(damage_arguments[0], reduce_stiffness=damage_arguments[1])
+            base_creature.stiffness_change_sections(damage_arguments[0], reduce_stiffness=damage_arguments[1])
 
         # SPHERICAL DAMAGES
         elif damage_type == "remove_spher":
@@ -461,8 +1080,7 @@ class Population:
             assert isinstance(damage_arguments[0], tuple)
             assert isinstance(damage_arguments[1], int)
 
-            for creature in population_to_damage.values():
-                creature.remove_voxels_spherical_region(damage_arguments[0], damage_arguments[1])
+            base_creature.remove_voxels_spherical_region(damage_arguments[0], damage_arguments[1])
 
         elif damage_type == "stiff_spher_mult":
             assert len(damage_arguments) == 3
@@ -471,9 +1089,8 @@ class Population:
             assert isinstance(damage_arguments[1], int)
             assert isinstance(damage_arguments[2], float) or isinstance(damage_arguments[2], int)
 
-            for creature in population_to_damage.values():
-                creature.stiffness_change_spherical_region(damage_arguments[0], damage_arguments[1],
-                                                           multiply_stiffness=damage_arguments[2])
+            base_creature.stiffness_change_spherical_region(damage_arguments[0], damage_arguments[1],
+                                                            multiply_stiffness=damage_arguments[2])
 
         elif damage_type == "stiff_spher_div":
             assert len(damage_arguments) == 3
@@ -482,9 +1099,8 @@ class Population:
             assert isinstance(damage_arguments[1], int)
             assert isinstance(damage_arguments[2], float) or isinstance(damage_arguments[2], int)
 
-            for creature in population_to_damage.values():
-                creature.stiffness_change_spherical_region(damage_arguments[0], damage_arguments[1],
-                                                           divide_stiffness=damage_arguments[2])
+            base_creature.stiffness_change_spherical_region(damage_arguments[0], damage_arguments[1],
+                                                            divide_stiffness=damage_arguments[2])
 
         elif damage_type == "stiff_spher_set":
             assert len(damage_arguments) == 3
@@ -493,9 +1109,8 @@ class Population:
             assert isinstance(damage_arguments[1], int)
             assert isinstance(damage_arguments[2], float) or isinstance(damage_arguments[2], int)
 
-            for creature in population_to_damage.values():
-                creature.stiffness_change_spherical_region(damage_arguments[0], damage_arguments[1],
-                                                           set_new_stiffness=damage_arguments[2])
+            base_creature.stiffness_change_spherical_region(damage_arguments[0], damage_arguments[1],
+                                                            set_new_stiffness=damage_arguments[2])
 
         elif damage_type == "stiff_spher_add":
             assert len(damage_arguments) == 3
@@ -504,9 +1119,8 @@ class Population:
             assert isinstance(damage_arguments[1], int)
             assert isinstance(damage_arguments[2], float) or isinstance(damage_arguments[2], int)
 
-            for creature in population_to_damage.values():
-                creature.stiffness_change_spherical_region(damage_arguments[0], damage_arguments[1],
-                                                           increase_stiffness=damage_arguments[2])
+            base_creature.stiffness_change_spherical_region(damage_arguments[0], damage_arguments[1],
+                                                            increase_stiffness=damage_arguments[2])
 
         elif damage_type == "stiff_spher_red":
             assert len(damage_arguments) == 3
@@ -515,13 +1129,21 @@ class Population:
             assert isinstance(damage_arguments[1], int)
             assert isinstance(damage_arguments[2], float) or isinstance(damage_arguments[2], int)
 
-            for creature in population_to_damage.values():
-                creature.stiffness_change_spherical_region(damage_arguments[0], damage_arguments[1],
-                                                           reduce_stiffness=damage_arguments[2])
+            base_creature.stiffness_change_spherical_region(damage_arguments[0], damage_arguments[1],
+                                                            reduce_stiffness=damage_arguments[2])
 
         else:
             raise Exception("ERROR: Unknown damage type.")
 
+        # The damaged stiffness becomes the initial stiffness of every creature, so resetting a creature at the start of
+        # an episode keeps the damage. Every creature gets its own copy, the stiffness it evolves must not change it
+        base_creature.initial_stiffness = base_creature.stiffness_array.copy()
+        base_creature.phenotype.base_morphology = base_creature.phenotype.morphology.copy()
+        for creature in population_to_damage.population.values():
+            creature.initial_stiffness = base_creature.initial_stiffness.copy()
+            creature.phenotype.base_morphology = base_creature.phenotype.base_morphology.copy()
+            creature.update_morphology(creature.initial_stiffness)
+
         # Update damage type and damage arguments
         self.damage_type = damage_type
         self.damage_arguments = damage_arguments
@@ -534,3 +1156,30 @@ class Population:
         #
         #     self.base_creature.initial_stiffness = creature.initial_stiffness
         #     self.base_creature.phenotype.base_morphology = creature.phenotype.base_morphology
+
+        return population_to_damage.population
+
+
+def create_scheduler(settings):
+    # Creates the worker pool used to run voxelyze, at most max_workers simulations run at once. With the distributed
+    # backend simulations are sent to worker agents on other machines instead (see distributed.py), with the surrogate
+    # backend they are run in this process by the mass-spring surrogate (see surrogate.py).
+    # RETURNS
+    # - scheduler               SimulationScheduler, configured by the evaluation section of the settings
+    backend = settings["evaluation"]["backend"]
+    if backend == "distributed":
+        return DistributedScheduler(settings["evaluation"]["broker_address"],
+                                    heartbeat_timeout=settings["evaluation"]["heartbeat_timeout"],
+                                    token=settings["evaluation"]["broker_token"])
+    if backend == "surrogate":
+        return SurrogateScheduler(settings["evaluation"]["max_workers"],
+                                  steps_per_period=settings["evaluation"]["surrogate_steps_per_period"])
+    if backend != "local":
+        raise Exception("ERROR in settings.json: Unknown evaluation backend '" + backend + "', use 'local', "
+                        "'distributed' or 'surrogate'.")
+
+    return SimulationScheduler(settings["evosoro_path"], settings["evaluation"]["max_workers"],
+                               timeout=settings["evaluation"]["simulation_timeout"],
+                               output_timeout=settings["evaluation"]["output_timeout"],
+                               scratch_directory=settings["evaluation"]["scratch_directory"],
+                               supervisor=create_supervisor(settings))
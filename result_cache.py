@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from simulation_files import SimulationResult
+
+
+# RESULT CACHE
+# On-disk cache of simulation results keyed on the simulated vxa file. Creatures whose morphology and stiffness repeat
+# (E.g. elites replaying an unchanged network, damaged populations re-evaluating the same creature) produce the same vxa
+# file and reuse the stored fitness values and summed kinetic energy instead of running voxelyze again. Only valid for a
+# deterministic simulator.
+#
+# Every entry is a small JSON file named after its key. Entries are evicted least recently used first once the cache
+# grows beyond its size limit, the modification time of an entry is its last use so the order survives restarts.
+
+
+def cache_key(simulator, vxa_text, fitness_file_name):
+    # ARGUMENTS
+    # - simulator               string, identifies the simulator, E.g. the absolute path to voxelyze
+    #
+    # RETURNS
+    # - key                     string, hex digest identifying the simulation. The fitness file name is the only part
+    #                           of the vxa file that depends on the creatures name, generation and episode, it is left
+    #                           out
+    canonical = simulator + "\n" + vxa_text.replace(fitness_file_name, "")
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, directory, max_bytes):
+        # ARGUMENTS
+        # - directory               string, directory the entries are stored in, created if missing
+        # - max_bytes               int, the least recently used entries are removed when the cache grows beyond this
+
+        self.directory = directory                                  # string, entry directory
+        self.max_bytes = max_bytes                                  # int, size limit
+        self.hits = 0                                               # int, lookups answered since the last reset
+        self.misses = 0                                             # int, lookups not answered since the last reset
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        # Least recently used entry first
+        self._entries = OrderedDict()                               # OrderedDict, {key: entry size in bytes}
+        self._size = 0                                              # int, total size of the entries
+        self._lock = threading.Lock()
+
+        entries = []
+        for file_name in os.listdir(directory):
+            if file_name.endswith(".json"):
+                stat = os.stat(os.path.join(directory, file_name))
+                entries.append((stat.st_mtime, file_name[:-len(".json")], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._size += size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key):
+        # RETURNS
+        # - result                  SimulationResult, None if the simulation is not cached
+        with self._lock:
+            try:
+                with open(self.entry_path(key)) as entry_file:
+                    entry = json.load(entry_file)
+                os.utime(self.entry_path(key), None)
+            except (IOError, OSError, ValueError):
+                # Not cached, or removed by another run sharing the directory
+                if key in self._entries:
+                    self._remove(key)
+                self.misses += 1
+                return None
+
+            # Entries written by other runs sharing the directory are adopted
+            size = self._entries.pop(key, None)
+            if size is None:
+                size = os.path.getsize(self.entry_path(key))
+                self._size += size
+            self._entries[key] = size
+            self.hits += 1
+
+        return SimulationResult(entry["fitness_values"], np.array(entry["ke_sum"]))
+
+    def put(self, key, fitness_values, ke_sum):
+        # Stores the result of a simulation, evicting the least recently used entries if the cache becomes too large.
+        # ARGUMENTS
+        # - key                     string, see cache_key
+        # - fitness_values          dict, values of the fitness file
+        # - ke_sum                  np.array, summed kinetic energy of every voxel
+        text = json.dumps({"fitness_values": fitness_values, "ke_sum": np.asarray(ke_sum).tolist()})
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            # Written next to the entry and renamed so a reader never sees half an entry
+            temporary_path = (self.entry_path(key) + "." + str(os.getpid()) + "."
+                              + str(threading.current_thread().ident) + ".tmp")
+            with open(temporary_path, "w") as entry_file:
+                entry_file.write(text)
+            os.rename(temporary_path, self.entry_path(key))
+
+            self._entries[key] = len(text)
+            self._size += len(text)
+
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        self._size -= self._entries.pop(key)
+        try:
+            os.remove(self.entry_path(key))
+        except OSError:
+            # Already removed by another run sharing the directory
+            pass
+
+    def reset_counts(self):
+        # RETURNS
+        # - hits                    int, cache hits since the last reset
+        # - misses                  int, cache misses since the last reset
+        with self._lock:
+            hits, misses = self.hits, self.misses
+            self.hits = 0
+            self.misses = 0
+        return hits, misses
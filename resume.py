@@ -0,0 +1,27 @@
+import datetime
+import os
+import sys
+
+from population_async import Population
+
+if __name__ == "__main__":
+    try:
+        journal_file_name = os.path.join("generated_files", "journal.jsonl")
+
+        if not os.path.exists(journal_file_name):
+            raise Exception("STOPPING SIMULATION: No journal found at " + journal_file_name + ". Runs can only be "
+                            "resumed when 'journal' is enabled in the 'files' settings.")
+
+        # Rebuild the population from the journal of the interrupted run
+        population, generation, start_episodes, last_generation = Population.resume_from_journal(journal_file_name)
+        print(str(datetime.datetime.now()) + " RESUMING GENERATION " + str(generation) + " OF THE INTERRUPTED RUN")
+
+        # Evaluate the remaining episodes and generations
+        population.run_genetic_algorithm(last_generation - generation + 1, first_generation=generation,
+                                         start_episodes=start_episodes)
+        population.save_population()
+
+        print(str(datetime.datetime.now()) + "-----FINISHED EVALUATION-----")
+
+    except KeyboardInterrupt:
+        sys.exit()
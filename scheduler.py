@@ -0,0 +1,287 @@
+import multiprocessing
+import os
+import shutil
+import subprocess as sub
+import tempfile
+import threading
+import time
+from collections import deque
+
+from simulation_files import simulation_output_names
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+def wait_for_files(file_paths, timeout):
+    # Fallback for when the simulator has exited but its output is not visible yet (E.g. slow network file systems).
+    # Checks for the files with an exponential back-off instead of fixed sleeps.
+    # RETURNS
+    # - missing                 list of file paths that did not appear before the timeout
+
+    deadline = time.time() + timeout
+    delay = 0.001
+    missing = [path for path in file_paths if not os.path.exists(path)]
+    while missing and time.time() < deadline:
+        time.sleep(min(delay, max(deadline - time.time(), 0)))
+        delay = min(delay * 2, 0.25)
+        missing = [path for path in missing if not os.path.exists(path)]
+
+    return missing
+
+
+class SimulationJob:
+    def __init__(self, name, vxa_file_path=None, working_directory=None, payload=None, expected_files=None,
+                 vxa_text=None):
+        # A single voxelyze run, created by the population and handed to a SimulationScheduler.
+        # ARGUMENTS
+        # - name                    string, job name, usually the creatures current file name
+        # - vxa_file_path           string, path to the vxa file to be simulated
+        # - working_directory       string, directory the simulator is started in (results are written here). If None,
+        #                           the job runs in a scratch directory of its own within the directory of the worker
+        #                           slot it is given, see remove_scratch_directory
+        # - payload                 object, returned untouched with the finished job (E.g. the simulated creature)
+        # - expected_files          list, files the simulator must have written for the job to succeed, relative paths
+        #                           are relative to the working directory
+        # - vxa_text                string, vxa file contents, written to name + ".vxa" in the working directory when
+        #                           the job is launched (instead of giving vxa_file_path)
+
+        self.name = name                                            # string, job name
+        self.vxa_file_path = vxa_file_path                          # string, vxa file to simulate
+        self.vxa_text = vxa_text                                    # string, vxa file contents
+        self.working_directory = working_directory                  # string, cwd of the simulator
+        self.payload = payload                                      # object, caller data
+        self.expected_files = expected_files or []                  # list, output files of the simulation
+        self.slot = None                                            # int, worker slot the job ran in
+        self.in_scratch = False                                     # bool, does the job run in a scratch directory
+        self.cache_key = None                                       # string, result cache key of the simulation
+        self.cache_hit = False                                      # bool, was the result taken from the result cache
+        self.result = None                                          # SimulationResult, result delivered instead of
+        #                                                             output files (result cache, remote worker)
+
+        self.process = None                                         # sub.Popen, running simulator
+        self.returncode = None                                      # int, simulator exit code
+        self.error = None                                           # string, reason the simulation failed
+        self.timed_out = False                                      # bool, was the simulator killed for taking too long
+        self.stop_reason = None                                     # string, why the simulator was stopped early
+        self.completed_queue = None                                 # queue.Queue, where the job is put when done
+        self.timer = None                                           # threading.Timer, kills the simulator on timeout
+
+        # Timings (seconds since epoch)
+        self.submit_time = None                                     # float, time job was queued
+        self.start_time = None                                      # float, time simulator was launched
+        self.end_time = None                                        # float, time simulator exited
+        self.timings = {}                                           # dict, {phase: seconds} spent on the job outside
+        #                                                             the simulator, see telemetry.py
+
+    def succeeded(self):
+        return self.returncode == 0 and self.error is None
+
+    def stop(self, reason):
+        # Kills the simulator before it finishes (E.g. SimulationSupervisor), the job fails with the reason.
+        # RETURNS
+        # - stopped                 bool, False if the simulator had already exited
+        if self.process is None or self.process.poll() is not None:
+            return False
+        self.stop_reason = reason
+        try:
+            self.process.kill()
+        except OSError:
+            return False
+        return True
+
+    def remove_scratch_directory(self):
+        # Removes the scratch directory the job ran in, once its output files have been moved or read. Jobs given a
+        # working directory are left alone.
+        if self.in_scratch:
+            shutil.rmtree(self.working_directory, ignore_errors=True)
+
+
+class SimulationScheduler:
+    def __init__(self, simulator_path, max_workers=None, timeout=None, output_timeout=10, scratch_directory=None,
+                 supervisor=None):
+        # Runs voxelyze simulations with at most max_workers simulators in flight. Queued jobs are started as soon as
+        # a running simulation exits, completion is detected from the simulators exit code.
+        # Every worker slot has its own scratch directory, jobs without a working directory run in a directory of their
+        # own within it so simulations never share files (E.g. voxelyze's Qhull and curvature temporary files). The slot
+        # is free for the next simulation as soon as the simulator exits, the jobs files stay in its directory until the
+        # caller removes it (SimulationJob.remove_scratch_directory), even if a job of the same name runs next.
+        # ARGUMENTS
+        # - simulator_path          string, path to the voxelyze executable
+        # - max_workers             int, maximum number of concurrent simulations, defaults to the number of cpus
+        # - timeout                 float, seconds a simulation may run before it is killed and failed, None for no
+        #                           limit
+        # - output_timeout          float, seconds to wait for expected files to appear after the simulator exited
+        # - scratch_directory       string, where the slot directories are created (E.g. /dev/shm to keep simulation
+        #                           files in memory), defaults to the systems temporary directory
+        # - supervisor              SimulationSupervisor, stops hopeless simulations early, None to run every simulation
+        #                           until it exits or times out
+
+        if max_workers is None:
+            max_workers = multiprocessing.cpu_count()
+        if max_workers < 1:
+            raise Exception("ERROR: The simulation scheduler needs at least one worker. max_workers was set to "
+                            + str(max_workers))
+
+        self.simulator_path = os.path.abspath(simulator_path)       # string, path to voxelyze
+        self.max_workers = max_workers                              # int, max number of concurrent simulations
+        self.timeout = timeout                                      # float, simulation wall-clock limit
+        self.output_timeout = output_timeout                        # float, limit to wait for output files
+        self.completed = queue.Queue()                              # queue.Queue, default queue of finished jobs
+        self.supervisor = supervisor                                # SimulationSupervisor, watches running jobs
+
+        self.scratch_directory = scratch_directory                  # string, parent of the slot directories
+        self.scratch_root = None                                    # string, this schedulers slot directories
+
+        self._pending = deque()                                     # deque, jobs waiting for a free worker
+        self._running = set()                                       # set, jobs currently being simulated
+        self._free_slots = list(range(max_workers))                 # list, slots without a running simulation
+        self._launched = 0                                          # int, jobs launched, names the job directories
+        self._lock = threading.Lock()
+
+    def submit(self, job, completed=None):
+        # Queue a job, it is launched immediately if a worker is free.
+        # ARGUMENTS
+        # - job                     SimulationJob, job to run
+        # - completed               queue.Queue, queue the finished job is put on, defaults to self.completed
+
+        job.completed_queue = completed if completed is not None else self.completed
+        job.submit_time = time.time()
+
+        with self._lock:
+            self._pending.append(job)
+            self._launch_pending()
+
+    def wait(self, completed=None):
+        # Blocks until a job has finished and returns it.
+        if completed is None:
+            completed = self.completed
+        return completed.get()
+
+    def run(self, jobs):
+        # Simulate all jobs and block until every one of them has finished.
+        # RETURNS
+        # - finished                list of SimulationJob, in order of completion
+
+        completed = queue.Queue()
+        for job in jobs:
+            self.submit(job, completed)
+
+        return [self.wait(completed) for _ in range(len(jobs))]
+
+    def num_running(self):
+        with self._lock:
+            return len(self._running)
+
+    def slot_directory(self, slot):
+        # RETURNS
+        # - directory               string, scratch directory of a worker slot, created on first use
+        if self.scratch_root is None:
+            self.scratch_root = tempfile.mkdtemp(prefix="voxelyze_", dir=self.scratch_directory)
+
+        directory = os.path.join(self.scratch_root, "slot_" + str(slot))
+        if not os.path.exists(directory):
+            os.mkdir(directory)
+        return directory
+
+    def close(self):
+        # Drops queued jobs, kills running simulators and removes the scratch directories. Output files still in a
+        # scratch directory are lost, so only close once finished jobs have been processed.
+        with self._lock:
+            self._pending.clear()
+            running = list(self._running)
+
+        for job in running:
+            try:
+                job.process.kill()
+            except OSError:
+                pass
+            job.process.wait()
+
+        if self.scratch_root is not None:
+            shutil.rmtree(self.scratch_root, ignore_errors=True)
+            self.scratch_root = None
+
+    def _launch_pending(self):
+        # Must be called while holding self._lock
+        while self._pending and len(self._running) < self.max_workers:
+            self._launch(self._pending.popleft())
+
+    def _launch(self, job):
+        # Must be called while holding self._lock
+        job.start_time = time.time()
+        job.slot = self._free_slots.pop(0)
+        try:
+            if job.working_directory is None:
+                job.working_directory = os.path.join(self.slot_directory(job.slot), "job_" + str(self._launched))
+                os.mkdir(job.working_directory)
+                job.in_scratch = True
+            self._launched += 1
+
+            vxa_text = job.vxa_text
+            if vxa_text is not None:
+                write_tic = time.time()
+                job.vxa_file_path = os.path.join(job.working_directory, job.name + ".vxa")
+                with open(job.vxa_file_path, "w") as vxa_file:
+                    vxa_file.write(job.vxa_text)
+                job.vxa_text = None
+                job.timings["vxa_write"] = time.time() - write_tic
+
+            job.expected_files = [os.path.join(job.working_directory, path) for path in job.expected_files]
+            job.process = sub.Popen([self.simulator_path, "-f", job.vxa_file_path], cwd=job.working_directory)
+        except (IOError, OSError) as error:
+            job.error = "Could not start simulator " + self.simulator_path + ": " + str(error)
+            job.end_time = time.time()
+            self._free_slots.append(job.slot)
+            job.completed_queue.put(job)
+            return
+
+        self._running.add(job)
+        if self.supervisor is not None and vxa_text is not None:
+            _, ke_file_name, num_voxels = simulation_output_names(vxa_text)
+            self.supervisor.watch(job, os.path.join(job.working_directory, ke_file_name), num_voxels)
+        if self.timeout is not None:
+            job.timer = threading.Timer(self.timeout, self._kill_timed_out, args=(job,))
+            job.timer.daemon = True
+            job.timer.start()
+
+        waiter = threading.Thread(target=self._wait_for_exit, args=(job,))
+        waiter.daemon = True
+        waiter.start()
+
+    def _kill_timed_out(self, job):
+        job.timed_out = True
+        try:
+            job.process.kill()
+        except OSError:
+            pass
+
+    def _wait_for_exit(self, job):
+        job.returncode = job.process.wait()
+        job.end_time = time.time()
+        if job.timer is not None:
+            job.timer.cancel()
+        if self.supervisor is not None:
+            self.supervisor.unwatch(job)
+
+        # The simulator has exited, free the worker and start the next queued simulation
+        with self._lock:
+            self._running.discard(job)
+            self._free_slots.append(job.slot)
+            self._free_slots.sort()
+            self._launch_pending()
+
+        if job.timed_out:
+            job.error = "Simulator killed after running for more than " + str(self.timeout) + " seconds"
+        elif job.stop_reason is not None:
+            job.error = "Simulator stopped early, " + job.stop_reason
+        elif job.returncode != 0:
+            job.error = "Simulator exited with code " + str(job.returncode)
+        else:
+            missing = wait_for_files(job.expected_files, self.output_timeout)
+            if missing:
+                job.error = "Simulator exited without writing " + ", ".join(os.path.basename(f) for f in missing)
+
+        job.completed_queue.put(job)
@@ -0,0 +1,170 @@
+import math
+
+import numpy as np
+
+
+# SCREENING
+# Predicts the fitness a creature will reach in a generation before it is simulated, so new_population can create more
+# candidates than it needs and only simulate those predicted to do best. The model is a ridge regression on random tanh
+# features of the creatures neural network parameters and starting morphology, trained online on the evolutionary
+# history every evaluated creature records (Creature.update_evolution). The target is the fitness of the last episode
+# of the generation, which is what the population is sorted by.
+#
+# Only the sums needed to solve the ridge regression are kept (counts, sums and the gram matrix of the features), so
+# training on another generation costs the same however long the run is and every creature ever evaluated is used.
+
+
+def creature_features(nn_parameters, stiffness, morphology, max_stiffness):
+    # ARGUMENTS
+    # - nn_parameters           dict, neural network weights and biases
+    # - stiffness               np.array, stiffness of every voxel at the start of the generation
+    # - morphology              np.array, material number of every voxel at the start of the generation
+    # - max_stiffness           float, stiffness values are divided by this
+    #
+    # RETURNS
+    # - features                np.array, neural network parameters followed by the fraction of voxels of every
+    #                           material and the stiffness mean and standard deviation
+    morphology = np.asarray(morphology).ravel()
+    stiffness = np.asarray(stiffness, dtype=float).ravel() / max_stiffness
+    materials = np.bincount(np.clip(morphology.astype(int), 0, 9), minlength=10) / float(morphology.size)
+
+    return np.concatenate([np.ravel(nn_parameters[key]) for key in sorted(nn_parameters)] +
+                          [materials, [np.mean(stiffness), np.std(stiffness)]])
+
+
+def history_sample(history, generation, max_stiffness):
+    # Training sample of a creature from its evolutionary history.
+    # ARGUMENTS
+    # - history                 EvolutionHistory, history of the creature
+    # - generation              int, generation the creature was evaluated in
+    # - max_stiffness           float, see creature_features
+    #
+    # RETURNS
+    # - sample                  tuple, (features, fitness of the last episode), None if the creature did not finish the
+    #                           generation (E.g. a simulation failed)
+    if generation not in history:
+        return None
+    row = int(np.flatnonzero(history.generations[:len(history)] == generation)[-1])
+    if not history.recorded[row, 0] or not history.recorded[row, -1]:
+        return None
+
+    nn_parameters = {key: value[row] for key, value in history.nn_parameters.items()}
+    features = creature_features(nn_parameters, history.stiffness[row, 0], history.morphology[row, 0], max_stiffness)
+    return features, float(history.fitness_eval[row, -1])
+
+
+class FitnessScreen:
+    def __init__(self, max_stiffness, regularization=1.0, num_random_features=100, min_samples=20, seed=0):
+        # ARGUMENTS
+        # - max_stiffness           float, largest stiffness of a voxel, scales the stiffness features
+        # - regularization          float, ridge penalty relative to the average variance of the features
+        # - num_random_features     int, random tanh features added to the raw features, 0 for a linear model
+        # - min_samples             int, creatures the model must be trained on before it makes predictions
+        # - seed                    int, seed of the random features, the genetic algorithms random state is not used
+
+        self.max_stiffness = max_stiffness                          # float, stiffness feature scale
+        self.regularization = regularization                        # float, ridge penalty
+        self.num_random_features = num_random_features              # int, number of random features
+        self.min_samples = min_samples                              # int, samples needed before predicting
+        self.seed = seed                                            # int, seed of the random features
+
+        # Allocated with the first sample, once the number of features is known
+        self.projection = None                                      # np.array (random features, features), weights
+        self.offset = None                                          # np.array (random features,), biases
+        self.count = 0                                              # int, number of samples trained on
+        self.basis_sum = None                                       # np.array, sum of the basis vectors
+        self.gram = None                                            # np.array, sum of the basis outer products
+        self.target_sum = 0.0                                       # float, sum of the targets
+        self.cross = None                                           # np.array, sum of the basis times the target
+        self.weights = None                                         # np.array, fitted ridge weights
+        self.intercept = 0.0                                        # float, fitted intercept
+
+        self.rejected = 0                                           # int, candidates rejected since the last report
+        self.candidates = 0                                         # int, candidates screened since the last report
+
+    def is_trained(self):
+        return self.weights is not None and self.count >= self.min_samples
+
+    def _basis(self, features):
+        # RETURNS
+        # - basis                   (samples, basis size) np.array, raw and random features of every sample
+        features = np.atleast_2d(features)
+        if self.projection is None:
+            random_state = np.random.RandomState(self.seed)
+            self.projection = random_state.normal(0, 1 / math.sqrt(features.shape[1]),
+                                                  (self.num_random_features, features.shape[1]))
+            self.offset = random_state.uniform(-1, 1, self.num_random_features)
+        return np.hstack((features, np.tanh(np.dot(features, self.projection.T) + self.offset)))
+
+    def train(self, features, targets):
+        # Adds samples to the model and solves the ridge regression again.
+        # ARGUMENTS
+        # - features                (samples, features) np.array, see creature_features
+        # - targets                 (samples,) np.array, fitness reached
+        if len(targets) == 0:
+            return
+
+        basis = self._basis(features)
+        targets = np.asarray(targets, dtype=float)
+        if self.gram is None:
+            self.basis_sum = np.zeros(basis.shape[1])
+            self.gram = np.zeros((basis.shape[1], basis.shape[1]))
+            self.cross = np.zeros(basis.shape[1])
+
+        self.count += len(targets)
+        self.basis_sum += np.sum(basis, axis=0)
+        self.gram += np.dot(basis.T, basis)
+        self.target_sum += np.sum(targets)
+        self.cross += np.dot(basis.T, targets)
+
+        # Centred ridge regression, the intercept is not penalised
+        basis_mean = self.basis_sum / self.count
+        target_mean = self.target_sum / self.count
+        covariance = self.gram / self.count - np.outer(basis_mean, basis_mean)
+        cross_covariance = self.cross / self.count - basis_mean * target_mean
+        penalty = self.regularization * max(np.trace(covariance) / len(covariance), 1e-12)
+        self.weights = np.linalg.solve(covariance + penalty * np.eye(len(covariance)), cross_covariance)
+        self.intercept = target_mean - np.dot(basis_mean, self.weights)
+
+    def predict(self, features):
+        # RETURNS
+        # - predictions             (samples,) np.array, predicted fitness of every sample
+        return np.dot(self._basis(features), self.weights) + self.intercept
+
+    def select(self, features, keep):
+        # Picks the candidates predicted to reach the highest fitness.
+        # ARGUMENTS
+        # - features                (candidates, features) np.array, one row per candidate
+        # - keep                    int, number of candidates to keep
+        #
+        # RETURNS
+        # - selected                list, indexes of the kept candidates, best predicted first
+        self.candidates += len(features)
+        self.rejected += max(len(features) - keep, 0)
+        return np.argsort(-self.predict(features), kind="mergesort")[:keep].tolist()
+
+    def reset_counts(self):
+        # RETURNS
+        # - candidates              int, candidates screened since the last reset
+        # - rejected                int, candidates rejected since the last reset
+        candidates, rejected = self.candidates, self.rejected
+        self.candidates = 0
+        self.rejected = 0
+        return candidates, rejected
+
+
+def prediction_error(predictions, targets):
+    # RETURNS
+    # - rmse                    float, root mean squared error of the predictions
+    # - rank_correlation        float, spearman correlation of predictions and targets, nan for fewer than two samples
+    predictions = np.asarray(predictions, dtype=float)
+    targets = np.asarray(targets, dtype=float)
+    rmse = float(np.sqrt(np.mean((predictions - targets)**2)))
+
+    if len(targets) < 2:
+        return rmse, float("nan")
+    prediction_ranks = np.argsort(np.argsort(predictions)).astype(float)
+    target_ranks = np.argsort(np.argsort(targets)).astype(float)
+    if np.std(prediction_ranks) == 0 or np.std(target_ranks) == 0:
+        return rmse, float("nan")
+    return rmse, float(np.corrcoef(prediction_ranks, target_ranks)[0, 1])
@@ -0,0 +1,191 @@
+import json
+
+SETTINGS_FILE = "settings.json"
+
+# Expected type of every value in settings.json, nested dictionaries are sections. Settings that may be null list
+# type(None) as an allowed type.
+NUMBER = (int, float)
+STRING = (str, type(u""))           # json.load returns unicode strings under python 2
+SETTINGS_TYPES = {
+    "evosoro_path": STRING,
+    "parameters": {
+        "pop_size": int, "ep_size": int, "gen_size": int, "top": int, "evolve": int, "stiff_delta_mult": NUMBER
+    },
+    "evaluation": {
+        "max_workers": (int, type(None)), "pipelined": int, "simulation_timeout": (NUMBER, type(None)),
+        "output_timeout": NUMBER, "scratch_directory": (STRING, type(None)), "result_cache": int,
+        "result_cache_directory": STRING, "result_cache_size": NUMBER, "backend": STRING, "broker_address": STRING,
+        "broker_token": (STRING, type(None)), "heartbeat_timeout": NUMBER, "surrogate_steps_per_period": int,
+        "penalty_fitness": NUMBER
+    },
+    "supervision": {
+        "enabled": int, "interval": NUMBER, "stall_window": int, "stall_ke": (NUMBER, type(None)),
+        "max_ke": (NUMBER, type(None))
+    },
+    "islands": {
+        "num_islands": int, "migration_interval": int, "migrants": int, "topology": STRING
+    },
+    "screening": {
+        "enabled": int, "oversample": NUMBER, "min_samples": int, "regularization": NUMBER, "random_features": int
+    },
+    "fitness_evaluation": {
+        "M": NUMBER, "N": NUMBER, "Nx": NUMBER, "Mx": NUMBER, "Ny": NUMBER, "My": NUMBER, "Nz": NUMBER, "Mz": NUMBER,
+        "take_absolutes": list
+    },
+    "files": {
+        "keep_csv_files": int, "keep_fitness_files": int, "keep_vxa_files": int, "folders_per_generation": int,
+        "folders_per_episode": int, "journal": int, "journal_batch_size": int, "evolution_json": int,
+        "telemetry": int, "archive": int, "reduce_csv_files": int, "csv_series_stride": int, "csv_compression": STRING
+    },
+    "nn_parameters": {
+        "activation_function": STRING, "num_inputs": int, "num_outputs": int, "num_hidden_layers": int, "bounds": list,
+        "parameter_change": NUMBER, "noise": float
+    },
+    "structure": {
+        "creature_structure": list, "sections": list, "base_stiffness": NUMBER, "max_stiffness": NUMBER,
+        "morph_max": int, "min_stiffness": NUMBER, "morph_min": int, "morph_between": int,
+        "actuator_stiffness": NUMBER, "actuator_morph": int, "unchangeable_morphs": list
+    },
+    "mat_defaults": {
+        "number_of_materials": int, "integration": list, "damping": list, "collision": list, "features": list,
+        "stopConditions": list, "drawSmooth": int, "write_fitness": int, "QhullTmpFile": STRING,
+        "CurvaturesTmpFile": STRING, "numFixed": int, "numForced": int, "gravity": list, "thermal": list,
+        "version": NUMBER, "lattice": list, "voxel": list, "mat_type": int, "mat_colour": list,
+        "mechanical_properties": list, "compression_type": STRING, "phase_offset": NUMBER
+    }
+}
+
+_SETTINGS = None                    # Settings, process wide settings returned by get_settings
+
+
+class Settings(dict):
+    # Read-only settings. Sections are Settings as well and lists are stored as tuples, so nothing can be changed once
+    # loaded. Values are read like a dictionary (settings["structure"]["base_stiffness"]) or as attributes
+    # (settings.structure.base_stiffness). Copies (copy and deepcopy) return the same object.
+    def __init__(self, values):
+        dict.__init__(self, ((key, _freeze(value)) for key, value in values.items()))
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError("Unknown setting: " + name)
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("ERROR: Settings are read-only. Use settings.override_settings to change them for an "
+                        "experiment.")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _read_only
+    __setattr__ = __delattr__ = _read_only
+
+    def __reduce__(self):
+        return Settings, (dict(self),)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def to_dict(self):
+        # RETURNS
+        # - settings                dict, mutable copy with lists instead of tuples
+        return _thaw(self)
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return Settings(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, dict):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
+
+
+def _merge(values, overrides):
+    # Recursively replaces the entries of values with those given in overrides
+    merged = dict(values)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def validate_settings(values, types=None, section="settings.json"):
+    # Checks that every expected setting is present and has the right type, raises an exception otherwise.
+    if types is None:
+        types = SETTINGS_TYPES
+
+    for key, expected_type in types.items():
+        if key not in values:
+            raise Exception("ERROR in settings.json: '" + key + "' is missing from " + section + ".")
+
+        value = values[key]
+        if isinstance(expected_type, dict):
+            if not isinstance(value, dict):
+                raise Exception("ERROR in settings.json: '" + key + "' must be a section.")
+            validate_settings(value, expected_type, key)
+        elif isinstance(value, bool) or not isinstance(value, expected_type):
+            raise Exception("ERROR in settings.json: '" + key + "' in " + section + " has the wrong type (" +
+                            type(value).__name__ + ").")
+
+
+def load_settings(file_name=SETTINGS_FILE, overrides=None):
+    # Loads and validates a settings file.
+    # ARGUMENTS
+    # - file_name               string, path to the settings file
+    # - overrides               dict, nested dictionary of settings replacing those in the file,
+    #                           E.g. {"parameters": {"pop_size": 10}}
+    #
+    # RETURNS
+    # - settings                Settings, read-only settings
+
+    with open(file_name) as settings_file:
+        values = json.load(settings_file)
+
+    if overrides:
+        values = _merge(values, overrides)
+
+    validate_settings(values)
+
+    return Settings(values)
+
+
+def get_settings():
+    # RETURNS
+    # - settings                Settings, the process wide settings. settings.json is loaded on the first call only.
+    global _SETTINGS
+    if _SETTINGS is None:
+        _SETTINGS = load_settings()
+    return _SETTINGS
+
+
+def set_settings(settings):
+    # Replaces the process wide settings. Objects created before this call keep the settings they were created with.
+    global _SETTINGS
+    if not isinstance(settings, Settings):
+        validate_settings(settings)
+        settings = Settings(settings)
+    _SETTINGS = settings
+
+
+def override_settings(overrides):
+    # Replaces the process wide settings with a copy where the given settings are changed, for experiments.
+    # ARGUMENTS
+    # - overrides               dict, nested dictionary of settings to change, E.g. {"parameters": {"pop_size": 10}}
+    #
+    # RETURNS
+    # - settings                Settings, the new process wide settings
+    set_settings(_merge(get_settings().to_dict(), overrides))
+    return get_settings()
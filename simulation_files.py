@@ -0,0 +1,408 @@
+import gzip
+import os
+import re
+import shutil
+
+import numpy as np
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+
+# SIMULATION FILES
+# Readers for the files written by voxelyze after a simulation. The fitness file is a small XML file with one value per
+# element. The kinetic energy, pressures and strain files are CSV files with one row per recorded time step and one value
+# per voxel, every row ends with a trailing comma.
+
+BLOCK_SIZE = 1 << 20                # int, number of characters read from a CSV file at a time
+KE_SCALE = 10                       # float, kinetic energy values are multiplied by this when summed
+
+# File extension of every way a CSV file can be compressed, gzip is quicker and lzma compresses better
+CSV_COMPRESSIONS = {"gzip": ".gz", "lzma": ".xz"}
+
+# Fitness file values needed to evaluate a creature
+FITNESS_VALUES = ("normDistX", "normDistY", "normDistZ")
+
+# Matches the root element name and every <tag>value</tag> element of a fitness file
+_ROOT_ELEMENT = re.compile(r"<([A-Za-z_][\w.-]*)[\s>]")
+_VALUE_ELEMENT = re.compile(r"<([A-Za-z_][\w.-]*)>([^<]*)</\1>")
+
+# Matches the vxa file elements naming the fitness file and giving the number of voxels along each axis
+_FITNESS_FILE_NAME = re.compile(r"<FitnessFileName>([^<]*)</FitnessFileName>")
+_VOXELS = re.compile(r"<([XYZ])_Voxels>\s*(\d+)\s*</[XYZ]_Voxels>")
+
+
+class FitnessFileError(Exception):
+    # Raised when a fitness file cannot be used, E.g. because the simulation crashed before finishing it.
+    # ARGUMENTS
+    # - message                 string, error message
+    # - file_name               string, path to the fitness file
+    # - incomplete              bool, the file was truncated or still being written
+    def __init__(self, message, file_name=None, incomplete=False):
+        Exception.__init__(self, message)
+        self.file_name = file_name                                  # string, path to the fitness file
+        self.incomplete = incomplete                                # bool, was the file truncated or in progress
+
+
+class FitnessResult:
+    def __init__(self, file_name, values):
+        # Values read from a voxelyze fitness file.
+        # ARGUMENTS
+        # - file_name               string, path to the fitness file
+        # - values                  dict, value of every element of the file, floats where they can be converted
+
+        self.file_name = file_name                                  # string, path to the fitness file
+        self.values = values                                        # dict, {tag: value}
+
+    @property
+    def norm_dist(self):
+        # RETURNS
+        # - norm_dist               (1, 3) list, distance travelled along x, y and z
+        return [self.values["normDistX"], self.values["normDistY"], self.values["normDistZ"]]
+
+    def fitness(self, fitness_settings):
+        # Evaluates fitness from the travelled distance, punishing locomotion that is not in a straight line.
+        # ARGUMENTS
+        # - fitness_settings        dict, "fitness_evaluation" settings (M, N, Mx, Nx, ..., take_absolutes)
+        #
+        # RETURNS
+        # - fitness                 float, fitness evaluation
+        result_x, result_y, result_z = self.norm_dist
+
+        if fitness_settings["take_absolutes"][0]:
+            result_x = abs(result_x)
+        if fitness_settings["take_absolutes"][1]:
+            result_y = abs(result_y)
+        if fitness_settings["take_absolutes"][2]:
+            result_z = abs(result_z)
+
+        m = fitness_settings["M"]
+        m_x = fitness_settings["Mx"]
+        m_y = fitness_settings["My"]
+        m_z = fitness_settings["Mz"]
+        n = fitness_settings["N"]
+        n_x = fitness_settings["Nx"]
+        n_y = fitness_settings["Ny"]
+        n_z = fitness_settings["Nz"]
+
+        return m * ((m_x * (result_x**n_x) +
+                     m_y * (result_y**n_y) +
+                     m_z * (result_z**n_z))**n)
+
+
+class SimulationResult:
+    def __init__(self, fitness_values, ke_sum):
+        # Reduced result of a simulation, used where the simulation files are not available (E.g. a result cache entry,
+        # a simulation run by a remote worker).
+        # ARGUMENTS
+        # - fitness_values          dict, values of the fitness file (see FitnessResult)
+        # - ke_sum                  np.array, summed kinetic energy of every voxel, scaled by KE_SCALE
+
+        self.fitness_values = fitness_values                        # dict, {tag: value} of the fitness file
+        self.ke_sum = ke_sum                                        # np.array, summed kinetic energy per voxel
+
+
+def parse_fitness(text, file_name=None):
+    # Parses the contents of a fitness file in one pass.
+    # ARGUMENTS
+    # - text                    string, contents of the fitness file
+    # - file_name               string, path to the fitness file, used in error messages
+    #
+    # RETURNS
+    # - result                  FitnessResult, values of the file
+
+    # The file is complete once its root element is closed, anything else is a truncated or in progress file
+    body = text[text.find("?>") + 2:] if text.startswith("<?xml") else text
+    root = _ROOT_ELEMENT.search(body)
+    if root is None or not text.rstrip().endswith("</" + root.group(1) + ">"):
+        raise FitnessFileError("ERROR: Fitness file is incomplete. Fitness file name: " + str(file_name),
+                               file_name, incomplete=True)
+
+    values = {}
+    for tag, value in _VALUE_ELEMENT.findall(body):
+        try:
+            values[tag] = float(value)
+        except ValueError:
+            values[tag] = value.strip()
+
+    missing = [tag for tag in FITNESS_VALUES if not isinstance(values.get(tag), float)]
+    if missing:
+        raise FitnessFileError("ERROR: Fitness file is missing " + ", ".join(missing) + " values. Fitness file name: "
+                               + str(file_name), file_name)
+
+    return FitnessResult(file_name, values)
+
+
+def read_fitness_file(file_name):
+    # RETURNS
+    # - result                  FitnessResult, values of the fitness file, raises FitnessFileError if it is unusable
+    try:
+        with open(file_name) as fitness_file:
+            text = fitness_file.read()
+    except (IOError, OSError):
+        raise FitnessFileError("ERROR: Fitness file could not be read. Fitness file name: " + str(file_name),
+                               file_name)
+
+    return parse_fitness(text, file_name)
+
+
+def read_fitness_files(file_names):
+    # Reads the fitness files of every creature of an episode. One unusable file does not stop the others being read.
+    # ARGUMENTS
+    # - file_names              list, paths to the fitness files
+    #
+    # RETURNS
+    # - results                 list, a FitnessResult or, for unusable files, the FitnessFileError for each file
+    results = []
+    for file_name in file_names:
+        try:
+            results.append(read_fitness_file(file_name))
+        except FitnessFileError as error:
+            results.append(error)
+
+    return results
+
+
+def simulation_output_names(vxa_text):
+    # The files voxelyze writes are named after the fitness file given in the vxa file.
+    # RETURNS
+    # - fitness_file_name       string, name of the fitness file
+    # - ke_file_name            string, name of the kinetic energy file
+    # - num_voxels              int, number of voxels of the simulated structure (values per CSV row)
+    fitness_file_name = _FITNESS_FILE_NAME.search(vxa_text)
+    voxels = dict(_VOXELS.findall(vxa_text))
+    if fitness_file_name is None or len(voxels) != 3:
+        raise Exception("ERROR: The vxa file does not give a fitness file name and the number of X, Y and Z voxels.")
+
+    fitness_file_name = fitness_file_name.group(1).strip()
+    return fitness_file_name, "ke" + fitness_file_name + ".csv", int(voxels["X"]) * int(voxels["Y"]) * int(voxels["Z"])
+
+
+def read_simulation_result(directory, vxa_text):
+    # Reduces the files of a finished simulation to its fitness values and summed kinetic energy.
+    # ARGUMENTS
+    # - directory               string, directory the simulation ran in
+    # - vxa_text                string, simulated vxa file
+    #
+    # RETURNS
+    # - result                  SimulationResult, raises FitnessFileError if the fitness file is unusable
+    fitness_file_name, ke_file_name, num_voxels = simulation_output_names(vxa_text)
+    fitness_result = read_fitness_file(os.path.join(directory, fitness_file_name))
+    ke_sum, _ = sum_csv_rows(os.path.join(directory, ke_file_name), num_voxels, scale=KE_SCALE)
+
+    return SimulationResult(fitness_result.values, ke_sum)
+
+
+def read_csv_blocks(file_name, num_values, block_size=BLOCK_SIZE, copy=None):
+    # Reads a voxelyze CSV file in blocks of whole rows, so files of any length are read in bounded memory.
+    # ARGUMENTS
+    # - file_name               string, path to the CSV file
+    # - num_values              int, number of values per row (number of voxels)
+    # - block_size              int, approximate number of characters parsed at a time
+    # - copy                    file, binary file the text of the CSV file is written to as it is read, E.g. to
+    #                           compress it without reading it again
+    #
+    # YIELDS
+    # - block                   (rows, num_values) np.array, parsed rows of the block
+
+    remainder = ""
+    with open(file_name) as csv_file:
+        while True:
+            text = csv_file.read(block_size)
+            if not text:
+                break
+            if copy is not None:
+                copy.write(text.encode("utf-8"))
+
+            # Only parse up to the end of the last complete row, the rest is parsed with the next block
+            text = remainder + text
+            last_row_end = text.rfind("\n") + 1
+            remainder = text[last_row_end:]
+            block = _parse_rows(text[:last_row_end], num_values, file_name)
+            if block is not None:
+                yield block
+
+    # Last row may not end with a new line
+    block = _parse_rows(remainder, num_values, file_name)
+    if block is not None:
+        yield block
+
+
+class CsvFollower:
+    def __init__(self, file_name, num_values):
+        # Reads the rows of a voxelyze CSV file while the simulator is still writing it, each read returns the rows
+        # completed since the previous one.
+        # ARGUMENTS
+        # - file_name               string, path to the CSV file, it may not exist yet
+        # - num_values              int, number of values per row (number of voxels)
+
+        self.file_name = file_name                                  # string, path to the CSV file
+        self.num_values = num_values                                # int, values per row
+        self.offset = 0                                             # int, bytes of the file read so far
+        self.remainder = ""                                         # string, start of a row not completed yet
+        self.num_rows = 0                                           # int, rows read so far
+
+    def read(self, max_characters=BLOCK_SIZE):
+        # RETURNS
+        # - rows                    (rows, num_values) np.array, rows completed since the last read, None if there are
+        #                           none (E.g. the file does not exist yet)
+        try:
+            with open(self.file_name) as csv_file:
+                csv_file.seek(self.offset)
+                text = csv_file.read(max_characters)
+        except (IOError, OSError):
+            return None
+        self.offset += len(text)
+
+        text = self.remainder + text
+        last_row_end = text.rfind("\n") + 1
+        self.remainder = text[last_row_end:]
+        rows = _parse_rows(text[:last_row_end], self.num_values, self.file_name)
+        if rows is not None:
+            self.num_rows += len(rows)
+        return rows
+
+
+def _parse_rows(text, num_values, file_name):
+    # Parses comma separated rows, the new line after each rows trailing comma is treated as white space
+    text = text.rstrip().rstrip(",")
+    if not text:
+        return None
+
+    values = np.fromstring(text, dtype=float, sep=",")
+    if values.size % num_values:
+        raise Exception("ERROR: " + file_name + " does not have " + str(num_values) + " values on every row.")
+
+    return values.reshape((-1, num_values))
+
+
+def open_compressed(file_name, compression):
+    # RETURNS
+    # - file                    file, binary file opened for writing that compresses what is written to it
+    if compression == "gzip":
+        return gzip.open(file_name, "wb")
+    if compression == "lzma":
+        if lzma is None:
+            raise Exception("ERROR: lzma compression needs the lzma module (python 3), use gzip instead.")
+        return lzma.open(file_name, "wb")
+    raise Exception("ERROR in settings.json: Unknown CSV compression '" + str(compression) + "', use 'none', 'gzip' or "
+                    "'lzma'.")
+
+
+def compress_file(file_name, compression):
+    # Writes a compressed copy of a file next to it, the file itself is left in place.
+    # RETURNS
+    # - compressed_file_name    string, path to the compressed copy (file_name and the extension of the compression)
+    compressed_file_name = file_name + CSV_COMPRESSIONS.get(compression, "")
+    with open(file_name, "rb") as source_file:
+        with open_compressed(compressed_file_name, compression) as compressed_file:
+            shutil.copyfileobj(source_file, compressed_file, BLOCK_SIZE)
+    return compressed_file_name
+
+
+class CsvReduction:
+    def __init__(self, num_values, stride=0, scale=1.0):
+        # Per voxel summary of the rows of a voxelyze CSV file, updated a block of rows at a time so the file does not
+        # have to be held in memory.
+        # ARGUMENTS
+        # - num_values              int, number of values per row (number of voxels)
+        # - stride                  int, every stride-th row (the first, the stride-th, ...) is kept as a time series, 0
+        #                           to keep no time series
+        # - scale                   float, scale of total, see sum_csv_rows
+
+        self.num_values = num_values                                # int, values per row
+        self.stride = stride                                        # int, rows between two rows of the time series
+        self.scale = scale                                          # float, scale of total
+        self.num_rows = 0                                           # int, rows added so far
+        self.mean = np.zeros(num_values)                            # np.array, mean of every voxel
+        self.sum_squares = np.zeros(num_values)                     # np.array, summed squared deviation from the mean
+        self.max = np.full(num_values, -np.inf)                     # np.array, largest value of every voxel
+        self.total = np.zeros(num_values)                           # np.array, sum of the scaled rows
+        self.series = []                                            # list, rows kept as the time series
+
+    def add(self, block):
+        # ARGUMENTS
+        # - block                   (rows, num_values) np.array, the next rows of the file
+        num_rows = self.num_rows + len(block)
+
+        # Merges the mean and squared deviations of the block with those of the rows before (Chan et al.), which does
+        # not lose precision like summing the squares does
+        block_mean = np.mean(block, axis=0)
+        delta = block_mean - self.mean
+        self.sum_squares += np.sum((block - block_mean)**2, axis=0) + delta**2 * self.num_rows * len(block) / num_rows
+        self.mean += delta * len(block) / num_rows
+        self.max = np.maximum(self.max, np.max(block, axis=0))
+
+        # Same as sum_csv_rows, so the total can be used instead of reading the file again
+        self.total = np.sum(np.vstack((self.total, np.multiply(block, self.scale))), axis=0)
+
+        if self.stride:
+            self.series.append(block[(-self.num_rows) % self.stride::self.stride])
+        self.num_rows = num_rows
+
+    def arrays(self, prefix):
+        # RETURNS
+        # - arrays                  dict, {prefix_mean, prefix_variance, prefix_max: (num_values,) np.array,
+        #                           prefix_series: (rows, num_values) np.array, prefix_rows: number of rows}. The values
+        #                           are stored as float32, voxelyze writes six significant digits. The statistics of a
+        #                           file without rows are nan
+        empty = self.num_rows == 0
+        arrays = {prefix + "_mean": np.full(self.num_values, np.nan) if empty else self.mean,
+                  prefix + "_variance": np.full(self.num_values, np.nan) if empty else self.sum_squares / self.num_rows,
+                  prefix + "_max": np.full(self.num_values, np.nan) if empty else self.max,
+                  prefix + "_series": np.vstack(self.series) if self.series else np.zeros((0, self.num_values))}
+        arrays = {key: value.astype(np.float32) for key, value in arrays.items()}
+        arrays[prefix + "_rows"] = np.array(self.num_rows)
+        return arrays
+
+
+def reduce_csv_file(file_name, num_values, stride=0, scale=1.0, compression=None, block_size=BLOCK_SIZE):
+    # Reads a voxelyze CSV file once, summarizing every voxel and, if a compression is given, writing a compressed copy
+    # of the file next to it. The file itself is left in place.
+    # ARGUMENTS
+    # - file_name               string, path to the CSV file
+    # - num_values              int, number of values per row (number of voxels)
+    # - stride                  int, rows between two rows of the time series, see CsvReduction
+    # - scale                   float, scale of the total, see sum_csv_rows
+    # - compression             string, "gzip" or "lzma", None to not write a compressed copy
+    # - block_size              int, approximate number of characters parsed at a time
+    #
+    # RETURNS
+    # - reduction               CsvReduction, summary of the file
+    # - compressed_file_name    string, path to the compressed copy, None if none was written
+    reduction = CsvReduction(num_values, stride, scale)
+    if compression is None:
+        for block in read_csv_blocks(file_name, num_values, block_size):
+            reduction.add(block)
+        return reduction, None
+
+    compressed_file_name = file_name + CSV_COMPRESSIONS.get(compression, "")
+    with open_compressed(compressed_file_name, compression) as compressed_file:
+        for block in read_csv_blocks(file_name, num_values, block_size, copy=compressed_file):
+            reduction.add(block)
+    return reduction, compressed_file_name
+
+
+def sum_csv_rows(file_name, num_values, scale=1.0, block_size=BLOCK_SIZE):
+    # Sums the rows of a voxelyze CSV file, each multiplied by scale. Rows are added one after another in file order, so
+    # the result is the same, to the last bit, as adding the rows in a python loop.
+    # ARGUMENTS
+    # - file_name               string, path to the CSV file
+    # - num_values              int, number of values per row (number of voxels)
+    # - scale                   float, each value is multiplied by scale before being added
+    # - block_size              int, approximate number of characters parsed at a time
+    #
+    # RETURNS
+    # - total                   (num_values,) np.array, sum of the scaled rows
+    # - num_rows                int, number of rows in the file
+
+    total = np.zeros(num_values)
+    num_rows = 0
+    for block in read_csv_blocks(file_name, num_values, block_size):
+        # A reduction along the first axis adds the rows in order, the running total is the first row
+        total = np.sum(np.vstack((total, np.multiply(block, scale))), axis=0)
+        num_rows += block.shape[0]
+
+    return total, num_rows
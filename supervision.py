@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from simulation_files import CsvFollower
+
+
+# SUPERVISION
+# Watches running voxelyze simulations and stops those that are not worth finishing, so their worker slot is free for
+# the next creature and a single runaway does not stretch the generations wall time. Voxelyze only writes the fitness
+# file when the simulation ends, what it writes while running is the kinetic energy file, one row per recorded step.
+# A simulation is stopped when
+# - the kinetic energy is not finite or grows beyond max_ke, the simulation has gone numerically unstable
+# - the total kinetic energy stayed below stall_ke for the last stall_window rows, the creature has stopped moving and
+#   cannot travel any further
+# The wall-clock limit of a simulation is the schedulers timeout (simulation_timeout). A stopped simulation fails like a
+# crashed one and the creature is given the penalty fitness (Creature.mark_failed).
+
+
+class SimulationSupervisor:
+    def __init__(self, interval=1.0, stall_window=100, stall_ke=None, max_ke=None):
+        # ARGUMENTS
+        # - interval                float, seconds between two checks of the running simulations
+        # - stall_window            int, number of kinetic energy rows the creature must be still for to be stopped
+        # - stall_ke                float, total kinetic energy of a row below which the creature is still, None to
+        #                           never stop still creatures
+        # - max_ke                  float, kinetic energy of a voxel above which the simulation is unstable, None to
+        #                           only stop simulations with values that are not finite
+
+        if interval <= 0:
+            raise Exception("ERROR: The supervision interval must be positive. interval was set to " + str(interval))
+        if stall_window < 1:
+            raise Exception("ERROR: The supervision stall window must be at least one row. stall_window was set to "
+                            + str(stall_window))
+
+        self.interval = interval                                    # float, seconds between checks
+        self.stall_window = stall_window                            # int, rows a creature must be still for
+        self.stall_ke = stall_ke                                    # float, still creature kinetic energy
+        self.max_ke = max_ke                                        # float, unstable simulation kinetic energy
+        self.stopped = 0                                            # int, simulations stopped since the last reset
+
+        self._watched = {}                                          # dict, {job: (CsvFollower, deque of row totals)}
+        self._lock = threading.Lock()
+        self._thread = None                                         # threading.Thread, checks the simulations
+
+    def watch(self, job, ke_file_path, num_voxels):
+        # Starts supervising a launched simulation, until unwatch is called.
+        # ARGUMENTS
+        # - job                     SimulationJob, running job
+        # - ke_file_path            string, kinetic energy file the simulator writes
+        # - num_voxels              int, values per kinetic energy row
+        with self._lock:
+            self._watched[job] = (CsvFollower(ke_file_path, num_voxels), deque(maxlen=self.stall_window))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+
+    def unwatch(self, job):
+        with self._lock:
+            self._watched.pop(job, None)
+
+    def reset_counts(self):
+        # RETURNS
+        # - stopped                 int, simulations stopped since the last reset
+        with self._lock:
+            stopped = self.stopped
+            self.stopped = 0
+        return stopped
+
+    def check(self, rows, totals):
+        # ARGUMENTS
+        # - rows                    (rows, voxels) np.array, kinetic energy rows written since the last check
+        # - totals                  deque, total kinetic energy of the latest rows, rows are added to it
+        #
+        # RETURNS
+        # - reason                  string, why the simulation should be stopped, None to let it run
+        if not np.all(np.isfinite(rows)):
+            return "kinetic energy is not finite"
+        if self.max_ke is not None and np.max(rows) > self.max_ke:
+            return "kinetic energy exceeded " + str(self.max_ke)
+
+        totals.extend(np.sum(rows, axis=1))
+        if self.stall_ke is not None and len(totals) == self.stall_window and max(totals) < self.stall_ke:
+            return "kinetic energy stayed below " + str(self.stall_ke) + " for " + str(self.stall_window) + " rows"
+        return None
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                watched = list(self._watched.items())
+
+            for job, (follower, totals) in watched:
+                try:
+                    rows = follower.read()
+                except Exception:
+                    # Malformed row, reported when the finished simulation is read
+                    self.unwatch(job)
+                    continue
+
+                if rows is None:
+                    continue
+                reason = self.check(rows, totals)
+                if reason is not None:
+                    self.unwatch(job)
+                    if job.stop(reason + " after " + str(follower.num_rows) + " rows"):
+                        with self._lock:
+                            self.stopped += 1
+
+
+def create_supervisor(settings):
+    # RETURNS
+    # - supervisor              SimulationSupervisor, configured by the supervision section of the settings, None if
+    #                           supervision is disabled
+    if not settings["supervision"]["enabled"]:
+        return None
+    return SimulationSupervisor(settings["supervision"]["interval"], settings["supervision"]["stall_window"],
+                                stall_ke=settings["supervision"]["stall_ke"], max_ke=settings["supervision"]["max_ke"])
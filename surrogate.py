@@ -0,0 +1,311 @@
+import math
+import re
+import threading
+import time
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import splu
+
+from scheduler import SimulationScheduler
+from simulation_files import KE_SCALE, SimulationResult
+
+
+# MASS-SPRING SURROGATE
+# In-process stand-in for voxelyze, used by the "surrogate" evaluation backend for fast pre-screening, quick end-to-end
+# runs of the genetic algorithm and benchmarks that should not depend on the simulator. It reads the morphology,
+# stiffness, phase offsets, materials and environment of the vxa file and returns the fitness values and per-voxel
+# kinetic energy series voxelyze would write to its fitness and KE files, without touching the file system.
+#
+# Model: every voxel is a point mass at its centre joined to its face and edge neighbours by linear springs (E * voxel
+# size, in series between voxels of different stiffness). Actuated voxels expand and contract with the temperature,
+# their springs rest length changes by CTE * TempAmp * sin(2 pi t / TempPeriod + phase offset). Displacements are
+# small-strain, so the stiffness matrix is constant during a simulation and every time step is one backward Euler
+# (implicit) solve, stable for any stiffness at a few steps per actuation period. The matrices are sparse, a node only
+# has springs to its neighbours, and the system is factorized once per simulation (scipy splu), a time step is a sparse
+# product and the solve with the factors. Floor contact is a projection, nodes below the floor are put back on it and
+# their sliding velocity is reduced by Coulomb friction (uStatic, uDynamic).
+#
+# The surrogate is not voxelyze: it ranks creatures similarly (stiffer actuated regions move less, the phase offset
+# travelling wave moves the creature along x) but fitness values are not comparable between the two.
+
+SURROGATE_NAME = "mass_spring_surrogate"        # string, simulator name used in place of the voxelyze path
+DIAGONAL_STIFFNESS = 0.5                        # float, stiffness of an edge (shear) spring relative to a face spring
+
+# Spring offsets (x, y, z) to the neighbours of a voxel, one of each opposite pair: 3 faces and 6 edges
+_SPRING_OFFSETS = np.array([(1, 0, 0), (0, 1, 0), (0, 0, 1), (1, 1, 0), (1, -1, 0), (1, 0, 1), (1, 0, -1), (0, 1, 1),
+                            (0, 1, -1)])
+
+_LAYER = re.compile(r"<Layer><!\[CDATA\[([^\]]*)\]\]></Layer>")
+_MATERIAL = re.compile(r"<Material ID=\"(\d+)\">(.*?)</Material>", re.S)
+
+
+def _value(text, tag):
+    match = re.search("<" + tag + r">\s*([^<]*?)\s*</" + tag + ">", text)
+    if match is None:
+        raise Exception("ERROR: The vxa file has no " + tag + " element.")
+    return float(match.group(1))
+
+
+def _layers(text, tag, shape, parse_row):
+    # RETURNS
+    # - layers                  np.array (z, y, x), values of the layers of a section, None if the section is missing
+    match = re.search("<" + tag + r">(.*?)</" + tag + ">", text, re.S)
+    if match is None:
+        return None
+    rows = [parse_row(row) for row in _LAYER.findall(match.group(1))]
+    return np.reshape(np.array(rows, dtype=float), shape)
+
+
+def parse_vxa(vxa_text):
+    # Reads what the surrogate simulates from a vxa file.
+    # RETURNS
+    # - vxa                     dict, {"morphology": (z, y, x) np.array of material numbers,
+    #                                  "stiffness": (z, y, x) np.array of elastic moduli, None if the file has none,
+    #                                  "phase_offset": (z, y, x) np.array of actuation phase offsets,
+    #                                  "environment": dict, see MassSpringSimulator.simulate}
+    shape = tuple(int(_value(vxa_text, axis + "_Voxels")) for axis in "ZYX")
+
+    morphology = _layers(vxa_text, "Data", shape, lambda row: [int(material) for material in row])
+    if morphology is None:
+        raise Exception("ERROR: The vxa file has no Data section.")
+    stiffness = _layers(vxa_text, "Stiffness", shape, lambda row: row.split(","))
+    phase_offset = _layers(vxa_text, "PhaseOffset", shape, lambda row: row.split(","))
+    if phase_offset is None:
+        phase_offset = np.zeros(shape)
+
+    materials = {}
+    for material_id, material_text in _MATERIAL.findall(vxa_text):
+        materials[int(material_id)] = {"elastic_mod": _value(material_text, "Elastic_Mod"),
+                                       "density": _value(material_text, "Density"),
+                                       "cte": _value(material_text, "CTE"),
+                                       "static_friction": _value(material_text, "uStatic"),
+                                       "dynamic_friction": _value(material_text, "uDynamic")}
+
+    environment = {"lattice_dim": _value(vxa_text, "Lattice_Dim"),
+                   "materials": materials,
+                   "gravity": _value(vxa_text, "GravAcc") if _value(vxa_text, "GravEnabled") else 0.0,
+                   "floor": bool(_value(vxa_text, "FloorEnabled")),
+                   "temp_amp": (_value(vxa_text, "TempAmp") if _value(vxa_text, "TempEnabled")
+                                and _value(vxa_text, "VaryTempEnabled") else 0.0),
+                   "temp_period": _value(vxa_text, "TempPeriod"),
+                   "simulation_time": _value(vxa_text, "StopConditionValue"),
+                   "init_cm_time": _value(vxa_text, "InitCmTime"),
+                   "bond_damping": _value(vxa_text, "BondDampingZ"),
+                   "slow_damping": _value(vxa_text, "SlowDampingZ")}
+
+    return {"morphology": morphology.astype(int), "stiffness": stiffness, "phase_offset": phase_offset,
+            "environment": environment}
+
+
+class MassSpringSimulator:
+    def __init__(self, steps_per_period=20):
+        # ARGUMENTS
+        # - steps_per_period        int, time steps per actuation (temperature) period
+
+        self.steps_per_period = steps_per_period                    # int, time steps per actuation period
+
+    def simulate_vxa(self, vxa_text):
+        # Simulates the creature described by a vxa file, see simulate
+        vxa = parse_vxa(vxa_text)
+        return self.simulate(vxa["morphology"], vxa["stiffness"], vxa["phase_offset"], vxa["environment"])
+
+    def simulate(self, morphology, stiffness, phase_offset, environment):
+        # ARGUMENTS
+        # - morphology              (z, y, x) np.array, material number of every voxel, 0 for empty
+        # - stiffness               (z, y, x) np.array, elastic modulus of every voxel, None for the materials modulus
+        # - phase_offset            (z, y, x) np.array, actuation phase offset of every voxel in radians
+        # - environment             dict, {"lattice_dim": voxel size in m,
+        #                                  "materials": {material number: {"elastic_mod", "density", "cte",
+        #                                                                  "static_friction", "dynamic_friction"}},
+        #                                  "gravity": m/s^2 along z, 0 without gravity, "floor": bool,
+        #                                  "temp_amp", "temp_period": actuation amplitude and period in s,
+        #                                  "simulation_time", "init_cm_time": s, fitness is measured from init_cm_time,
+        #                                  "bond_damping", "slow_damping": damping ratios}
+        #
+        # RETURNS
+        # - fitness_values          dict, {"normDistX", "normDistY", "normDistZ"}, distance the centre of mass
+        #                           travelled since init_cm_time in voxels, as in a voxelyze fitness file
+        # - ke_series               (time steps, voxels) np.array, kinetic energy of every voxel at every time step, in
+        #                           the voxel order of a voxelyze KE file (0 for empty voxels)
+
+        morphology = np.asarray(morphology)
+        dim = environment["lattice_dim"]
+        time_step = float(environment["temp_period"]) / self.steps_per_period
+        num_steps = int(round(environment["simulation_time"] / time_step))
+        ke_series = np.zeros((num_steps, morphology.size))
+
+        occupied = np.flatnonzero(morphology.ravel())
+        n = len(occupied)
+        if n == 0:
+            return {"normDistX": 0.0, "normDistY": 0.0, "normDistZ": 0.0}, ke_series
+
+        # Voxel properties
+        try:
+            materials = [environment["materials"][material] for material in morphology.ravel()[occupied]]
+        except KeyError as error:
+            raise Exception("ERROR: Material " + str(error) + " is not in the vxa files palette.")
+        mass = np.array([material["density"] for material in materials]) * dim**3
+        if stiffness is None:
+            elastic_mod = np.array([material["elastic_mod"] for material in materials])
+        else:
+            elastic_mod = np.asarray(stiffness, dtype=float).ravel()[occupied]
+        amplitude = np.array([material["cte"] for material in materials]) * environment["temp_amp"]
+        static_friction = np.array([material["static_friction"] for material in materials])
+        dynamic_friction = np.array([material["dynamic_friction"] for material in materials])
+        phase = np.asarray(phase_offset, dtype=float).ravel()[occupied]
+
+        # Nodes at the voxel centres, the bottom layer rests on the floor
+        z, y, x = np.unravel_index(occupied, morphology.shape)
+        grid = np.column_stack((x, y, z))
+        rest_position = (grid + 0.5) * dim
+
+        # Springs between occupied neighbours
+        node_index = -np.ones(morphology.shape, dtype=int)
+        node_index.ravel()[occupied] = np.arange(n)
+        size = np.array(morphology.shape[::-1])
+        first, second, offsets = [], [], []
+        for offset in _SPRING_OFFSETS:
+            target = grid + offset
+            inside = np.flatnonzero(np.all((target >= 0) & (target < size), axis=1))
+            neighbour = node_index[target[inside, 2], target[inside, 1], target[inside, 0]]
+            first.append(inside[neighbour >= 0])
+            second.append(neighbour[neighbour >= 0])
+            offsets.append(np.tile(offset, (np.count_nonzero(neighbour >= 0), 1)))
+        first, second, offsets = np.concatenate(first), np.concatenate(second), np.concatenate(offsets)
+
+        length = np.linalg.norm(offsets, axis=1)
+        direction = offsets / length[:, None]
+        pair_mod = 2 * elastic_mod[first] * elastic_mod[second] / (elastic_mod[first] + elastic_mod[second])
+        spring_k = pair_mod * dim * np.where(length == 1, 1.0, DIAGONAL_STIFFNESS)
+        length = length * dim
+
+        # 3x3 blocks of every spring, the entries of the same row and column are summed when converted to csr
+        blocks = spring_k[:, None, None] * direction[:, :, None] * direction[:, None, :]
+        axes = np.arange(3)
+        rows, columns, values = [], [], []
+        for row_node, column_node, sign in ((first, first, 1), (second, second, 1), (first, second, -1),
+                                            (second, first, -1)):
+            rows.append(np.broadcast_to(3 * row_node[:, None, None] + axes[None, :, None], blocks.shape).ravel())
+            columns.append(np.broadcast_to(3 * column_node[:, None, None] + axes[None, None, :], blocks.shape).ravel())
+            values.append((sign * blocks).ravel())
+        stiffness_matrix = sparse.coo_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+                                             shape=(3 * n, 3 * n)).tocsr()
+
+        def spring_forces(strain):
+            # Forces of the springs when the voxels are strained, they push the nodes apart as their rest length grows
+            extension = spring_k * length * (strain[first] + strain[second]) / 2
+            forces = np.zeros((n, 3))
+            np.add.at(forces, first, -extension[:, None] * direction)
+            np.add.at(forces, second, extension[:, None] * direction)
+            return forces.ravel()
+
+        # sin(wt + phase) = sin(wt) cos(phase) + cos(wt) sin(phase), actuation is two fixed force vectors
+        sin_forces = spring_forces(amplitude * np.cos(phase))
+        cos_forces = spring_forces(amplitude * np.sin(phase))
+        gravity_forces = np.zeros((n, 3))
+        gravity_forces[:, 2] = mass * environment["gravity"]
+        gravity_forces = gravity_forces.ravel()
+
+        # Rayleigh damping, ratios are relative to a single voxel of average stiffness and mass
+        natural_frequency = math.sqrt(np.mean(spring_k) / np.mean(mass))
+        mass_damping = 2 * environment["slow_damping"] * natural_frequency
+        stiffness_damping = 2 * environment["bond_damping"] / natural_frequency
+
+        # Backward Euler: (M + dt C + dt^2 K) v' = M v + dt (f(t') - K u), with C = a M + b K
+        node_mass = np.repeat(mass, 3)
+        system = ((stiffness_damping * time_step + time_step**2) * stiffness_matrix
+                  + sparse.diags(node_mass * (1 + mass_damping * time_step)))
+        # The system is symmetric positive definite, it is factorized with a symmetric ordering and without pivoting
+        solver = splu(system.tocsc(), permc_spec="MMD_AT_PLUS_A", diag_pivot_thresh=0,
+                      options={"SymmetricMode": True})
+
+        velocity = np.zeros((n, 3))
+        displacement = np.zeros((n, 3))
+        floor = dim / 2
+        frequency = 2 * math.pi / environment["temp_period"]
+        total_mass = np.sum(mass)
+        initial_centre = None
+
+        for step in range(num_steps):
+            now = (step + 1) * time_step
+            previous_slide = displacement[:, :2].copy()
+            forces = (gravity_forces + math.sin(frequency * now) * sin_forces + math.cos(frequency * now) * cos_forces
+                      - stiffness_matrix.dot(displacement.ravel()))
+            velocity = solver.solve(node_mass * velocity.ravel() + time_step * forces).reshape((n, 3))
+            displacement += time_step * velocity
+
+            if environment["floor"]:
+                penetration = floor - rest_position[:, 2] - displacement[:, 2]
+                contact = np.flatnonzero(penetration > 0)
+                if len(contact):
+                    # Velocity taken away by the floor, it limits the friction the node can get
+                    normal_change = np.maximum(-velocity[contact, 2], 0) + penetration[contact] / time_step
+                    displacement[contact, 2] += penetration[contact]
+                    velocity[contact, 2] = np.maximum(velocity[contact, 2], 0)
+
+                    slide = velocity[contact, :2]
+                    speed = np.linalg.norm(slide, axis=1)
+                    kept = np.where(speed <= static_friction[contact] * normal_change, 0.0,
+                                    1 - dynamic_friction[contact] * normal_change / np.maximum(speed, 1e-12))
+                    velocity[contact, :2] = slide * np.maximum(kept, 0)[:, None]
+                    displacement[contact, :2] = previous_slide[contact] + time_step * velocity[contact, :2]
+
+            ke_series[step, occupied] = 0.5 * mass * np.sum(velocity**2, axis=1)
+
+            if initial_centre is None and now >= environment["init_cm_time"]:
+                initial_centre = np.dot(mass, rest_position + displacement) / total_mass
+
+        centre = np.dot(mass, rest_position + displacement) / total_mass
+        if initial_centre is None:
+            initial_centre = centre
+        distance = (centre - initial_centre) / dim
+
+        return {"normDistX": float(distance[0]), "normDistY": float(distance[1]),
+                "normDistZ": float(distance[2])}, ke_series
+
+
+class SurrogateScheduler(SimulationScheduler):
+    def __init__(self, max_workers=None, steps_per_period=20):
+        # Runs simulations with the mass-spring surrogate on max_workers threads of this process instead of starting
+        # voxelyze. Finished jobs carry a SimulationResult in job.result, no files are written.
+        # ARGUMENTS
+        # - max_workers             int, simulations run at once, defaults to the number of cpus
+        # - steps_per_period        int, time steps per actuation period, see MassSpringSimulator
+
+        SimulationScheduler.__init__(self, SURROGATE_NAME, max_workers)
+        self.simulator = MassSpringSimulator(steps_per_period)     # MassSpringSimulator, simulates the jobs
+
+    def close(self):
+        # Drops queued jobs, running simulations finish on their own
+        with self._lock:
+            self._pending.clear()
+
+    def _launch(self, job):
+        # Must be called while holding self._lock
+        job.start_time = time.time()
+        job.slot = self._free_slots.pop(0)
+        self._running.add(job)
+
+        simulation = threading.Thread(target=self._simulate, args=(job,))
+        simulation.daemon = True
+        simulation.start()
+
+    def _simulate(self, job):
+        try:
+            fitness_values, ke_series = self.simulator.simulate_vxa(job.vxa_text)
+            # Summed as the rows of a KE file would be, see simulation_files.sum_csv_rows
+            job.result = SimulationResult(fitness_values, np.sum(np.multiply(ke_series, KE_SCALE), axis=0))
+            job.returncode = 0
+        except Exception as error:
+            job.error = "Surrogate simulation failed: " + str(error)
+        job.end_time = time.time()
+        job.vxa_text = None
+
+        with self._lock:
+            self._running.discard(job)
+            self._free_slots.append(job.slot)
+            self._free_slots.sort()
+            self._launch_pending()
+
+        job.completed_queue.put(job)
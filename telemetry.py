@@ -0,0 +1,117 @@
+import json
+
+import numpy as np
+
+
+# TELEMETRY
+# Timings of every creature-episode of a genetic algorithm run, split into the phases the episode goes through, and a
+# per-generation summary of them. Written as JSON lines to telemetry.jsonl in the output directory, so a slow run can be
+# told apart as simulator bound (queue_wait, simulation) or python bound (every other phase).
+#
+# Phases (seconds):
+# - vxa_build               building the creatures vxa file (Creature.update_vxa)
+# - vxa_write               writing the vxa file to the directory the simulation runs in
+# - queue_wait              from submitting the simulation until the simulator was started
+# - simulation              simulator wall time
+# - fitness_parse           reading the fitness file
+# - csv_reduction           summarizing and compressing the pressure, kinetic energy and strain files
+# - ke_ingest               reading the kinetic energy file (unless summarized) and building the neural network inputs
+# - nn_forward              forward pass of the neural network
+# - morphology_update       applying the neural network outputs to the stiffness and morphology
+# - file_moves              moving or removing the simulation files
+# Phases done for several creatures at once (fitness_parse, nn_forward) are shared equally between them. Phases a
+# creature-episode did not go through (E.g. the simulation of a result cache hit) are left out of its record.
+#
+# Record types:
+# - episode                 a finished creature-episode: its phase timings, whether it failed or was a cache hit
+# - generation              end of a generation: wall time and, for every phase, the number of creature-episodes
+#                           timed, their total, mean, 50th, 90th and 99th percentile and maximum
+
+
+PHASES = ["vxa_build", "vxa_write", "queue_wait", "simulation", "fitness_parse", "csv_reduction", "ke_ingest",
+          "nn_forward", "morphology_update", "file_moves"]
+SIMULATOR_PHASES = ["queue_wait", "simulation"]
+PERCENTILES = [50, 90, 99]
+
+
+def job_timings(job):
+    # RETURNS
+    # - timings                 dict, {phase: seconds} of a finished SimulationJob, including the phases measured by
+    #                           the scheduler from the jobs timestamps
+    timings = dict(job.timings)
+    if job.start_time is not None:
+        timings["queue_wait"] = job.start_time - job.submit_time
+        if job.end_time is not None:
+            timings["simulation"] = job.end_time - job.start_time
+    return timings
+
+
+def summarize(values):
+    # RETURNS
+    # - summary                 dict, count, total, mean, percentiles and maximum of the values
+    values = np.asarray(values, dtype=float)
+    summary = {"count": len(values), "total": float(np.sum(values)), "mean": float(np.mean(values))}
+    for percentile in PERCENTILES:
+        summary["p" + str(percentile)] = float(np.percentile(values, percentile))
+    summary["max"] = float(np.max(values))
+    return summary
+
+
+class Telemetry:
+    def __init__(self, file_path):
+        # Opens the telemetry file for appending, a resumed run carries on with the same file.
+        # ARGUMENTS
+        # - file_path               string, path to the telemetry file
+
+        self.file_path = file_path                                  # string, path to the telemetry file
+        self.file = open(file_path, "a")                            # file, telemetry opened for appending
+        self.phase_times = {}                                       # dict, {phase: list of seconds} of the generation
+        self.episodes = 0                                           # int, creature-episodes of the generation
+        self.failed = 0                                             # int, failed creature-episodes of the generation
+        self.cache_hits = 0                                         # int, result cache hits of the generation
+
+    def write(self, record):
+        self.file.write(json.dumps(record) + "\n")
+
+    def record_episode(self, job):
+        # ARGUMENTS
+        # - job                     SimulationJob, processed simulation of a creature
+        creature = job.payload
+        timings = job_timings(job)
+        self.write({"type": "episode", "creature": creature.name, "generation": creature.generation,
+                    "episode": creature.episode, "failed": creature.failure is not None, "cache_hit": job.cache_hit,
+                    "timings": timings})
+
+        for phase, seconds in timings.items():
+            self.phase_times.setdefault(phase, []).append(seconds)
+        self.episodes += 1
+        self.failed += int(creature.failure is not None)
+        self.cache_hits += int(job.cache_hit)
+
+    def end_generation(self, generation, wall_time):
+        # Writes the summary of the generation and starts the next one.
+        # ARGUMENTS
+        # - generation              int, generation number
+        # - wall_time               float, seconds the generation took
+        #
+        # RETURNS
+        # - record                  dict, generation record written
+        phases = {phase: summarize(self.phase_times[phase]) for phase in PHASES if self.phase_times.get(phase)}
+        record = {"type": "generation", "generation": generation, "wall_time": wall_time, "episodes": self.episodes,
+                  "failed": self.failed, "cache_hits": self.cache_hits,
+                  "simulator_time": sum(phases[phase]["total"] for phase in SIMULATOR_PHASES if phase in phases),
+                  "python_time": sum(phases[phase]["total"] for phase in PHASES
+                                     if phase in phases and phase not in SIMULATOR_PHASES),
+                  "phases": phases}
+        self.write(record)
+        self.file.flush()
+
+        self.phase_times = {}
+        self.episodes = 0
+        self.failed = 0
+        self.cache_hits = 0
+        return record
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
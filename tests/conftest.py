@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# The modules of the repository are imported from its root directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import settings  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def restore_settings():
+    # Tests replace the process wide settings with set_settings, every test starts with and leaves the settings it
+    # found
+    saved_settings = settings._SETTINGS
+    yield
+    settings._SETTINGS = saved_settings
@@ -0,0 +1,44 @@
+import json
+import os
+
+import numpy as np
+
+from campaign import SCENARIO_DONE_FILE, run_campaign
+from population_async import Population
+from settings import load_settings, set_settings
+
+# Runs a small damage campaign with fake_voxelyze.py in place of voxelyze
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_stiffness_damage_scenario(tmpdir, monkeypatch):
+    monkeypatch.chdir(str(tmpdir))
+    monkeypatch.setenv("FAKE_VOXELYZE_TIME", "0.01")
+    monkeypatch.setenv("FAKE_VOXELYZE_STEPS", "5")
+    set_settings(load_settings(os.path.join(ROOT, "settings.json"), {
+        "evosoro_path": os.path.join(ROOT, "fake_voxelyze.py"),
+        "parameters": {"pop_size": 4, "ep_size": 2, "gen_size": 1, "top": 1, "evolve": 2},
+        "evaluation": {"max_workers": 2}}))
+
+    undamaged = Population()
+    undamaged.save_population("undamaged")
+    undamaged_stiffness = undamaged.base_creature.initial_stiffness.copy()
+
+    scenario = {"name": "stiffness_halved", "damage_type": "stiff_spher_mult", "damage_arguments": [[0, 0, 0], 2, 0.5]}
+    run_campaign({"population_file": "undamaged.pkl", "output_directory": "campaign", "generations": 2,
+                  "max_parallel_scenarios": None, "scenarios": [scenario]})
+
+    directory = os.path.join("campaign", "stiffness_halved")
+    with open(os.path.join(directory, SCENARIO_DONE_FILE)) as done_file:
+        assert json.load(done_file)["scenario"] == scenario
+
+    damaged = Population.load_population(os.path.join(directory, "stiffness_halved.pkl"))
+    assert damaged.damage_type == "stiff_spher_mult"
+    assert damaged.last_generation == 1
+
+    # Creatures kept from the undamaged population and those created during the scenario start out damaged
+    damaged_stiffness = damaged.base_creature.initial_stiffness
+    assert damaged_stiffness[0, 0, 0] == undamaged_stiffness[0, 0, 0] * 0.5
+    assert len(damaged.full_population) > len(damaged.population)
+    for creature in damaged.full_population.values():
+        assert np.array_equal(creature.initial_stiffness, damaged_stiffness)
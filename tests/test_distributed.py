@@ -0,0 +1,136 @@
+import os
+import socket
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+import pytest
+
+import distributed
+from distributed import DistributedScheduler, WorkerAgent, receive_message, send_message
+from scheduler import SimulationJob
+
+# Runs a broker and worker agents in this process, the workers run fake_voxelyze.py in place of voxelyze
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TIMEOUT = 30                        # float, seconds the tests wait for anything before they fail
+
+
+def simulation_job(number):
+    # RETURNS
+    # - job                     SimulationJob, simulation of a 2x2x1 creature, its payload is number
+    name = "_creature" + str(number) + "_gen0_ep0"
+    vxa_text = ("<VXA><FitnessFileName>" + name + "_fitness.xml</FitnessFileName>"
+                "<X_Voxels>2</X_Voxels><Y_Voxels>2</Y_Voxels><Z_Voxels>1</Z_Voxels></VXA>")
+    return SimulationJob(name, payload=number, expected_files=[name + "_fitness.xml", "ke" + name + "_fitness.xml.csv"],
+                         vxa_text=vxa_text)
+
+
+def wait_for(condition):
+    deadline = time.time() + TIMEOUT
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("Timed out waiting for " + condition.__name__)
+        time.sleep(0.05)
+
+
+def start_agent(address, tmpdir, name, token=None):
+    # Serves the broker from a thread until the broker closes the connection
+    # RETURNS
+    # - thread                  threading.Thread, thread of the agent
+    agent = WorkerAgent(address, os.path.join(ROOT, "fake_voxelyze.py"), max_workers=2,
+                        scratch_directory=str(tmpdir.mkdir(name)), name=name, token=token)
+
+    def serve():
+        try:
+            agent.serve()
+        except (socket.error, OSError, EOFError, ValueError):
+            pass
+
+    thread = threading.Thread(target=serve)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def finished_jobs(completed, number):
+    # RETURNS
+    # - jobs                    list, the first number jobs put on the completed queue
+    return [completed.get(timeout=TIMEOUT) for _ in range(number)]
+
+
+@pytest.fixture
+def address(tmpdir, monkeypatch):
+    monkeypatch.setenv("FAKE_VOXELYZE_TIME", "0.05")
+    monkeypatch.setenv("FAKE_VOXELYZE_STEPS", "5")
+    return "unix:" + str(tmpdir.join("broker.sock"))
+
+
+def test_every_job_completes(tmpdir, address):
+    broker = DistributedScheduler(address)
+    try:
+        start_agent(address, tmpdir, "worker_a")
+        start_agent(address, tmpdir, "worker_b")
+        wait_for(lambda: broker.num_workers() == 2)
+
+        completed = queue.Queue()
+        for number in range(10):
+            broker.submit(simulation_job(number), completed)
+        jobs = finished_jobs(completed, 10)
+    finally:
+        broker.close()
+
+    assert sorted(job.payload for job in jobs) == list(range(10))
+    for job in jobs:
+        assert job.succeeded() and job.error is None
+        assert sorted(job.result.fitness_values) == ["FinalCOM_Dist", "normDistX", "normDistY", "normDistZ"]
+        assert job.result.ke_sum.shape == (4,)
+
+
+def test_worker_with_the_wrong_token_is_rejected(tmpdir, address):
+    broker = DistributedScheduler(address, token="secret")
+    try:
+        for name, token in (("no_token", None), ("wrong_token", "not the secret")):
+            start_agent(address, tmpdir, name, token).join(TIMEOUT)
+            assert broker.num_workers() == 0
+
+        start_agent(address, tmpdir, "right_token", "secret")
+        wait_for(lambda: broker.num_workers() == 1)
+
+        completed = queue.Queue()
+        broker.submit(simulation_job(0), completed)
+        assert finished_jobs(completed, 1)[0].succeeded()
+    finally:
+        broker.close()
+
+
+def test_jobs_of_a_silent_worker_are_requeued(tmpdir, address, monkeypatch):
+    # The agent sends heartbeats well within the timeout, the silent worker sends none
+    monkeypatch.setattr(distributed, "HEARTBEAT_INTERVAL", 0.2)
+    broker = DistributedScheduler(address, heartbeat_timeout=1.5)
+    silent_worker = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        silent_worker.connect(address[len("unix:"):])
+        send_message(silent_worker, {"type": "hello", "name": "silent", "capacity": 2, "token": None})
+        wait_for(lambda: broker.num_workers() == 1)
+
+        # The silent worker takes the first two jobs and never answers
+        completed = queue.Queue()
+        for number in range(4):
+            broker.submit(simulation_job(number), completed)
+        silent_worker.settimeout(TIMEOUT)
+        taken = sorted(receive_message(silent_worker)["name"] for _ in range(2))
+        assert taken == ["_creature0_gen0_ep0", "_creature1_gen0_ep0"]
+
+        start_agent(address, tmpdir, "worker")
+        jobs = finished_jobs(completed, 4)
+        assert broker.num_workers() == 1
+    finally:
+        silent_worker.close()
+        broker.close()
+
+    assert sorted(job.payload for job in jobs) == list(range(4))
+    assert all(job.succeeded() and job.result is not None for job in jobs)
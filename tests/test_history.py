@@ -0,0 +1,71 @@
+import numpy as np
+
+from history import HISTORY_ARRAYS, EvolutionHistory
+
+SHAPE = (2, 3, 4)                   # (z, y, x) voxels of the recorded creature
+
+
+def recorded_history(num_generations):
+    # RETURNS
+    # - history                 EvolutionHistory, two episodes recorded in every generation
+    # - evolution               dict, the same history in the layout Creature.update_evolution wrote before the history
+    #                           was stored in arrays
+    random_state = np.random.RandomState(4)
+    history = EvolutionHistory(2)
+    evolution = {}
+    for generation in range(num_generations):
+        nn_parameters = {"W1": random_state.uniform(-1, 1, (2, 3)), "b1": random_state.uniform(-1, 1, 3)}
+        for episode in range(2):
+            stiffness = random_state.uniform(1e5, 5e7, SHAPE)
+            morphology = random_state.randint(0, 5, SHAPE)
+            average_forces = random_state.uniform(0, 1, SHAPE[0] * SHAPE[1] * SHAPE[2])
+            fitness_xyz = random_state.uniform(-1, 1, 3).tolist()
+            fitness_eval = float(random_state.uniform(0, 2))
+            history.record(generation, episode, stiffness, morphology, average_forces, fitness_eval, fitness_xyz,
+                           nn_parameters)
+
+            evolution.setdefault("gen_" + str(generation), {})["nn_parameters"] = \
+                {key: str(value) for key, value in nn_parameters.items()}
+            evolution["gen_" + str(generation)]["ep_" + str(episode)] = {
+                "morphology": str(np.reshape(morphology, (SHAPE[0], -1)).tolist()),
+                "stiffness": str(np.reshape(stiffness, (SHAPE[0], -1)).tolist()),
+                "fitness_xyz": str(fitness_xyz),
+                "fitness_eval": fitness_eval,
+                "average_forces": str(average_forces.tolist())}
+    return history, evolution
+
+
+def test_to_dict_matches_the_old_layout():
+    # More generations than the arrays are first allocated for
+    history, evolution = recorded_history(9)
+    assert len(history) == 9
+    assert len(history.generations) > 4
+    assert history.to_dict() == evolution
+
+
+def test_save_and_load(tmpdir):
+    history, evolution = recorded_history(6)
+    file_path = str(tmpdir.join("evolution.npz"))
+    history.save(file_path)
+    loaded = EvolutionHistory.load(file_path)
+
+    assert len(loaded) == 6 and loaded.num_episodes == 2
+    assert 5 in loaded and 6 not in loaded
+    for name in HISTORY_ARRAYS:
+        assert np.array_equal(getattr(loaded, name), getattr(history, name)[:6])
+    assert loaded.to_dict() == evolution
+    assert loaded.generation_fitness() == history.generation_fitness()
+
+    # A loaded history carries on growing
+    loaded.record(6, 0, np.ones(SHAPE), np.ones(SHAPE), np.zeros(24), 1.0, [0.0, 0.0, 1.0],
+                  {"W1": np.zeros((2, 3)), "b1": np.zeros(3)})
+    assert len(loaded) == 7
+    assert loaded.fitness_eval[6, 0] == 1.0 and np.isnan(loaded.fitness_eval[6, 1])
+
+
+def test_empty_history(tmpdir):
+    file_path = str(tmpdir.join("evolution.npz"))
+    EvolutionHistory(3).save(file_path)
+    loaded = EvolutionHistory.load(file_path)
+    assert len(loaded) == 0 and loaded.num_episodes == 3
+    assert loaded.to_dict() == {}
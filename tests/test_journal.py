@@ -0,0 +1,124 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from journal import Journal, read_journal
+from population_async import Population, create_scheduler
+from settings import load_settings, set_settings
+
+# Interrupts a run with fake_voxelyze.py in place of voxelyze and resumes it from its journal
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+JOURNAL_FILE = os.path.join("generated_files", "journal.jsonl")
+POP_SIZE, EP_SIZE = 4, 2
+
+
+class Interrupted(Exception):
+    pass
+
+
+def creature_state(creature):
+    # RETURNS
+    # - state                   dict, everything the journal restores about a creature
+    return {"generation": creature.generation, "episode": creature.episode, "fitness_eval": creature.fitness_eval,
+            "previous_fitness": creature.previous_fitness, "fitness_xyz": creature.fitness_xyz,
+            "failure": creature.failure, "stiffness": creature.stiffness_array.copy(),
+            "morphology": creature.phenotype.morphology.copy(), "evolution": creature.evolution.to_dict(),
+            "nn_parameters": {key: value.copy() for key, value in creature.neural_net.parameters.items()}}
+
+
+def assert_same_state(state, creature):
+    resumed = creature_state(creature)
+    for key in ("stiffness", "morphology"):
+        assert np.array_equal(resumed.pop(key), state.pop(key)), key
+    for key, value in state.pop("nn_parameters").items():
+        assert np.array_equal(resumed["nn_parameters"].pop(key), value), key
+    del resumed["nn_parameters"]
+    assert resumed == state
+
+
+@pytest.fixture
+def interrupted_run(tmpdir, monkeypatch):
+    # Runs three generations and stops the run once three creatures have journaled an episode of generation 1
+    # RETURNS
+    # - states                  dict, {creature name: state} of the creatures whose episodes of generation 1 were
+    #                           journaled, as they were when their last episode was journaled
+    monkeypatch.chdir(str(tmpdir))
+    monkeypatch.setenv("FAKE_VOXELYZE_TIME", "0.01")
+    monkeypatch.setenv("FAKE_VOXELYZE_STEPS", "5")
+    set_settings(load_settings(os.path.join(ROOT, "settings.json"), {
+        "evosoro_path": os.path.join(ROOT, "fake_voxelyze.py"),
+        "parameters": {"pop_size": POP_SIZE, "ep_size": EP_SIZE, "gen_size": 3, "top": 1, "evolve": 2},
+        "evaluation": {"max_workers": 2},
+        "files": {"journal_batch_size": 1, "telemetry": 0}}))
+    os.mkdir("generated_files")
+
+    states = {}
+    write_episode = Journal.write_episode
+
+    def interrupt_write_episode(journal, creature, stiffness_before, morphology_before):
+        write_episode(journal, creature, stiffness_before, morphology_before)
+        if creature.generation == 1:
+            states[creature.name] = creature_state(creature)
+            if len(states) == 3:
+                raise Interrupted()
+
+    population = Population()
+    scheduler = create_scheduler(population.settings)
+    monkeypatch.setattr(Journal, "write_episode", interrupt_write_episode)
+    try:
+        with pytest.raises(Interrupted):
+            population.run_genetic_algorithm(scheduler=scheduler)
+    finally:
+        scheduler.close()
+        population.journal.close()
+    monkeypatch.setattr(Journal, "write_episode", write_episode)
+
+    return states
+
+
+def check_resumed(states):
+    population, generation, start_episodes, last_generation = Population.resume_from_journal(JOURNAL_FILE)
+
+    assert generation == 1 and last_generation == 2
+    assert population.last_generation == 0
+    assert sorted(start_episodes) == sorted(population.population)
+    for name, creature in population.population.items():
+        if name in states:
+            assert start_episodes[name] == states[name]["episode"] + 1
+            assert_same_state(states[name], creature)
+        else:
+            assert start_episodes[name] == 0
+
+    return population, generation, start_episodes, last_generation
+
+
+def test_resume_interrupted_run(interrupted_run):
+    population, generation, start_episodes, last_generation = check_resumed(interrupted_run)
+
+    population.run_genetic_algorithm(last_generation - generation + 1, first_generation=generation,
+                                     start_episodes=start_episodes)
+    assert population.last_generation == 2
+
+    # Every episode of the resumed generations is journaled once
+    records = read_journal(JOURNAL_FILE)
+    episodes = [(record["creature"], record["generation"], record["episode"]) for record in records
+                if record["type"] == "episode"]
+    assert len(episodes) == len(set(episodes)) == 3 * POP_SIZE * EP_SIZE
+    assert len([record for record in records if record["type"] == "run"]) == 1
+
+
+def test_resume_with_a_truncated_last_record(interrupted_run):
+    # The run was stopped while it wrote a record
+    with open(JOURNAL_FILE, "a") as journal_file:
+        journal_file.write('{"type": "episode", "creature": "_creature1", "generation": 1, "epis')
+
+    check_resumed(interrupted_run)
+
+    # Appending to the journal removes the half written record
+    Journal(JOURNAL_FILE).close()
+    with open(JOURNAL_FILE) as journal_file:
+        lines = journal_file.read().split("\n")
+    assert lines[-1] == ""
+    assert all(json.loads(line) for line in lines[:-1])
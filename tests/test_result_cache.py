@@ -0,0 +1,67 @@
+import json
+import os
+
+import numpy as np
+
+from result_cache import ResultCache, cache_key
+
+VXA = "<VXA><FitnessFileName>_creature0_gen0_ep0_fitness.xml</FitnessFileName><Layer>3,3,4</Layer></VXA>"
+FITNESS = {"normDistX": 1.5, "normDistY": -0.25, "normDistZ": 0.0}
+
+
+def entry_size():
+    # RETURNS
+    # - size                    int, bytes of one entry stored by the tests, as written by ResultCache.put
+    return len(json.dumps({"fitness_values": FITNESS, "ke_sum": [1.0, 2.0]}))
+
+
+def test_hit_and_miss(tmpdir):
+    cache = ResultCache(str(tmpdir), 1024 * 1024)
+    key = cache_key("voxelyze", VXA, "_creature0_gen0_ep0_fitness.xml")
+
+    assert cache.get(key) is None
+    cache.put(key, FITNESS, np.array([1.0, 2.0]))
+    result = cache.get(key)
+
+    assert result.fitness_values == FITNESS
+    assert np.array_equal(result.ke_sum, [1.0, 2.0])
+    assert cache.reset_counts() == (1, 1)
+    assert cache.reset_counts() == (0, 0)
+
+    # A new cache on the same directory finds the entry
+    assert ResultCache(str(tmpdir), 1024 * 1024).get(key).fitness_values == FITNESS
+
+
+def test_key_changes_with_the_vxa_text():
+    key = cache_key("voxelyze", VXA, "_creature0_gen0_ep0_fitness.xml")
+
+    # The same creature simulated under another name, generation or episode has the same key
+    renamed = VXA.replace("_creature0_gen0_ep0", "_creature7_gen3_ep2")
+    assert cache_key("voxelyze", renamed, "_creature7_gen3_ep2_fitness.xml") == key
+
+    # Any other change to the vxa file, or another simulator, gives a new key
+    assert cache_key("voxelyze", VXA.replace("3,3,4", "3,4,4"), "_creature0_gen0_ep0_fitness.xml") != key
+    assert cache_key("fake_voxelyze", VXA, "_creature0_gen0_ep0_fitness.xml") != key
+
+
+def test_least_recently_used_entries_are_evicted(tmpdir):
+    keys = [cache_key("voxelyze", VXA.replace("3,3,4", layer), "_creature0_gen0_ep0_fitness.xml")
+            for layer in ("1,1,1", "2,2,2", "3,3,3", "4,4,4")]
+
+    # Room for two entries
+    cache = ResultCache(str(tmpdir), 2 * entry_size() + entry_size() // 2)
+    cache.put(keys[0], FITNESS, [1.0, 2.0])
+    cache.put(keys[1], FITNESS, [1.0, 2.0])
+    assert cache.get(keys[0]) is not None
+
+    cache.put(keys[2], FITNESS, [1.0, 2.0])
+    assert len(cache) == 2
+    assert not os.path.exists(cache.entry_path(keys[1]))
+    assert cache.get(keys[0]) is not None and cache.get(keys[2]) is not None
+
+    # After a restart the order comes from the modification times of the entries
+    os.utime(cache.entry_path(keys[0]), (1000, 1000))
+    os.utime(cache.entry_path(keys[2]), (2000, 2000))
+    restarted = ResultCache(str(tmpdir), 2 * entry_size() + entry_size() // 2)
+    restarted.put(keys[3], FITNESS, [1.0, 2.0])
+    assert sorted(os.listdir(str(tmpdir))) == sorted([keys[2] + ".json", keys[3] + ".json"])
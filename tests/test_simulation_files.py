@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+
+from simulation_files import (FitnessFileError, parse_fitness, read_csv_blocks, read_fitness_file, reduce_csv_file,
+                              sum_csv_rows)
+
+FITNESS_FILE = ('<?xml version="1.0" encoding="ISO-8859-1"?>\n'
+                '<Voxelyze_Sim_Result Version="1.0">\n'
+                '<Fitness>\n'
+                '\t<FinalCOM_Dist>1.11803</FinalCOM_Dist>\n'
+                '\t<normDistX>1</normDistX>\n'
+                '\t<normDistY>-0.5</normDistY>\n'
+                '\t<normDistZ>2.5e-05</normDistZ>\n'
+                '</Fitness>\n'
+                '</Voxelyze_Sim_Result>\n')
+
+
+def write_csv(directory, rows, trailing_new_line=True):
+    # RETURNS
+    # - file_name               string, path to a CSV file written like voxelyze does, a trailing comma on every row,
+    #                           with every digit of the values
+    csv_file = directory.join("ke.csv")
+    text = "".join(",".join(repr(float(value)) for value in row) + ",\n" for row in rows)
+    csv_file.write(text if trailing_new_line else text[:-1])
+    return str(csv_file)
+
+
+def test_fitness_file():
+    result = parse_fitness(FITNESS_FILE, "fitness.xml")
+    assert result.norm_dist == [1.0, -0.5, 2.5e-05]
+    assert result.values["FinalCOM_Dist"] == 1.11803
+
+
+@pytest.mark.parametrize("cut", [0, 40, 80, len(FITNESS_FILE) - 25, len(FITNESS_FILE) - 2])
+def test_truncated_fitness_file(cut):
+    with pytest.raises(FitnessFileError) as error:
+        parse_fitness(FITNESS_FILE[:cut], "fitness.xml")
+    assert error.value.incomplete
+    assert error.value.file_name == "fitness.xml"
+
+
+def test_fitness_file_missing_a_tag():
+    text = FITNESS_FILE.replace("\t<normDistY>-0.5</normDistY>\n", "")
+    with pytest.raises(FitnessFileError) as error:
+        parse_fitness(text, "fitness.xml")
+    assert not error.value.incomplete
+    assert "normDistY" in str(error.value)
+
+
+def test_fitness_file_with_a_value_that_is_not_a_number():
+    text = FITNESS_FILE.replace("<normDistZ>2.5e-05</normDistZ>", "<normDistZ>-nan(ind)x</normDistZ>")
+    with pytest.raises(FitnessFileError) as error:
+        parse_fitness(text, "fitness.xml")
+    assert "normDistZ" in str(error.value)
+
+
+def test_missing_fitness_file(tmpdir):
+    with pytest.raises(FitnessFileError):
+        read_fitness_file(str(tmpdir.join("missing_fitness.xml")))
+
+
+@pytest.mark.parametrize("block_size", [7, 16, 1000])
+def test_csv_rows_split_across_blocks(tmpdir, block_size):
+    rows = np.random.RandomState(0).uniform(0, 1e-4, (9, 4)).round(9)
+    file_name = write_csv(tmpdir, rows)
+
+    blocks = list(read_csv_blocks(file_name, 4, block_size))
+    assert np.array_equal(np.vstack(blocks), rows)
+    if block_size < 20:
+        assert len(blocks) > 1
+
+
+def test_csv_without_trailing_new_line(tmpdir):
+    rows = [[1, 2, 3], [4, 5, 6]]
+    file_name = write_csv(tmpdir, rows, trailing_new_line=False)
+    assert np.array_equal(np.vstack(list(read_csv_blocks(file_name, 3, 5))), rows)
+
+
+def test_csv_with_a_short_last_row(tmpdir):
+    file_name = write_csv(tmpdir, [[1, 2, 3], [4, 5, 6]])
+    with open(file_name, "a") as csv_file:
+        csv_file.write("7,8,")
+    with pytest.raises(Exception) as error:
+        list(read_csv_blocks(file_name, 3, 5))
+    assert "does not have 3 values on every row" in str(error.value)
+
+
+@pytest.mark.parametrize("block_size", [13, 50, 100000])
+def test_csv_reduction(tmpdir, block_size):
+    # Large values with small differences, summing the squares would lose the variance
+    rows = np.array([[1e4 + 0.001 * i + j for j in range(3)] for i in range(23)])
+    file_name = write_csv(tmpdir, rows)
+
+    reduction, compressed_file_name = reduce_csv_file(file_name, 3, stride=4, scale=10, block_size=block_size)
+    arrays = reduction.arrays("ke")
+
+    assert compressed_file_name is None
+    assert arrays["ke_rows"] == 23
+    assert np.allclose(reduction.mean, np.mean(rows, axis=0), rtol=1e-12)
+    assert np.allclose(reduction.sum_squares / 23, np.var(rows, axis=0), rtol=1e-6)
+    assert np.array_equal(reduction.max, np.max(rows, axis=0))
+    assert np.array_equal(reduction.total, sum_csv_rows(file_name, 3, scale=10)[0])
+
+    # Rows 0, 4, 8, ... whichever block they were read in
+    assert np.array_equal(arrays["ke_series"], rows[::4].astype(np.float32))
+
+
+def test_csv_reduction_without_rows(tmpdir):
+    csv_file = tmpdir.join("ke.csv")
+    csv_file.write("")
+    arrays = reduce_csv_file(str(csv_file), 3, stride=4)[0].arrays("ke")
+    assert arrays["ke_rows"] == 0
+    assert np.all(np.isnan(arrays["ke_mean"]))
+    assert arrays["ke_series"].shape == (0, 3)
@@ -0,0 +1,103 @@
+import os
+
+import numpy as np
+
+from population_async import Population
+from settings import load_settings, set_settings
+from surrogate import MassSpringSimulator, parse_vxa
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# A 3x2x2 creature: a passive bottom layer, an actuated top layer with its middle column removed, whose phase offset
+# changes along x only
+MORPHOLOGY = np.array([[[1, 1, 1], [1, 1, 1]],
+                       [[2, 0, 2], [2, 0, 2]]])
+PHASE_OFFSET = np.array([[[0.0, 0.0, 0.0], [0.0, 0.0, 0.0]],
+                         [[0.0, 0.0, 1.5], [0.0, 0.0, 1.5]]])
+
+
+def layers(values, join):
+    # RETURNS
+    # - text                    string, one Layer element per z layer of values
+    return "".join("<Layer><![CDATA[" + join(layer.ravel()) + "]]></Layer>" for layer in values)
+
+
+def tiny_vxa(temp_amp=20.0, gravity=-9.81):
+    # RETURNS
+    # - vxa_text                string, vxa file of the tiny creature with only the elements the surrogate reads
+    stiffness = np.where(MORPHOLOGY == 2, 5e5, 1e6)
+    material = ("<Material ID=\"{}\"><Mechanical><Elastic_Mod>1e+06</Elastic_Mod><Density>1000</Density>"
+                "<CTE>{}</CTE><uStatic>1</uStatic><uDynamic>0.5</uDynamic></Mechanical></Material>")
+    return ("<VXA><Simulator><StopCondition><StopConditionValue>0.5</StopConditionValue></StopCondition>"
+            "<GA><InitCmTime>0.1</InitCmTime></GA><Damping><BondDampingZ>1</BondDampingZ>"
+            "<SlowDampingZ>0.01</SlowDampingZ></Damping></Simulator>"
+            "<Environment><Gravity><GravEnabled>1</GravEnabled><GravAcc>" + str(gravity) + "</GravAcc>"
+            "<FloorEnabled>1</FloorEnabled></Gravity><Thermal><TempEnabled>1</TempEnabled>"
+            "<TempAmp>" + str(temp_amp) + "</TempAmp><TempPeriod>0.1</TempPeriod>"
+            "<VaryTempEnabled>1</VaryTempEnabled></Thermal></Environment>"
+            "<VXC><Lattice><Lattice_Dim>0.01</Lattice_Dim></Lattice><Palette>" + material.format(1, 0) +
+            material.format(2, 0.01) + "</Palette><Structure><X_Voxels>3</X_Voxels><Y_Voxels>2</Y_Voxels>"
+            "<Z_Voxels>2</Z_Voxels><Data>" + layers(MORPHOLOGY, lambda row: "".join(str(m) for m in row)) + "</Data>"
+            "<Stiffness>" + layers(stiffness, lambda row: ",".join(str(s) for s in row)) + "</Stiffness>"
+            "<PhaseOffset>" + layers(PHASE_OFFSET, lambda row: ",".join(str(p) for p in row)) + "</PhaseOffset>"
+            "</Structure></VXC></VXA>")
+
+
+def test_parse_vxa():
+    vxa = parse_vxa(tiny_vxa())
+    assert np.array_equal(vxa["morphology"], MORPHOLOGY)
+    assert np.array_equal(vxa["stiffness"], np.where(MORPHOLOGY == 2, 5e5, 1e6))
+    assert np.array_equal(vxa["phase_offset"], PHASE_OFFSET)
+    assert vxa["environment"]["materials"][2]["cte"] == 0.01
+    assert vxa["environment"]["gravity"] == -9.81 and vxa["environment"]["floor"]
+    assert vxa["environment"]["temp_amp"] == 20.0
+
+
+def test_actuated_creature():
+    fitness_values, ke_series = MassSpringSimulator(steps_per_period=10).simulate_vxa(tiny_vxa())
+
+    # 0.5 s of 0.01 s steps, one column per voxel in the order of a KE file
+    assert ke_series.shape == (50, MORPHOLOGY.size)
+    assert np.all(np.isfinite(ke_series)) and np.all(ke_series >= 0)
+    assert np.all(ke_series[:, MORPHOLOGY.ravel() == 0] == 0)
+    # The actuated voxels move, gravity and friction hold the passive layer on the floor
+    assert np.all(ke_series[:, MORPHOLOGY.ravel() == 2].max(axis=0) > 0)
+
+    assert sorted(fitness_values) == ["normDistX", "normDistY", "normDistZ"]
+    assert all(np.isfinite(value) for value in fitness_values.values())
+    # The creature is symmetric in y, it moves along x but not along y
+    assert fitness_values["normDistX"] != 0
+    assert abs(fitness_values["normDistY"]) < 1e-6 * abs(fitness_values["normDistX"])
+
+    # The same vxa file gives the same results
+    again = MassSpringSimulator(steps_per_period=10).simulate_vxa(tiny_vxa())
+    assert again[0] == fitness_values and np.array_equal(again[1], ke_series)
+
+
+def test_creature_at_rest():
+    # Without actuation and gravity nothing moves
+    fitness_values, ke_series = MassSpringSimulator(steps_per_period=10).simulate_vxa(tiny_vxa(temp_amp=0, gravity=0))
+    assert fitness_values == {"normDistX": 0.0, "normDistY": 0.0, "normDistZ": 0.0}
+    assert not np.any(ke_series)
+
+
+def test_genetic_algorithm_with_the_surrogate(tmpdir, monkeypatch):
+    monkeypatch.chdir(str(tmpdir))
+    set_settings(load_settings(os.path.join(ROOT, "settings.json"), {
+        "parameters": {"pop_size": 4, "ep_size": 2, "gen_size": 2, "top": 1, "evolve": 2},
+        "evaluation": {"backend": "surrogate", "max_workers": 2, "surrogate_steps_per_period": 5}}))
+    os.mkdir("generated_files")
+
+    population = Population()
+    population.run_genetic_algorithm()
+    assert population.last_generation == 1
+
+    num_voxels = population.base_creature.phenotype.morphology.size
+    for creature in population.population.values():
+        assert creature.failure is None
+        assert np.isfinite(creature.fitness_eval) and np.all(np.isfinite(creature.fitness_xyz))
+        assert creature.ke_sum.shape == (num_voxels,) and np.all(np.isfinite(creature.ke_sum))
+        assert np.any(creature.ke_sum > 0)
+        assert np.all(np.isfinite(creature.average_forces))
+        fitness = creature.evolution.fitness_eval[:len(creature.evolution)]
+        assert np.all(np.isfinite(fitness[~np.isnan(fitness)])) and not np.all(np.isnan(fitness))
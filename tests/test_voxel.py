@@ -0,0 +1,70 @@
+import os
+
+import numpy as np
+import pytest
+
+from settings import load_settings
+from voxel import VoxelGrid, grid_topology
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def brute_force_neighbours(shape, z, y, x):
+    # RETURNS
+    # - neighbours              list of (z, y, x) coordinates of every voxel one step away from (z, y, x)
+    neighbours = []
+    for other in np.ndindex(*shape):
+        if abs(other[0] - z) + abs(other[1] - y) + abs(other[2] - x) == 1:
+            neighbours.append(other)
+    return neighbours
+
+
+def brute_force_section(creature_structure, sections, z, y, x):
+    # RETURNS
+    # - section                 int, number of the section whose range holds the voxel, sections are numbered x first,
+    #                           then y, then z
+    ranges = []
+    for coordinate, voxels, num_sections in zip((x, y, z), creature_structure, sections):
+        ranges.append([s for s in range(num_sections)
+                       if s * voxels <= coordinate * num_sections < (s + 1) * voxels][0])
+    return ranges[0] + ranges[1] * sections[0] + ranges[2] * sections[0] * sections[1]
+
+
+@pytest.mark.parametrize("creature_structure, sections", [([5, 4, 3], [2, 2, 1]), ([6, 6, 6], [2, 2, 2])])
+def test_grid_topology(creature_structure, sections):
+    neighbours, section = grid_topology(creature_structure, sections)
+    shape = (creature_structure[2], creature_structure[1], creature_structure[0])
+    assert section.shape == shape
+
+    for z, y, x in np.ndindex(*shape):
+        flat_index = np.ravel_multi_index((z, y, x), shape)
+        found = sorted(tuple(np.unravel_index(n, shape)) for n in neighbours[flat_index] if n >= 0)
+        assert found == brute_force_neighbours(shape, z, y, x)
+        assert section[z, y, x] == brute_force_section(creature_structure, sections, z, y, x)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_remove_isolated(seed):
+    settings = load_settings(os.path.join(ROOT, "settings.json"),
+                             {"structure": {"creature_structure": [5, 4, 3], "sections": [2, 2, 1]}})
+    structure = settings["structure"]
+
+    # Mostly empty voxels, so that some of the filled ones have no filled neighbour
+    random_state = np.random.RandomState(seed)
+    morphology = random_state.choice([0, 0, 0, 0, 2, 3, 4], (3, 4, 5))
+    stiffness = np.where(morphology == 0, structure["min_stiffness"], structure["base_stiffness"]).astype(float)
+    before = morphology.copy()
+
+    # Isolated voxels are found before any is removed
+    isolated = np.zeros(morphology.shape, dtype=bool)
+    for z, y, x in np.ndindex(*morphology.shape):
+        filled_neighbours = sum(before[neighbour] != 0 for neighbour in brute_force_neighbours(before.shape, z, y, x))
+        changeable = before[z, y, x] not in structure["unchangeable_morphs"]
+        isolated[z, y, x] = changeable and before[z, y, x] != 0 and filled_neighbours == 0
+    assert isolated.any()
+
+    VoxelGrid(morphology, stiffness, settings).remove_isolated()
+
+    assert np.array_equal(morphology, np.where(isolated, structure["morph_min"], before))
+    assert np.all(stiffness[isolated] == structure["min_stiffness"])
+    assert np.all(stiffness[~isolated & (before != 0)] == structure["base_stiffness"])
@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+
+from phenotype import Phenotype
+from settings import load_settings, set_settings
+
+# The golden files were written by Phenotype.update_vxa_file as it was before the static parts of the VXA file were
+# cached, the output must stay byte-identical.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+class _Creature:
+    # The only creature attribute update_vxa_file reads
+    fitness_file_name = "_creature7_gen3_ep2_fitness.xml"
+
+
+def golden_vxa(**properties):
+    # RETURNS
+    # - vxa_file                string, VXA file of a fixed creature: the base morphology with some voxels removed and
+    #                           random stiffness values of many magnitudes
+    set_settings(load_settings(os.path.join(ROOT, "settings.json")))
+    phenotype = Phenotype()
+    random_state = np.random.RandomState(9)
+    morphology = phenotype.morphology.copy()
+    morphology[random_state.uniform(size=morphology.shape) < 0.2] = 0
+    phenotype.morphology = morphology
+    stiffness = 10 ** random_state.uniform(4, 8, phenotype.morphology.size)
+
+    phenotype.update_vxa_file(_Creature(), stiffness_array=stiffness, **properties)
+    return phenotype.vxa_file
+
+
+def read_fixture(file_name):
+    with open(os.path.join(FIXTURES, file_name), "rb") as fixture_file:
+        return fixture_file.read().decode("ascii")
+
+
+def test_default_properties():
+    assert golden_vxa() == read_fixture("golden_default.vxa")
+
+
+def test_damping_override():
+    assert golden_vxa(damping=[0.5, 0.8, 0.25]) == read_fixture("golden_damping.vxa")
@@ -1,39 +1,206 @@
-import json
+import copy
 
+import numpy as np
 
-class Voxel:
-    def __init__(self, coordinates, material_number):
-        # import settings
-        settings_file = open("settings.json")
-        self.settings = json.load(settings_file)
-        settings_file.close()
-
-        if material_number in self.settings["structure"]["unchangeable_morphs"]:
-            self.can_be_changed = False
-        else:
-            self.can_be_changed = True
+from settings import get_settings
+
+# Neighbour and section arrays only depend on the creature structure and number of sections, they are built once per
+# (creature_structure, sections) and shared, read-only, by every voxel grid
+_TOPOLOGY_CACHE = {}
+
+# Offsets (z, y, x) of the six face neighbours of a voxel
+NEIGHBOUR_OFFSETS = ((0, 0, -1), (0, 0, 1), (0, -1, 0), (0, 1, 0), (-1, 0, 0), (1, 0, 0))
+
+
+def grid_topology(creature_structure, sections):
+    # Computes the neighbours and section of every voxel of a creature.
+    # ARGUMENTS
+    # - creature_structure      (1, 3) list, number of voxels (x, y, z)
+    # - sections                (1, 3) list, number of sections along (x, y, z)
+    #
+    # RETURNS
+    # - neighbours              np.array (x*y*z, 6), flat index of each voxels neighbours, -1 where there is none
+    # - section                 np.array (z, y, x), section number of each voxel
+
+    key = (tuple(creature_structure), tuple(sections))
+    if key in _TOPOLOGY_CACHE:
+        return _TOPOLOGY_CACHE[key]
+
+    x_voxels, y_voxels, z_voxels = creature_structure
+    x_sections, y_sections, z_sections = sections
+    shape = (z_voxels, y_voxels, x_voxels)
+    z, y, x = [axis.ravel() for axis in np.indices(shape)]
+
+    # Neighbour indices from grid offsets
+    neighbours = np.full((z.size, len(NEIGHBOUR_OFFSETS)), -1, dtype=np.int32)
+    for column, (dz, dy, dx) in enumerate(NEIGHBOUR_OFFSETS):
+        nz, ny, nx = z + dz, y + dy, x + dx
+        inside = (nz >= 0) & (nz < z_voxels) & (ny >= 0) & (ny < y_voxels) & (nx >= 0) & (nx < x_voxels)
+        neighbours[inside, column] = np.ravel_multi_index((nz[inside], ny[inside], nx[inside]), shape)
+
+    # Sections are numbered x first, then y, then z. floor(x / (x_voxels / x_sections)) in integer arithmetic
+    section = ((x * x_sections) // x_voxels +
+               (y * y_sections) // y_voxels * x_sections +
+               (z * z_sections) // z_voxels * x_sections * y_sections).reshape(shape)
+
+    neighbours.flags.writeable = False
+    section.flags.writeable = False
+    _TOPOLOGY_CACHE[key] = (neighbours, section)
 
-        # Location parameters
-        self.coordinates = coordinates                                          # list, z, y, x coordinates (yes, z,y,x)
-        self.neighbours = []                                                    # list, of neighbours
-        self.section = None                                                      # int, region in which the cube belongs
+    return neighbours, section
+
+
+class VoxelGrid:
+    def __init__(self, morphology, stiffness, settings=None):
+        # Holds the state of every voxel of a creature as arrays with the shape of the creatures morphology (z, y, x).
+        # The material and stiffness arrays are shared with (not copied from) the creature, so updating the grid updates
+        # phenotype.morphology and stiffness_array.
+        # ARGUMENTS
+        # - morphology              np.array (z, y, x), material number of each voxel
+        # - stiffness               np.array (z, y, x), stiffness of each voxel
+        # - settings                Settings, defaults to the process wide settings
+
+        if settings is None:
+            settings = get_settings()
+        self.settings = settings
 
         # Material properties
-        self.material_number = material_number                                  # int, material number of voxel
-        self.stiffness = self.settings["structure"]["base_stiffness"]           # int, default stiffness
+        self.material = morphology                                              # np.array, material number of voxels
+        self.stiffness = stiffness                                              # np.array, stiffness of voxels
+        self.can_be_changed = ~np.isin(morphology, self.settings["structure"]["unchangeable_morphs"])
+
+        # Location parameters, shared between every grid with the same structure
+        self.shape = morphology.shape                                           # tuple, (z, y, x) number of voxels
+        self.neighbours = None                                                  # np.array (x*y*z, 6), neighbours
+        self.section = None                                                     # np.array (z, y, x), voxel regions
+        self.set_topology()
+
+    def set_topology(self):
+        # Sets the (cached) neighbour and section arrays for the grids structure
+        self.neighbours, self.section = grid_topology(self.settings["structure"]["creature_structure"],
+                                                      self.settings["structure"]["sections"])
+
+    def __deepcopy__(self, memo):
+        # Material and stiffness go through memo so a copied creature keeps sharing them with its phenotype and
+        # stiffness array, the read-only neighbour and section arrays are not copied
+        grid = copy.copy(self)
+        memo[id(self)] = grid
+        grid.material = copy.deepcopy(self.material, memo)
+        grid.stiffness = copy.deepcopy(self.stiffness, memo)
+        grid.can_be_changed = copy.deepcopy(self.can_be_changed, memo)
+        return grid
+
+    def update_with_stiffness(self, new_stiffness, index=None):
+        # Sets the stiffness of changeable voxels, clamping it between min and max stiffness, and sets their material
+        # number accordingly.
+        # ARGUMENTS
+        # - new_stiffness           float or np.array (z, y, x), new stiffness
+        # - index                   boolean mask or coordinates of the voxels to update, defaults to every voxel
+
+        structure = self.settings["structure"]
+        if index is None:
+            changeable = self.can_be_changed
+        else:
+            changeable = np.zeros(self.shape, dtype=bool)
+            changeable[index] = True
+            changeable &= self.can_be_changed
+
+        new_stiffness = np.broadcast_to(new_stiffness, self.shape)[changeable]
+        above_max = new_stiffness >= structure["max_stiffness"]
+        below_min = ~above_max & (new_stiffness <= structure["min_stiffness"])
+
+        stiffness = np.where(above_max, structure["max_stiffness"],
+                             np.where(below_min, structure["min_stiffness"], new_stiffness))
+        material = np.where(above_max, structure["morph_max"],
+                            np.where(below_min, structure["morph_min"], structure["morph_between"]))
+
+        self.stiffness[changeable] = stiffness
+        self.material[changeable] = material
+
+    def remove(self, index=None):
+        # Removes changeable voxels by setting them to the minimum stiffness
+        self.update_with_stiffness(self.settings["structure"]["min_stiffness"], index)
+
+    def remove_isolated(self):
+        # As voxels are removed, voxels can become isolated from any adjacent voxels. This causes errors in the
+        # simulator, hence changeable voxels whose six neighbours are all empty are removed.
+        # The appended False is read through the -1 padding of the neighbours array
+        filled = self.material != 0
+        filled_or_outside = np.append(filled.ravel(), False)
+        has_neighbour = filled_or_outside[self.neighbours].any(axis=1).reshape(self.shape)
+
+        self.remove(self.can_be_changed & filled & ~has_neighbour)
+
+    def neighbours_of(self, coordinates):
+        # RETURNS
+        # - neighbours              list of [z, y, x] coordinates of the voxels adjacent to coordinates
+        flat_index = np.ravel_multi_index(tuple(coordinates), self.shape)
+        return [list(np.unravel_index(neighbour, self.shape)) for neighbour in self.neighbours[flat_index]
+                if neighbour >= 0]
+
+    def section_mask(self, sections):
+        # RETURNS
+        # - mask                    np.array of bool (z, y, x), voxels within any of the given sections
+        return np.isin(self.section, sections)
+
+    def contains(self, coordinates):
+        return len(coordinates) == 3 and all(0 <= coordinates[i] < self.shape[i] for i in range(3))
+
+    def __getitem__(self, coordinates):
+        return Voxel(self, coordinates)
+
+    def __len__(self):
+        return int(np.prod(self.shape))
+
+    def values(self):
+        # Compatibility with the previous dictionary of voxels, iterates over a view of every voxel
+        return [Voxel(self, list(coordinates)) for coordinates in np.ndindex(*self.shape)]
+
+
+class Voxel:
+    def __init__(self, grid, coordinates):
+        # View of a single voxel of a VoxelGrid. Reads and updates go straight to the grids arrays.
+        # ARGUMENTS
+        # - grid                    VoxelGrid, grid the voxel belongs to
+        # - coordinates             list, z, y, x coordinates (yes, z,y,x)
+        self.grid = grid
+        self.coordinates = [int(c) for c in coordinates]                        # list, z, y, x coordinates
+
+    @property
+    def index(self):
+        return tuple(self.coordinates)
+
+    @property
+    def material_number(self):
+        return int(self.grid.material[self.index])
+
+    @property
+    def stiffness(self):
+        return self.grid.stiffness[self.index]
+
+    @property
+    def can_be_changed(self):
+        return bool(self.grid.can_be_changed[self.index])
+
+    @property
+    def section(self):
+        return int(self.grid.section[self.index])
+
+    @property
+    def neighbours(self):
+        return [Voxel(self.grid, coordinates) for coordinates in self.grid.neighbours_of(self.coordinates)]
 
     def update_with_stiffness(self, new_stiffness):
-        if self.can_be_changed:
-            if new_stiffness >= self.settings["structure"]["max_stiffness"]:
-                self.stiffness = self.settings["structure"]["max_stiffness"]
-                self.material_number = self.settings["structure"]["morph_max"]
-            elif new_stiffness <= self.settings["structure"]["min_stiffness"]:
-                self.stiffness = self.settings["structure"]["min_stiffness"]
-                self.material_number = self.settings["structure"]["morph_min"]
-            else:
-                self.stiffness = new_stiffness
-                self.material_number = self.settings["structure"]["morph_between"]
+        self.grid.update_with_stiffness(new_stiffness, self.index)
 
     def remove(self):
-        if self.can_be_changed:
-            self.update_with_stiffness(self.settings["structure"]["min_stiffness"])
+        self.grid.remove(self.index)
+
+    def __eq__(self, other):
+        return isinstance(other, Voxel) and self.grid is other.grid and self.coordinates == other.coordinates
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.grid), self.index))
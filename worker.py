@@ -0,0 +1,35 @@
+import sys
+
+from distributed import WorkerAgent
+from settings import get_settings
+from supervision import create_supervisor
+
+
+# Runs simulations for a population evaluated with the "distributed" backend. Start it on every machine that should
+# simulate, with the address of the machine running the population:
+#
+#     python worker.py <broker host>:<port>
+#
+# The worker uses evosoro_path, max_workers, simulation_timeout, output_timeout, scratch_directory and the supervision
+# section of its own settings.json. Without an address the broker_address of settings.json is used. The broker_token of
+# settings.json must be the same as that of the broker.
+
+if __name__ == "__main__":
+    try:
+        settings = get_settings()
+
+        address = sys.argv[1] if len(sys.argv) > 1 else settings["evaluation"]["broker_address"]
+
+        agent = WorkerAgent(address, settings["evosoro_path"],
+                            max_workers=settings["evaluation"]["max_workers"],
+                            timeout=settings["evaluation"]["simulation_timeout"],
+                            output_timeout=settings["evaluation"]["output_timeout"],
+                            scratch_directory=settings["evaluation"]["scratch_directory"],
+                            supervisor=create_supervisor(settings),
+                            token=settings["evaluation"]["broker_token"])
+
+        print("Worker " + agent.name + " serving broker " + address)
+        agent.run()
+
+    except KeyboardInterrupt:
+        sys.exit()